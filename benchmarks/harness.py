@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Helpers to time benchmarks, report the results and compare them with
+a stored baseline."""
+import json
+import time
+
+BENCHMARKS = []
+"""Registered benchmarks as (name, setup) tuples."""
+
+LARGE = set()
+"""Names of the benchmarks which need a large table. Their setup takes
+minutes, so they only run on request."""
+
+
+def benchmark(name, large=False):
+    """Registers the decorated setup function as benchmark `name`. The
+    setup function is called with the options of the run and returns
+    the function to time. Set `large` for benchmarks with a slow
+    setup."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        if large:
+            LARGE.add(name)
+        return setup
+    return register
+
+
+def percentile(values, percent):
+    """Returns the `percent` percentile of the sorted `values`."""
+    index = min(len(values) - 1, int(round(percent / 100.0 * len(values))))
+    return values[index]
+
+
+def measure(func, iterations=200, warmup=10):
+    """Calls `func` `iterations` times and returns a dictionary with the
+    p50 and p99 latency in milliseconds and the throughput in calls
+    per second. If `func` returns a number it is reported as the size
+    in bytes of its result, e.g. of a response body."""
+    for _ in range(warmup):
+        func()
+    timings = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        size = func()
+        timings.append(time.perf_counter() - start)
+    duration = time.perf_counter() - started
+    timings.sort()
+    result = dict(p50=percentile(timings, 50) * 1000,
+                  p99=percentile(timings, 99) * 1000,
+                  throughput=iterations / duration,
+                  iterations=iterations)
+    if isinstance(size, int):
+        result["bytes"] = size
+    return result
+
+
+def format_results(results):
+    lines = ["{:<28} {:>10} {:>10} {:>12} {:>12}".format(
+        "benchmark", "p50 ms", "p99 ms", "ops/s", "bytes")]
+    for name, result in sorted(results.items()):
+        lines.append("{:<28} {:10.3f} {:10.3f} {:12.1f} {:>12}".format(
+            name, result["p50"], result["p99"], result["throughput"],
+            result.get("bytes", "")))
+    return "\n".join(lines)
+
+
+def load_baseline(path):
+    """Returns the stored baseline or None if there is none."""
+    try:
+        with open(path) as baseline:
+            return json.load(baseline)
+    except (IOError, OSError):
+        return None
+
+
+def save_baseline(path, results):
+    with open(path, "w") as baseline:
+        json.dump(results, baseline, indent=2, sort_keys=True)
+
+
+def missing(results, baseline):
+    """Returns the names of the benchmarks which are not in the
+    baseline and can not be compared."""
+    return [name for name in sorted(results) if name not in baseline]
+
+
+def regressions(results, baseline, tolerance=0.2):
+    """Returns the names of the benchmarks whose p50 latency is more
+    than `tolerance` (relative) above the baseline. Benchmarks missing
+    in the baseline are skipped, see :func:`missing`."""
+    slower = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        if result["p50"] > baseline[name]["p50"] * (1 + tolerance):
+            slower.append(name)
+    return slower
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the hot paths of the service. Run them against the
+default SQLite database or any other database supported by
+tedega_storage, e.g. a local PostgreSQL::
+
+    python -m benchmarks.run
+    python -m benchmarks.run --dsn postgresql://localhost/tedega_bench
+
+The results are compared with the baseline and the run fails if a
+benchmark got slower than the tolerance or there is no baseline. Use
+``--save`` to store the results as new baseline. Benchmarks on a table
+with 1000000 users only run with ``--large``, as filling it takes
+minutes.
+"""
+import argparse
+import itertools
+import os
+import sys
+
+from benchmarks.harness import (
+    BENCHMARKS,
+    benchmark,
+    measure,
+    format_results,
+    load_baseline,
+    save_baseline,
+    missing,
+    regressions,
+    LARGE
+)
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "baseline.json")
+
+_counter = itertools.count()
+
+
+def unique_name(prefix):
+    return "{}-{}-{}".format(prefix, os.getpid(), next(_counter))
+
+
+def fill_users(count):
+    """Makes sure the users table contains at least `count` users. The
+    users are inserted in one statement with the same password hash to
+    keep the setup fast."""
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.lib.bulk import set_defaults
+    from tedega_auth.lib.hashing import encrypt_password
+    from tedega_auth.model.user import User, normalize_name
+    with get_storage() as storage:
+        missing = count - storage.session.query(User.id).count()
+        if missing <= 0:
+            return
+        password = encrypt_password("password")
+        table = User.__table__
+        for start in range(0, missing, 10000):
+            names = [unique_name("fill")
+                     for _ in range(min(10000, missing - start))]
+            rows = [set_defaults(table, dict(name=name,
+                                             name_key=normalize_name(name),
+                                             password=password))
+                    for name in names]
+            storage.session.execute(table.insert(), rows)
+
+
+def new_client():
+    import tedega_auth.api.auth
+    import tedega_auth.api.user
+    name = unique_name("bench")
+    tedega_auth.api.user.create(name=name, password="password")
+    return tedega_auth.api.auth.add_client(dict(username=name,
+                                                password="password",
+                                                name="bench",
+                                                scopes="read",
+                                                redirect_uris=""))
+
+
+@benchmark("login")
+def login(options):
+    import tedega_auth.api.auth
+    client = new_client()
+    return lambda: tedega_auth.api.auth.login(client)
+
+
+@benchmark("validate_token")
+def validate_token(options):
+    import tedega_auth.api.auth
+    from tedega_auth.lib.tokens import validate_token
+    token = tedega_auth.api.auth.login(new_client())["access_token"]
+    return lambda: validate_token(token, "read")
+
+
+def _validator():
+    from tedega_auth.lib.keys import keyring
+    from tedega_auth.validation import TokenValidator
+    return TokenValidator(fetch=keyring.jwks)
+
+
+def _token():
+    import tedega_auth.api.auth
+    return tedega_auth.api.auth.login(new_client())["access_token"]
+
+
+@benchmark("validator[cached]")
+def validator_cached(options):
+    validator = _validator()
+    token = _token()
+    return lambda: validator.validate(token, "read")
+
+
+@benchmark("validator[uncached]")
+def validator_uncached(options):
+    validator = _validator()
+    token = _token()
+
+    def validate():
+        validator.cache.clear()
+        validator.validate(token, "read")
+    return validate
+
+
+@benchmark("validator[middleware]")
+def validator_middleware(options):
+    from tedega_auth.validation import TokenMiddleware
+
+    def app(environ, start_response):
+        start_response("200 OK", [])
+        return [b""]
+
+    middleware = TokenMiddleware(app, _validator(), scope="read")
+    environ = {"PATH_INFO": "/", "HTTP_AUTHORIZATION": "Bearer " + _token()}
+    return lambda: middleware(dict(environ), lambda status, headers: None)
+
+
+@benchmark("add_client")
+def add_client(options):
+    import tedega_auth.api.auth
+    import tedega_auth.api.user
+    name = unique_name("bench")
+    tedega_auth.api.user.create(name=name, password="password")
+    values = dict(username=name, password="password", name="bench",
+                  scopes="read", redirect_uris="")
+    return lambda: tedega_auth.api.auth.add_client(values)
+
+
+@benchmark("create_user")
+def create_user(options):
+    import tedega_auth.api.user
+    return lambda: tedega_auth.api.user.create(name=unique_name("create"),
+                                               password="password")
+
+
+def _search_benchmark(size):
+    def setup(options):
+        import tedega_auth.api.user
+        fill_users(size)
+        return lambda: tedega_auth.api.user.search(limit=100,
+                                                   offset=size - 100,
+                                                   fields="id|name")
+    return setup
+
+
+for _size in (1000, 10000, 100000):
+    benchmark("search[{}]".format(_size))(_search_benchmark(_size))
+
+
+def _sample_name(size):
+    """Fills the users table up to `size` users and returns the name of
+    one in the middle."""
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.model.user import User
+    fill_users(size)
+    with get_storage() as storage:
+        query = storage.session.query(User.name).order_by(User.id)
+        return query.offset(size // 2).limit(1).scalar()
+
+
+@benchmark("lookup_name[1000000]", large=True)
+def lookup_name(options):
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.model.user import User
+    name = _sample_name(1000000).upper()
+
+    def lookup():
+        with get_storage() as storage:
+            User.by_name(storage.session, name).one()
+    return lookup
+
+
+@benchmark("search_name[1000000]", large=True)
+def search_name(options):
+    import tedega_auth.api.user
+    search = "name::" + _sample_name(1000000)[:-2].upper()
+    return lambda: tedega_auth.api.user.search(limit=100, search=search,
+                                               fields="id|name")
+
+
+def _loaded_users(count):
+    """Returns `count` users detached from their session with all
+    columns loaded."""
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.model.user import User
+    fill_users(count)
+    with get_storage() as storage:
+        users = storage.session.query(User).order_by(User.id).limit(count).all()
+        storage.session.expunge_all()
+    return users
+
+
+@benchmark("serialize[get_values]")
+def serialize_get_values(options):
+    import json
+    users = _loaded_users(1000)
+    return lambda: json.dumps([user.get_values() for user in users],
+                              default=str)
+
+
+@benchmark("serialize[compiled]")
+def serialize_compiled(options):
+    from tedega_auth.api.user import serialize
+    from tedega_auth.lib.serialize import dumps
+    users = _loaded_users(1000)
+    return lambda: dumps(serialize.many(users))
+
+
+def _users_app():
+    """Returns a flask application serving ``GET /users`` with the
+    compression and JSON encoding of the service."""
+    import flask
+    import tedega_auth.api.user
+    from tedega_auth import config
+    from tedega_auth.lib.compression import CompressionMiddleware
+    from tedega_auth.lib.serialize import use_fast_json
+    app = flask.Flask(__name__)
+    use_fast_json(app)
+    app.wsgi_app = CompressionMiddleware(
+        app.wsgi_app, min_size=config.get("compress_min_size"),
+        level=config.get("compress_level"),
+        brotli_quality=config.get("brotli_quality"))
+
+    def users():
+        result = tedega_auth.api.user.search(
+            limit=int(flask.request.args["limit"]))
+        if isinstance(result, flask.Response):
+            return result
+        return flask.jsonify(result)
+    app.add_url_rule("/users", view_func=users)
+    return app
+
+
+def _page_benchmark(size, encoding):
+    def setup(options):
+        fill_users(size)
+        client = _users_app().test_client()
+        url = "/users?limit={}".format(size)
+        headers = {"Accept-Encoding": encoding}
+
+        def load():
+            return len(client.get(url, headers=headers).data)
+        return load
+    return setup
+
+
+def _encodings():
+    from tedega_auth.lib import compression
+    if compression.brotli is None:
+        return ("identity", "gzip")
+    return ("identity", "gzip", "br")
+
+
+for _size in (100, 1000, 10000):
+    for _encoding in _encodings():
+        benchmark("users_page[{}|{}]".format(_size, _encoding))(
+            _page_benchmark(_size, _encoding))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", default=None,
+                        help="Database passed to init_storage")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--filter", default="",
+                        help="Only run benchmarks containing this string")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save", action="store_true",
+                        help="Store the results as new baseline")
+    parser.add_argument("--large", action="store_true",
+                        help="Also run the benchmarks with 1000000 users")
+    options = parser.parse_args()
+
+    baseline = None
+    if not options.save:
+        baseline = load_baseline(options.baseline)
+        if baseline is None:
+            sys.exit("No baseline at {}. Store one with "
+                     "'make bench-baseline' first.".format(options.baseline))
+
+    from tedega_storage.rdbms import init_storage
+    from tedega_auth.lib.keys import init_keys
+    import tedega_auth.model.user  # noqa
+    import tedega_auth.model.client  # noqa
+    import tedega_auth.model.token  # noqa
+    init_storage(options.dsn)
+    init_keys(None)
+
+    results = {}
+    for name, setup in BENCHMARKS:
+        if name in LARGE and not options.large:
+            continue
+        if options.filter in name:
+            iterations = options.iterations
+            if name in ("add_client", "create_user"):
+                # These hash a password and are slow by design.
+                iterations = max(1, iterations // 10)
+            results[name] = measure(setup(options), iterations)
+    print(format_results(results))
+
+    if options.save:
+        save_baseline(options.baseline, results)
+        return
+    unknown = missing(results, baseline)
+    if unknown:
+        print("WARNING: Not in baseline, not compared: " + ", ".join(unknown))
+    slower = regressions(results, baseline, options.tolerance)
+    if slower:
+        print("Slower than baseline: " + ", ".join(slower))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Measures the cold start of a worker: the time from starting a fresh
+interpreter until :func:`tedega_auth.server.build_app` returned and
+until the storage is ready. Exits with 1 if the build time exceeds the
+target.
+
+    python -m benchmarks.startup --target 1.0
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.monotonic()
+from tedega_auth.server import build_app
+from tedega_auth.api.health import readiness
+build_app("tedega_auth")
+built = time.monotonic() - start
+readiness.wait(60)
+ready = time.monotonic() - start
+print(json.dumps(dict(build=built, ready=ready)))
+"""
+
+
+def measure(runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-c", PROBE])
+        results.append(json.loads(output.decode("utf-8").splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", type=float, default=1.0,
+                        help="Maximum seconds until build_app returned")
+    args = parser.parse_args()
+    results = measure(args.runs)
+    build = sorted(r["build"] for r in results)[len(results) // 2]
+    ready = sorted(r["ready"] for r in results)[len(results) // 2]
+    print("build_app: {:.3f}s  ready: {:.3f}s  (median of {} runs, "
+          "target {:.3f}s)".format(build, ready, args.runs, args.target))
+    if build > args.target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,9 @@ with open('HISTORY.rst') as history_file:
 
 requirements = [
     'flask',
-    'flask_sqlalchemy'
+    'flask_sqlalchemy',
+    'PyJWT',
+    'cryptography'
 ]
 
 test_requirements = [
@@ -33,6 +35,9 @@ setup(
                  'tedega_auth'},
     include_package_data=True,
     install_requires=requirements,
+    extras_require={
+        'brotli': ['brotli'],
+    },
     license="MIT license",
     zip_safe=False,
     keywords='tedega_auth',
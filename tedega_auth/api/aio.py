@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Asynchronous versions of the endpoints for use in an asyncio
+application. tedega_storage only provides a synchronous storage, so
+each call runs the synchronous endpoint in a bounded thread pool. This
+keeps the event loop free but does not add throughput: at most
+``async_workers`` calls run at a time, as with a threaded WSGI server.
+
+Calls run outside of a HTTP request. If the setting ``enforce_scopes``
+is enabled, the user endpoints therefore take the bearer token as
+keyword argument `token` and check its scope like the HTTP endpoints.
+
+>>> import asyncio
+>>> from tedega_auth.api import aio
+>>> users = asyncio.run(aio.search(limit=1, token=access_token))
+"""
+import asyncio
+import functools
+import threading
+
+from tedega_auth import config
+from tedega_auth.api import auth, user
+from tedega_auth.lib.endpoint import check_token
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the thread pool running the endpoints. It is created on
+    first use."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _executor = ThreadPoolExecutor(config.get("async_workers"))
+    return _executor
+
+
+def _call(func, scope, token, args, kwargs):
+    if scope is not None and config.get("enforce_scopes"):
+        check_token(token, scope)
+    return func(*args, **kwargs)
+
+
+def _async(func, scope=None):
+    """Returns a coroutine function running `func` in the executor
+    after checking that the `token` passed to it grants `scope`."""
+    @functools.wraps(func)
+    async def wrapper(*args, token=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(_call, func, scope, token, args, kwargs)
+        return await loop.run_in_executor(get_executor(), call)
+    return wrapper
+
+
+login = _async(auth.login)
+add_client = _async(auth.add_client)
+refresh = _async(auth.refresh)
+revoke = _async(auth.revoke)
+introspect = _async(auth.introspect)
+
+search = _async(user.search, "read")
+scan = _async(user.scan, "read")
+read = _async(user.read, "read")
+create = _async(user.create, "write")
+update = _async(user.update, "write")
+delete = _async(user.delete, "write")
+reset_password = _async(user.reset_password, "write")
+bulk_create = _async(user.bulk_create, "write")
+bulk_update = _async(user.bulk_update, "write")
+bulk_delete = _async(user.bulk_delete, "write")
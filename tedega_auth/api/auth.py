@@ -1,33 +1,255 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import jwt
-from tedega_view import config_view_endpoint, AuthError
-from tedega_storage.rdbms import get_storage
-from tedega_share.lib.security import verify_password, generate_password
+import datetime
+from collections import namedtuple
+import flask
+import sqlalchemy as sa
+from sqlalchemy.orm.exc import NoResultFound
+from tedega_view import AuthError
+from tedega_auth.lib.storage import unit_of_work
+from tedega_share.lib.security import generate_password
 from tedega_auth.model.user import User
 from tedega_auth.model.client import Client
+from tedega_auth.model.token import RefreshToken
+from tedega_auth.lib.cache import LRUCache
+from tedega_auth.lib.endpoint import endpoint
+from tedega_auth.lib.ratelimit import SlidingWindowLimiter, create_backend
+from tedega_auth.lib.scopes import normalize
+from tedega_auth.lib.security import verify_secret, hash_secret
+from tedega_auth.lib.keys import keyring
+from tedega_auth.lib.http import add_headers
+from tedega_auth.lib.tokens import (
+    InvalidToken,
+    issue_access_token,
+    validate_token
+)
+from tedega_auth import config
 
+ClientCredentials = namedtuple("ClientCredentials",
+                               ["client_id", "client_secret", "user_id",
+                                "scopes", "redirect_uris"])
+"""Subset of the values of a :class:`Client` needed to authenticate
+it. The `client_secret` is the hash of the secret, `scopes` a frozenset
+and `redirect_uris` the compiled
+:class:`tedega_auth.lib.scopes.RedirectURIs`. Instances of this are
+stored in the :data:`client_cache`."""
 
-@config_view_endpoint(path="/login", method="POST", auth=None)
+client_cache = LRUCache(config.get("client_cache_size"),
+                        config.get("client_cache_ttl"))
+"""Cache of :class:`ClientCredentials` by client_id. Answers repeated
+logins of the same client without touching the database. Changed
+clients are only invalidated in the cache of this process. Other
+workers use the old credentials for up to ``client_cache_ttl``
+seconds."""
+
+
+request_limiter = SlidingWindowLimiter(config.get("ratelimit_ip"),
+                                       config.get("ratelimit_window"),
+                                       create_backend("ratelimit:req:"))
+"""Limits the requests per IP to the endpoints which check
+credentials."""
+
+failure_limiter = SlidingWindowLimiter(config.get("ratelimit_failures"),
+                                       config.get("ratelimit_window"),
+                                       create_backend("ratelimit:fail:"))
+"""Limits the failed authentications per client, user and IP."""
+
+
+def _remote_addr():
+    if flask.has_request_context():
+        return "ip:{}".format(flask.request.remote_addr)
+    return None
+
+
+def _check_limits(*keys):
+    """Rejects the request with 429 if the IP or one of the `keys` has
+    exceeded its limit. Runs before any storage or hashing work."""
+    ip = _remote_addr()
+    request_limiter.check_and_hit(ip)
+    failure_limiter.check(ip, *keys)
+
+
+def _authentication_failed(message, *keys):
+    failure_limiter.hit(_remote_addr(), *keys)
+    return AuthError(message)
+
+
+def _invalidate_client(mapper, connection, target):
+    client_ids = set([target.client_id])
+    # Also drop the old key in case the client_id itself was changed.
+    history = sa.inspect(target).attrs.client_id.history
+    client_ids.update(history.deleted or ())
+    for client_id in client_ids:
+        client_cache.invalidate(client_id)
+    # Until the transaction is committed concurrent logins still load
+    # and cache the old credentials, so they are dropped again after
+    # the commit.
+    session = sa.orm.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_clients", set()).update(client_ids)
+
+
+def _invalidate_changed_clients(session):
+    for client_id in session.info.pop("changed_clients", ()):
+        client_cache.invalidate(client_id)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    sa.event.listen(Client, _event, _invalidate_client)
+for _event in ("after_commit", "after_rollback"):
+    sa.event.listen(sa.orm.Session, _event, _invalidate_changed_clients)
+
+
+def load_client(client_id):
+    """Returns the :class:`ClientCredentials` of the client with the
+    given `client_id`. The credentials are taken from the
+    :data:`client_cache` if possible.
+
+    :client_id: ID of the client.
+    :returns: :class:`ClientCredentials`
+    :raises: :class:`sqlalchemy.orm.exc.NoResultFound` if there is no
+             such client.
+    """
+    credentials = client_cache.get(client_id)
+    if credentials is None:
+        with unit_of_work() as storage:
+            query = storage.session.query(Client)
+            client = query.filter(Client.client_id == client_id).one()
+            credentials = ClientCredentials(client.client_id,
+                                            client.client_secret,
+                                            client.user_id,
+                                            client.scopes,
+                                            client.redirect_uris)
+        client_cache.set(client_id, credentials)
+    return credentials
+
+
+def _issue_tokens(storage, client_id, user_id, scopes):
+    """Creates a new refresh token and returns it together with a new
+    access token issued with it."""
+    refresh_token = generate_password(50)
+    token = RefreshToken()
+    token.token_hash = hash_secret(refresh_token)
+    token.client_id = client_id
+    token.user_id = user_id
+    token.scope = " ".join(sorted(scopes))
+    ttl = datetime.timedelta(seconds=config.get("refresh_token_ttl"))
+    token.expires = datetime.datetime.utcnow() + ttl
+    storage.create(token)
+    storage.session.flush()
+    access_token = issue_access_token(client_id, user_id, scopes, token.id)
+    return dict(access_token=access_token,
+                token_type="Bearer",
+                expires_in=config.get("access_token_ttl"),
+                refresh_token=refresh_token,
+                scope=token.scope)
+
+
+def _load_refresh_token(storage, refresh_token):
+    query = storage.session.query(RefreshToken)
+    query = query.filter(RefreshToken.token_hash == hash_secret(refresh_token))
+    return query.first()
+
+
+@endpoint(path="/login", method="POST", auth=None)
 def login(values):
+    """Authenticates a client by its `client_id` and `client_secret`.
+
+    :values: Dictionary with `client_id` and `client_secret`.
+    :returns: Dictionary with a short lived `access_token`. Clients
+              log in again when it expires, so no refresh token is
+              issued (RFC 6749, 4.4.3) and the storage is not touched.
+    """
+    add_headers({"Cache-Control": "no-store"})
     client_id = values["client_id"]
     client_secret = values["client_secret"]
+    key = "client:{}".format(client_id)
+    _check_limits(key)
+
+    try:
+        credentials = load_client(client_id)
+    except NoResultFound:
+        raise _authentication_failed("Client can not be authenticated", key)
+    if not verify_secret(client_secret, credentials.client_secret):
+        raise _authentication_failed("Client can not be authenticated", key)
+
+    scopes = credentials.scopes
+    return dict(access_token=issue_access_token(credentials.client_id,
+                                                credentials.user_id,
+                                                scopes),
+                token_type="Bearer",
+                expires_in=config.get("access_token_ttl"),
+                scope=" ".join(sorted(scopes)))
+
+
+@endpoint(path="/token/refresh", method="POST", auth=None)
+def refresh(values):
+    """Returns new tokens for a valid refresh token. The refresh token
+    is single use and will be revoked.
 
-    with get_storage() as storage:
+    :values: Dictionary with the `refresh_token`.
+    :returns: Dictionary with new `access_token` and `refresh_token`.
+    """
+    add_headers({"Cache-Control": "no-store"})
+    with unit_of_work() as storage:
+        token = _load_refresh_token(storage, values["refresh_token"])
+        if token is None or not token.is_valid():
+            raise AuthError("Token can not be refreshed")
         try:
-            query = storage.session.query(Client)
-            query = query.filter(Client.client_id == client_id,
-                                 Client.client_secret == client_secret)
-            query.one()
-        except:
-            raise AuthError("Client can not be authenticated")
+            load_client(token.client_id)
+        except NoResultFound:
+            raise AuthError("Token can not be refreshed")
+        # Concurrent requests with the same token may both have loaded
+        # it as valid. Only the one which revokes it gets new tokens.
+        if not token.revoke(storage.session):
+            raise AuthError("Token can not be refreshed")
+        return _issue_tokens(storage, token.client_id,
+                             token.user_id, token.scopes)
+
+
+@endpoint(path="/token/revoke", method="POST", auth=None)
+def revoke(values):
+    """Revokes a refresh token and all access tokens issued with it.
+    Revoking an unknown token is no error.
+
+    :values: Dictionary with the `refresh_token`.
+    """
+    with unit_of_work() as storage:
+        token = _load_refresh_token(storage, values["refresh_token"])
+        if token is not None and token.revoked_at is None:
+            token.revoke(storage.session)
+    return dict()
+
 
-    encoded = jwt.encode({'some': 'payload'}, 'secret', algorithm='HS256')
-    return encoded.decode('utf-8')
+@endpoint(path="/introspect", method="POST", auth=None)
+def introspect(values):
+    """Returns if the given token is active and its claims. The token
+    is checked in memory by its signature, expiry and optional the
+    required scope without accessing the storage.
 
+    :values: Dictionary with the `token` and an optional `scope`.
+    :returns: Dictionary with `active` and the claims of the token.
+    """
+    try:
+        claims = validate_token(values["token"], values.get("scope"))
+    except InvalidToken:
+        return dict(active=False)
+    result = dict(active=True, token_type="Bearer")
+    result.update(claims)
+    return result
 
-@config_view_endpoint(path="/clients", method="POST", auth=None)
+
+@endpoint(path="/.well-known/jwks.json", method="GET", auth=None)
+def jwks():
+    """Returns the public keys used to sign the tokens as JSON Web Key
+    Set. Resource servers can use these to verify tokens locally."""
+    add_headers({"Cache-Control":
+                 "public, max-age={}".format(config.get("jwks_max_age"))})
+    return keyring.jwks()
+
+
+@endpoint(path="/clients", method="POST", auth=None)
 def add_client(values):
     """Registers a new client. To register a new client the request must
     be autheticated by providing the username and password of the
@@ -35,30 +257,30 @@ def add_client(values):
     The function will return a dictionary with the client_id and
     client_secret which will than be used to request authorization for a
     certain service endpoint."""
+    add_headers({"Cache-Control": "no-store"})
     username = values["username"]
     password = values["password"]
+    key = "user:{}".format(username)
+    _check_limits(key)
 
-    with get_storage() as storage:
+    with unit_of_work() as storage:
         try:
-            user = storage.session.query(User).filter(User.name == username).one()
-            if verify_password(password, user.password):
-                user_id = user.id
-            else:
-                raise AuthError("User can not be authorized.")
-        except:
-            raise AuthError("User can not be authorized.")
-
-    client = Client()
-    client.name = values['name']
-    client.client_id = generate_password(40)
-    client.client_secret = generate_password(50)
-    client._redirect_uris = None  # values['redirect_uris']
-    client._default_scopes = None  # values['scopes']
-    client.user_id = user_id
-
-    with get_storage() as storage:
+            user = User.by_name(storage.session, username).one()
+        except NoResultFound:
+            raise _authentication_failed("User can not be authorized.", key)
+        # Hashing may fail with 503 if the hashing pool is overloaded.
+        if not user.verify_password(password):
+            raise _authentication_failed("User can not be authorized.", key)
+
+        client = Client()
+        client.name = values['name']
+        client.client_id = generate_password(40)
+        client_secret = generate_password(50)
+        client.set_secret(client_secret)
+        client._redirect_uris = normalize(values.get('redirect_uris'))
+        client._default_scopes = normalize(values.get('scopes'))
+        client.user_id = user.id
         storage.create(client)
         client_id = client.client_id
-        client_secret = client.client_secret
 
     return dict(client_id=client_id, client_secret=client_secret)
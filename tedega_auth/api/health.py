@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Health checks of the service. Liveness tells if the process is up,
+readiness if the storage has been initialised and requests can be
+served."""
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from tedega_auth.lib.endpoint import endpoint
+
+
+class Readiness(object):
+
+    """Startup state of the service."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.startup_time = None
+        """Seconds from start until the storage was ready."""
+        self.error = None
+        self._ready = threading.Event()
+
+    def set_ready(self):
+        self.startup_time = time.monotonic() - self.started
+        self.error = None
+        self._ready.set()
+
+    def set_failed(self, error):
+        self.error = str(error)
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        """Blocks until the service is ready. Returns True if ready."""
+        return self._ready.wait(timeout)
+
+
+readiness = Readiness()
+
+
+@endpoint(path="/health/live", method="GET", auth=None)
+def live():
+    """Returns if the process is up."""
+    return dict(status="up")
+
+
+@endpoint(path="/health/ready", method="GET", auth=None)
+def ready():
+    """Returns if the storage is ready. Answers with 503 if the storage
+    is not initialised yet."""
+    if not readiness.is_ready():
+        raise ServiceUnavailable(readiness.error or "Storage not ready")
+    return dict(status="ready", startup_time=readiness.startup_time)
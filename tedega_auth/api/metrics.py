@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Metrics of the service in the Prometheus text format."""
+import flask
+from tedega_view import config_view_endpoint
+
+from tedega_auth.lib.metrics import registry
+from tedega_auth.lib.hashing import pool
+from tedega_auth.lib.storage import pool_stats
+from tedega_auth.api.auth import client_cache
+
+registry.gauge("tedega_auth_hash_pool", "State of the password hashing pool",
+               pool.stats)
+registry.gauge("tedega_auth_client_cache", "State of the client cache",
+               client_cache.stats)
+registry.gauge("tedega_auth_db_pool", "State of the database connection pool",
+               pool_stats)
+
+
+@config_view_endpoint(path="/metrics", method="GET", auth=None)
+def metrics():
+    """Returns all metrics in the Prometheus text format."""
+    return flask.Response(registry.export(),
+                          mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+OAuth2 authorization code grant with PKCE (RFC 6749, RFC 7636). The
+user logs in on the home page and confirms the authorization of a
+client on the consent page. The client then exchanges the code for
+tokens at ``/oauth/token`` with its secret. PKCE is required for all
+clients.
+"""
+import hmac
+import secrets
+from urllib.parse import urlencode, quote
+
+import flask
+from sqlalchemy.orm.exc import NoResultFound
+from tedega_view import AuthError
+from tedega_view.exceptions import ClientError
+
+from tedega_auth.api.auth import (
+    _authentication_failed,
+    _check_limits,
+    _issue_tokens,
+    load_client
+)
+from tedega_auth.lib.codes import (
+    CHALLENGE_METHODS,
+    AuthorizationCode,
+    codes,
+    verify_code_challenge
+)
+from tedega_auth.lib.endpoint import endpoint
+from tedega_auth.lib.http import add_headers
+from tedega_auth.lib.scopes import parse_scopes
+from tedega_auth.lib.security import verify_secret
+from tedega_auth.lib.storage import unit_of_work
+from tedega_auth.lib.templates import render
+from tedega_auth.model.user import User
+
+
+def _html(name, **values):
+    return flask.Response(render(name, **values), mimetype="text/html")
+
+
+def _redirect(uri, **params):
+    params = dict((k, v) for k, v in params.items() if v is not None)
+    if params:
+        uri = "{}{}{}".format(uri, "&" if "?" in uri else "?",
+                              urlencode(sorted(params.items())))
+    return flask.redirect(uri)
+
+
+def _is_local(path):
+    return bool(path) and path.startswith("/") and not path.startswith("//")
+
+
+def _current_user():
+    """Returns id and name of the user logged in on the home page or
+    None."""
+    if not flask.has_request_context():
+        return None
+    user_id = flask.session.get("user_id")
+    if user_id is None:
+        return None
+    with unit_of_work() as storage:
+        query = storage.session.query(User.id, User.name)
+        return query.filter(User.id == user_id).first()
+
+
+def _csrf_token():
+    token = flask.session.get("csrf_token")
+    if token is None:
+        token = flask.session["csrf_token"] = secrets.token_urlsafe(32)
+    return token
+
+
+def _check_request(client_id, redirect_uri, scope):
+    """Checks client and redirect uri of an authorization request.
+    Errors are not redirected to the client as the redirect uri can
+    not be trusted.
+
+    :returns: Tuple of the client credentials, the uri to redirect to
+              and the requested scopes.
+    """
+    try:
+        credentials = load_client(client_id)
+    except NoResultFound:
+        raise ClientError("Unknown client")
+    if redirect_uri is None:
+        target = credentials.redirect_uris.default
+        if target is None:
+            raise ClientError("Missing redirect_uri")
+    elif credentials.redirect_uris.matches(redirect_uri):
+        target = redirect_uri
+    else:
+        raise ClientError("Invalid redirect_uri")
+    if scope:
+        scopes = parse_scopes(scope)
+    else:
+        scopes = credentials.scopes
+    return credentials, target, scopes
+
+
+def _request_error(credentials, scopes, response_type, code_challenge,
+                   code_challenge_method):
+    """Returns the OAuth2 error of an authorization request or None."""
+    if response_type != "code":
+        return "unsupported_response_type"
+    if not code_challenge or code_challenge_method not in CHALLENGE_METHODS:
+        return "invalid_request"
+    if not scopes <= credentials.scopes:
+        return "invalid_scope"
+    return None
+
+
+@endpoint(path="/", method="GET", auth=None)
+def home(next=None):
+    """Returns the home page with the login form."""
+    return _html("home.html", user=_current_user(),
+                 next=next if _is_local(next) else None)
+
+
+@endpoint(path="/", method="POST", auth=None)
+def sign_in(username, password, next=None):
+    """Logs the user in for the authorization of clients. Redirects to
+    `next` or the home page.
+
+    :username: Name of the user.
+    :password: Password of the user.
+    :next: Local path to redirect to after the login.
+    """
+    key = "user:{}".format(username)
+    _check_limits(key)
+    with unit_of_work() as storage:
+        user = User.by_name(storage.session, username).first()
+        if user is None or not user.verify_password(password):
+            raise _authentication_failed("User can not be authenticated", key)
+        flask.session.clear()
+        flask.session["user_id"] = user.id
+    return flask.redirect(next if _is_local(next) else "/")
+
+
+@endpoint(path="/oauth/authorize", method="GET", auth=None)
+def authorize(response_type, client_id, redirect_uri=None, scope=None,
+              state=None, code_challenge=None, code_challenge_method="S256"):
+    """Returns the consent page for the authorization request. Users
+    who are not logged in are sent to the home page first."""
+    credentials, target, scopes = _check_request(client_id, redirect_uri,
+                                                 scope)
+    error = _request_error(credentials, scopes, response_type,
+                           code_challenge, code_challenge_method)
+    if error:
+        return _redirect(target, error=error, state=state)
+    user = _current_user()
+    if user is None:
+        next_url = quote(flask.request.full_path)
+        return flask.redirect("/?next={}".format(next_url))
+    return _html("authorize.html", client=credentials, user=user,
+                 scopes=sorted(scopes), response_type=response_type,
+                 redirect_uri=redirect_uri, state=state,
+                 code_challenge=code_challenge,
+                 code_challenge_method=code_challenge_method,
+                 csrf_token=_csrf_token())
+
+
+@endpoint(path="/oauth/authorize", method="POST", auth=None)
+def consent(response_type, client_id, csrf_token, confirm,
+            redirect_uri=None, scope=None, state=None, code_challenge=None,
+            code_challenge_method="S256"):
+    """Handles the answer of the consent page. Redirects to the client
+    with a new authorization code or an error."""
+    credentials, target, scopes = _check_request(client_id, redirect_uri,
+                                                 scope)
+    user = _current_user()
+    expected = flask.session.get("csrf_token")
+    if (user is None or expected is None or
+            not hmac.compare_digest(expected, csrf_token or "")):
+        raise AuthError("User can not be authorized.")
+    error = _request_error(credentials, scopes, response_type,
+                           code_challenge, code_challenge_method)
+    if error:
+        return _redirect(target, error=error, state=state)
+    if confirm != "yes":
+        return _redirect(target, error="access_denied", state=state)
+    code = codes.issue(AuthorizationCode(credentials.client_id, user.id,
+                                         redirect_uri, tuple(scopes),
+                                         code_challenge,
+                                         code_challenge_method))
+    return _redirect(target, code=code, state=state)
+
+
+@endpoint(path="/oauth/token", method="POST", auth=None)
+def token(grant_type, code, client_id, code_verifier, redirect_uri=None,
+          client_secret=None):
+    """Exchanges an authorization code for tokens. The client is
+    authenticated before the code is redeemed, so a failed
+    authentication does not use up the code. Clients which have been
+    issued a secret must send it (RFC 6749, 4.1.3).
+
+    :returns: Dictionary with `access_token` and `refresh_token`.
+    """
+    add_headers({"Cache-Control": "no-store"})
+    if grant_type != "authorization_code":
+        raise ClientError("unsupported_grant_type")
+    key = "client:{}".format(client_id)
+    _check_limits(key)
+    try:
+        credentials = load_client(client_id)
+    except NoResultFound:
+        raise _authentication_failed("Client can not be authenticated", key)
+    if credentials.client_secret and (
+            client_secret is None or
+            not verify_secret(client_secret, credentials.client_secret)):
+        raise _authentication_failed("Client can not be authenticated", key)
+    grant = codes.redeem(code)
+    if (grant is None or grant.client_id != client_id or
+            grant.redirect_uri != redirect_uri or
+            not verify_code_challenge(code_verifier, grant.code_challenge,
+                                      grant.code_challenge_method)):
+        raise ClientError("invalid_grant")
+    with unit_of_work() as storage:
+        return _issue_tokens(storage, client_id, grant.user_id, grant.scopes)
@@ -3,19 +3,135 @@
 
 """
 Public API of the user model"""
-from tedega_view import config_view_endpoint
-from tedega_storage.rdbms import get_storage
+import itertools
+
+import flask
+import sqlalchemy as sa
+from tedega_auth import config
+from tedega_auth.lib.storage import get_storage, unit_of_work
 from tedega_storage.rdbms.crud import (
-    search as _search,
     create as _create,
     read as _read,
     update as _update,
     delete as _delete
 )
-from tedega_auth.model.user import User
+from tedega_auth.model.user import User, normalize_name
+from tedega_auth.lib.endpoint import endpoint
+from tedega_auth.lib.serialize import Serializer, dumps
+from tedega_auth.lib.hashing import encrypt_passwords
+from tedega_auth.lib.http import (
+    add_headers,
+    check_match,
+    check_not_modified,
+    has_if_match,
+    is_conditional,
+    make_etag
+)
+from tedega_auth.lib.bulk import (
+    batches,
+    read_items,
+    result,
+    set_defaults,
+    execute_batch
+)
+from tedega_auth.lib.query import (
+    apply_search,
+    apply_sort,
+    apply_keyset,
+    select_fields,
+    as_dicts,
+    encode_cursor
+)
+
+STREAM_BATCH_SIZE = 1000
+"""Number of rows fetched at once from the database when streaming."""
+
+STREAM_CHUNK_SIZE = 100
+"""Number of users sent in one chunk of a streamed page."""
+
+BULK_BATCH_SIZE = 500
+"""Number of users written with one statement in bulk requests."""
+
+UNLISTED_FIELDS = ("password", "name_key")
+"""Fields which are never selected when listing users."""
+
+READONLY_FIELDS = ("id", "uuid", "created", "updated", "name_key")
+"""Fields which can not be changed by bulk updates."""
+
+SEARCH_PREFIXES = {"name": (User.name_key, normalize_name)}
+"""Fields searched by case insensitive prefix on an indexed column."""
+
+serialize = Serializer(User, exclude=("name_key",))
+"""Converts users into dictionaries for the responses."""
+
+serialize_listed = Serializer(User, exclude=UNLISTED_FIELDS)
+"""Converts the rows of user listings into dictionaries."""
+
+VERSION_FIELDS = ("id", "updated")
+"""Fields from which the ETag of a list of users is built."""
+
+
+def _parse_fields(fields):
+    if fields != "":
+        return fields.split("|")
+    return None
+
+
+def _query(storage, fields):
+    """Returns a query selecting the columns `fields` of the users or
+    all listed columns. The :data:`UNLISTED_FIELDS` are never
+    loaded."""
+    return select_fields(storage.session, User,
+                         fields or serialize_listed.keys, UNLISTED_FIELDS)
+
+
+def _values(query, fields):
+    if fields:
+        return as_dicts(query)
+    return serialize_listed.many(query)
+
+
+def _iter_values(query, fields):
+    """Like :func:`_values` but converts the rows one by one while they
+    are loaded."""
+    if fields:
+        return as_dicts(query)
+    return map(serialize_listed, query)
+
+
+def _etag(user):
+    return make_etag(user.uuid, user.updated)
+
+
+def _list_etag(rows):
+    return make_etag(*["{}:{}".format(row.id, row.updated) for row in rows])
+
+
+def _filter(query, search, sort, offset, limit):
+    query = apply_search(query, User, search, SEARCH_PREFIXES)
+    query = apply_sort(query, User, sort).order_by(User.id)
+    return query.offset(offset).limit(limit)
 
 
-@config_view_endpoint(path="/users", method="GET", auth=None)
+def _stream_page(search, sort, offset, limit, fields):
+    """Yields the page of users as JSON array in chunks of
+    :data:`STREAM_CHUNK_SIZE` users."""
+    with get_storage() as storage:
+        query = _filter(_query(storage, fields), search, sort, offset, limit)
+        values = _iter_values(query.yield_per(STREAM_BATCH_SIZE), fields)
+        prefix = "["
+        while True:
+            chunk = [dumps(value)
+                     for value in itertools.islice(values, STREAM_CHUNK_SIZE)]
+            if not chunk:
+                break
+            yield prefix + ",".join(chunk)
+            prefix = ","
+        yield "[]" if prefix == "[" else "]"
+
+
+@endpoint(path="/users", method="GET", auth=None,
+          scope="read")
 def search(limit=100, offset=0, search="", sort="", fields=""):
     """Loads all users.
 
@@ -23,27 +139,107 @@ def search(limit=100, offset=0, search="", sort="", fields=""):
 
     :limit: Limit number of result to N entries.
     :offset: Return entries with an offset of N.
-    :search: Return entries with an offset of N.
+    :search: Filter entries, e.g. ``name::adm|id::1``. The name matches
+             users whose name starts with the value (case insensitive).
     :sort: Define sort and ordering.
-    :fields: Only return defined fields.
+    :fields: Only return defined fields. Only the given columns are
+             loaded from the database. The password hash is never
+             loaded for listings.
     :returns: List of dictionary with values of the user
 
+    Within a request the response has a weak ETag built from the ids
+    and update times of the listed users. Requests with a matching
+    If-None-Match are answered with 304 without loading the users.
+    Pages with a `limit` of at least ``stream_threshold`` users are
+    streamed while the users are loaded.
+
     >>> import tedega_core.api.user
     >>> users = tedega_core.api.user.search()
     >>> isinstance(users, list)
     True
     """
-    if fields != "":
-        fields = fields.split("|")
-    else:
-        fields = None
-    with get_storage() as storage:
-        users = _search(storage, User, limit, offset, search, sort)
-        users = [user.get_values(fields) for user in users]
+    fields = _parse_fields(fields)
+    if (flask.has_request_context() and
+            limit >= config.get("stream_threshold")):
+        with unit_of_work() as storage:
+            versions = storage.session.query(User.id, User.updated)
+            versions = _filter(versions, search, sort, offset, limit)
+            check_not_modified(_list_etag(versions))
+        # The generator is consumed after this function returned, so it
+        # needs its own storage session.
+        return flask.Response(_stream_page(search, sort, offset, limit,
+                                           fields),
+                              mimetype="application/json")
+    extra = []
+    if fields and flask.has_request_context():
+        # Needed for the ETag, removed from the result again.
+        extra = [field for field in VERSION_FIELDS if field not in fields]
+    with unit_of_work() as storage:
+        if is_conditional():
+            versions = storage.session.query(User.id, User.updated)
+            versions = _filter(versions, search, sort, offset, limit)
+            check_not_modified(_list_etag(versions))
+        query = _query(storage, fields and fields + extra)
+        rows = _filter(query, search, sort, offset, limit).all()
+        users = list(_values(rows, fields))
+    if flask.has_request_context():
+        add_headers({"ETag": _list_etag(rows)})
+        for user in users:
+            for field in extra:
+                del user[field]
     return users
 
 
-@config_view_endpoint(path="/users", method="POST", auth=None)
+def _scan_query(storage, cursor, search, fields):
+    if fields and "id" not in fields:
+        # The id is needed to build the cursor.
+        fields = ["id"] + fields
+    query = _query(storage, fields)
+    query = apply_search(query, User, search, SEARCH_PREFIXES)
+    return apply_keyset(query, User.id, cursor)
+
+
+def _stream(cursor, search, fields):
+    with get_storage() as storage:
+        query = _scan_query(storage, cursor, search, fields)
+        query = query.yield_per(STREAM_BATCH_SIZE)
+        for values in _iter_values(query, fields):
+            yield dumps(values) + "\n"
+
+
+@endpoint(path="/users:scan", method="GET", auth=None,
+          scope="read")
+def scan(limit=100, cursor="", search="", fields="", stream=False):
+    """Loads users page by page ordered by their id. Each page contains
+    an opaque cursor to the next page. Unlike :func:`search` with an
+    offset, loading a page does not get slower the deeper it is.
+
+    :limit: Limit number of result to N entries.
+    :cursor: Cursor returned with the previous page.
+    :search: Filter entries. See :func:`search`.
+    :fields: Only return defined fields.
+    :stream: Stream all users after the cursor as newline delimited
+             JSON instead of returning a single page.
+    :returns: Dictionary with the `items` of the page and the cursor
+              to the `next` page which is None on the last page.
+    """
+    fields = _parse_fields(fields)
+    if stream:
+        # The generator is consumed after this function returned, so it
+        # needs its own storage session.
+        return flask.Response(_stream(cursor, search, fields),
+                              mimetype="application/x-ndjson")
+    with unit_of_work() as storage:
+        query = _scan_query(storage, cursor, search, fields).limit(limit)
+        items = list(_values(query, fields))
+        next_cursor = None
+        if items and len(items) == limit:
+            next_cursor = encode_cursor({"id": items[-1]["id"]})
+    return dict(items=items, next=next_cursor)
+
+
+@endpoint(path="/users", method="POST", auth=None,
+          scope="write")
 def create(name, password):
     """Creates a new user with the given `name` and `password`.
 
@@ -58,13 +254,68 @@ def create(name, password):
     >>> user['name']
     'foo1'
     """
-    with get_storage() as storage:
+    with unit_of_work() as storage:
         user = _create(storage, User, dict(name=name, password=password))
-        user = user.get_values()
+        user = serialize(user)
     return user
 
 
-@config_view_endpoint(path="/users/{item_id}", method="GET", auth=None)
+def _valid_new_user(item):
+    return (isinstance(item, dict) and
+            isinstance(item.get("name"), str) and
+            isinstance(item.get("password"), str))
+
+
+@endpoint(path="/users:bulk", method="POST", auth=None,
+          scope="write")
+def bulk_create(values=None):
+    """Creates many users at once. The passwords are hashed in
+    parallel and the users are inserted in batches.
+
+    :values: List of dictionaries with `name` and `password` of the
+             new users. If omitted the users are read from a newline
+             delimited JSON body.
+    :returns: List with a dictionary for each user with its `index` in
+              the request, a `status` (201, 400 or 409) and the `id` of
+              the created user.
+    """
+    table = User.__table__
+    results = []
+    with unit_of_work() as storage:
+        session = storage.session
+        for batch in batches(enumerate(read_items(values)), BULK_BATCH_SIZE):
+            valid = []
+            for index, item in batch:
+                if _valid_new_user(item):
+                    valid.append((index, item))
+                else:
+                    results.append(result(index, 400,
+                                          error="name and password required"))
+            passwords = encrypt_passwords([item["password"]
+                                           for _, item in valid])
+            items = [(index, set_defaults(table, dict(
+                name=item["name"], name_key=normalize_name(item["name"]),
+                password=password)))
+                for (index, item), password in zip(valid, passwords)]
+            batch_results = []
+            execute_batch(session, table.insert(), items, batch_results, 201)
+            names = dict((index, params["name"]) for index, params in items)
+            created = [item for item in batch_results if item["status"] == 201]
+            if created:
+                query = session.query(User.id, User.name)
+                query = query.filter(User.name.in_(
+                    [names[item["index"]] for item in created]))
+                ids = dict((name, id_) for id_, name in query)
+                for item in created:
+                    item["id"] = ids[names[item["index"]]]
+            results.extend(batch_results)
+            session.commit()
+    results.sort(key=lambda item: item["index"])
+    return results
+
+
+@endpoint(path="/users/{item_id}", method="GET", auth=None,
+          scope="read")
 def read(item_id):
     """Read (load) a existing user from the database.
 
@@ -81,14 +332,25 @@ def read(item_id):
     >>> loaduser = tedega_core.api.user.read(item_id = newuser.id)
     >>> loaduser['name']
     'foo2'
+
+    Within a request the response has a weak ETag and Last-Modified
+    header. Requests with a matching If-None-Match or If-Modified-Since
+    are answered with 304 without loading the complete user.
     """
-    with get_storage() as storage:
+    with unit_of_work() as storage:
+        if is_conditional():
+            version = storage.session.query(User.uuid, User.updated)
+            version = version.filter(User.id == item_id).first()
+            if version is not None:
+                check_not_modified(_etag(version), version.updated)
         user = _read(storage, User, item_id)
-        user = user.get_values()
+        check_not_modified(_etag(user), user.updated)
+        user = serialize(user)
     return user
 
 
-@config_view_endpoint(path="/users/{item_id}", method="PUT", auth=None)
+@endpoint(path="/users/{item_id}", method="PUT", auth=None,
+          scope="write")
 def update(item_id, values):
     """Update a user with the given values in the database.
 
@@ -106,14 +368,26 @@ def update(item_id, values):
     >>> updateduser = tedega_core.api.user.update(item_id = newuser.id, values=values)
     >>> updateduser['name']
     'baz'
+
+    Requests with an If-Match header are rejected with 412 if the user
+    has been changed since the client loaded the given version.
     """
-    with get_storage() as storage:
+    with unit_of_work() as storage:
+        if has_if_match():
+            # Lock the row so nobody changes it between check and update.
+            query = storage.session.query(User).filter(User.id == item_id)
+            current = query.with_for_update().first()
+            if current is not None:
+                check_match(_etag(current))
         user = _update(storage, User, item_id, values)
-        user = user.get_values()
+        storage.session.flush()
+        add_headers({"ETag": _etag(user)})
+        user = serialize(user)
     return user
 
 
-@config_view_endpoint(path="/users/{item_id}", method="DELETE", auth=None)
+@endpoint(path="/users/{item_id}", method="DELETE", auth=None,
+          scope="write")
 def delete(item_id):
     """Deletes a user from the database.
 
@@ -132,11 +406,123 @@ def delete(item_id):
         ...
     sqlalchemy.orm.exc.NoResultFound: No row was found for one()
     """
-    with get_storage() as storage:
+    with unit_of_work() as storage:
         return _delete(storage, User, item_id)
 
 
-@config_view_endpoint(path="/users/{item_id}/password", method="POST", auth=None)
+def _invalid_update(table, item):
+    if not isinstance(item, dict) or not isinstance(item.get("id"), int):
+        return "id required"
+    for field in item:
+        if field in READONLY_FIELDS and field != "id":
+            return "Field '{}' can not be changed".format(field)
+        if field not in table.columns:
+            return "Unknown field '{}'".format(field)
+    if "password" in item and not isinstance(item["password"], str):
+        return "Invalid password"
+    if "name" in item and not isinstance(item["name"], str):
+        return "Invalid name"
+    return None
+
+
+def _existing_ids(session, ids):
+    query = session.query(User.id).filter(User.id.in_(ids))
+    return set(id_ for id_, in query)
+
+
+@endpoint(path="/users:bulk", method="PUT", auth=None,
+          scope="write")
+def bulk_update(values=None):
+    """Updates many users at once. Users with the same set of changed
+    fields are updated with one statement.
+
+    :values: List of dictionaries with the `id` of the user and the
+             values to change. If omitted the users are read from a
+             newline delimited JSON body.
+    :returns: List with a dictionary for each user with its `index` in
+              the request and a `status` (200, 400, 404 or 409).
+    """
+    table = User.__table__
+    statement = table.update().where(table.c.id == sa.bindparam("_id"))
+    results = []
+    with unit_of_work() as storage:
+        session = storage.session
+        for batch in batches(enumerate(read_items(values)), BULK_BATCH_SIZE):
+            valid = []
+            for index, item in batch:
+                error = _invalid_update(table, item)
+                if error:
+                    results.append(result(index, 400, error=error))
+                else:
+                    valid.append((index, item))
+            ids = [item["id"] for _, item in valid]
+            existing = _existing_ids(session, ids)
+            items = []
+            for index, item in valid:
+                if item["id"] not in existing:
+                    results.append(result(index, 404))
+                    continue
+                params = dict(item)
+                params["_id"] = params.pop("id")
+                if "name" in params:
+                    params["name_key"] = normalize_name(params["name"])
+                items.append((index, set_defaults(table, params, update=True)))
+            with_password = [params for _, params in items
+                             if "password" in params]
+            passwords = encrypt_passwords([params["password"]
+                                           for params in with_password])
+            for params, password in zip(with_password, passwords):
+                params["password"] = password
+            groups = {}
+            for index, params in items:
+                groups.setdefault(tuple(sorted(params)), []).append(
+                    (index, params))
+            for group in groups.values():
+                execute_batch(session, statement, group, results, 200)
+            session.commit()
+    results.sort(key=lambda item: item["index"])
+    return results
+
+
+@endpoint(path="/users:bulk", method="DELETE", auth=None,
+          scope="write")
+def bulk_delete(values=None):
+    """Deletes many users at once.
+
+    :values: List of ids of the users to delete. If omitted the ids are
+             read from a newline delimited JSON body.
+    :returns: List with a dictionary for each user with its `index` in
+              the request and a `status` (204, 400, 404 or 409).
+    """
+    table = User.__table__
+    statement = table.delete().where(table.c.id == sa.bindparam("_id"))
+    results = []
+    with unit_of_work() as storage:
+        session = storage.session
+        for batch in batches(enumerate(read_items(values)), BULK_BATCH_SIZE):
+            valid = []
+            for index, item in batch:
+                if isinstance(item, dict):
+                    item = item.get("id")
+                if isinstance(item, int):
+                    valid.append((index, item))
+                else:
+                    results.append(result(index, 400, error="id required"))
+            existing = _existing_ids(session, [id_ for _, id_ in valid])
+            items = []
+            for index, id_ in valid:
+                if id_ in existing:
+                    items.append((index, dict(_id=id_)))
+                else:
+                    results.append(result(index, 404))
+            execute_batch(session, statement, items, results, 204)
+            session.commit()
+    results.sort(key=lambda item: item["index"])
+    return results
+
+
+@endpoint(path="/users/{item_id}/password", method="POST", auth=None,
+          scope="write")
 def reset_password(item_id, password=None):
     """Will reset the password of the user.
 
@@ -159,7 +545,7 @@ def reset_password(item_id, password=None):
     >>> result != "newpass"
     True
     """
-    with get_storage() as storage:
+    with unit_of_work() as storage:
         user = _read(storage, User, item_id)
         new_password = user.reset_password(password)
     return new_password
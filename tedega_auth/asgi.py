@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""ASGI entry point of the service. Run it with an ASGI server, e.g.::
+
+    uvicorn tedega_auth.asgi:application
+
+The ASGI server holds the connections in its event loop; requests are
+handled by the WSGI application in the thread pool of
+:mod:`tedega_auth.api.aio`, with the same endpoints and scope checks as
+under a WSGI server.
+"""
+from tedega_auth.api.aio import get_executor
+from tedega_auth.lib.asgi import WsgiToAsgi
+from tedega_auth.server import build_app
+application = WsgiToAsgi(build_app("tedega_auth"), get_executor())
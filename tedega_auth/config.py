@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Runtime settings of the service. Every setting can be overwritten
+by an environment variable with the uppercased name of the setting
+prefixed by ``TEDEGA_AUTH_``. E.g. ``client_cache_size`` can be set
+by ``TEDEGA_AUTH_CLIENT_CACHE_SIZE=4096``."""
+import multiprocessing
+import os
+
+PREFIX = "TEDEGA_AUTH_"
+
+DEFAULTS = {
+    # Key used to hash client secrets. Must be the same for all
+    # instances of the service and should be changed for production.
+    "secret_key": "change-me",
+    # Key signing the login session cookie of the authorization code
+    # grant. Required, must differ from secret_key and be the same for
+    # all instances of the service.
+    "session_key": "",
+    # Maximum number of client credentials held in the login cache.
+    "client_cache_size": 10000,
+    # Seconds a cached client credential is considered to be valid.
+    "client_cache_ttl": 300,
+    # Directory with PEM encoded private keys used to sign tokens.
+    "key_dir": "",
+    # Kid (filename without extension) of the key used for signing.
+    # Defaults to the last key in the key directory.
+    "signing_kid": "",
+    # Algorithm of the temporary key if no key directory is configured.
+    # Either "RS256" or "EdDSA".
+    "signing_algorithm": "RS256",
+    # Seconds the JSON Web Key Set may be cached by clients.
+    "jwks_max_age": 3600,
+    # Issuer ("iss") and audience ("aud") of the issued tokens.
+    "issuer": "tedega_auth",
+    "audience": "tedega",
+    # Seconds an access token is valid. Access tokens can not be
+    # revoked on their own, so keep this short.
+    "access_token_ttl": 300,
+    # Seconds a refresh token is valid.
+    "refresh_token_ttl": 30 * 24 * 3600,
+    # Seconds an authorization code of the authorization code grant is
+    # valid.
+    "auth_code_ttl": 60,
+    # Seconds between loading new revocations from the storage.
+    "revocation_sync_interval": 10,
+    # Require a bearer token granting the scope of the endpoint (e.g.
+    # "read" or "write" for /users). Clients registered before scopes
+    # were stored have no scopes, so this is off by default.
+    "enforce_scopes": False,
+    # Encode JSON responses with orjson if it is installed.
+    "fast_json": True,
+    # Compress responses with gzip, or brotli if it is installed, if
+    # the client accepts it and they have at least compress_min_size
+    # bytes.
+    "compression": True,
+    "compress_min_size": 1024,
+    # Compression level of gzip (1-9) and quality of brotli (0-11).
+    "compress_level": 6,
+    "brotli_quality": 4,
+    # Pages of GET /users with at least this many users are streamed
+    # while they are loaded instead of being built in memory first.
+    "stream_threshold": 1000,
+    # Threads running the endpoints called through tedega_auth.api.aio
+    # and the requests served by tedega_auth.asgi.
+    "async_workers": 32,
+    # Requests per IP to /login and /clients allowed within
+    # ratelimit_window seconds. 0 disables the limit.
+    "ratelimit_ip": 600,
+    # Failed logins per client_id or username and per IP allowed within
+    # ratelimit_window seconds. 0 disables the limit.
+    "ratelimit_failures": 10,
+    "ratelimit_window": 300,
+    # Number of reverse proxies in front of the service whose
+    # X-Forwarded-For and X-Forwarded-Proto headers are trusted. The
+    # rate limits per IP count the client address the proxies report.
+    # 0 uses the address of the connection.
+    "trusted_proxies": 0,
+    # Url of the key value store holding state shared by all workers
+    # (authorization codes, rate limit counters), e.g.
+    # "redis://localhost:6379/0". Empty keeps the state in the memory
+    # of each worker.
+    "kv_url": "",
+    "kv_pool_size": 10,
+    # Seconds to wait for the key value store.
+    "kv_timeout": 1.0,
+    # Settings of the database connection pool.
+    "db_pool_size": 10,
+    "db_max_overflow": 20,
+    "db_pool_timeout": 30,
+    # Seconds after which connections are recycled. -1 to disable.
+    "db_pool_recycle": 3600,
+    # Test connections before use.
+    "db_pool_pre_ping": True,
+    # Maximum seconds between retries of a failed initialisation of the
+    # storage on start.
+    "storage_retry_max": 60,
+    # Comma separated host:port targets probed in the background to
+    # monitor the connectivity of the service. Empty to disable.
+    "connectivity_targets": "www.google.com:80",
+    # Number of workers hashing passwords.
+    "hash_workers": multiprocessing.cpu_count(),
+    # Number of hashing jobs waiting for a worker before new jobs are
+    # rejected with 503.
+    "hash_queue_limit": 64,
+    # Use processes instead of threads for hashing.
+    "hash_processes": False,
+    # Iterations of new password hashes. 0 calibrates the iterations on
+    # start so that one hash takes about hash_target_time seconds,
+    # rounded down to a power of two. Set a fixed value if the workers
+    # run on different hardware.
+    "hash_iterations": 0,
+    "hash_target_time": 0.25,
+}
+
+
+def _convert(value, default):
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes", "on")
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+def get(name):
+    """Returns the value of the setting `name`. Values from the
+    environment are converted into the type of the default value.
+
+    :name: Name of the setting.
+    :returns: Value of the setting.
+
+    >>> get("client_cache_size")
+    10000
+    """
+    default = DEFAULTS[name]
+    value = os.environ.get(PREFIX + name.upper())
+    if value is None:
+        return default
+    return _convert(value, default)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Adapter serving a WSGI application to an ASGI server. The event loop
+of the server holds the connections; the WSGI application runs in a
+thread pool, so as many requests run at a time as the pool has threads.
+The request body is read completely before the application is called,
+the response body is sent chunk by chunk as the application yields it.
+"""
+import asyncio
+import io
+import sys
+
+
+def build_environ(scope, body):
+    """Returns the WSGI environ of the HTTP request `scope` with the
+    request body `body`."""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8")
+        .decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": str(server[0]),
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/{}".format(scope.get("http_version",
+                                                      "1.1")),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        # The body has been read completely.
+        "wsgi.input_terminated": True,
+    }
+    client = scope.get("client")
+    if client:
+        environ["REMOTE_ADDR"] = client[0]
+        environ["REMOTE_PORT"] = str(client[1])
+    for name, value in scope.get("headers", ()):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = name
+        else:
+            key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + "," + value
+        environ[key] = value
+    return environ
+
+
+class WsgiToAsgi(object):
+
+    """ASGI application calling the WSGI application `app` in
+    `executor`. The default executor of the event loop is used if
+    `executor` is None."""
+
+    def __init__(self, app, executor=None):
+        self.app = app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError("Unsupported scope type {}".format(scope["type"]))
+        body = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        environ = build_environ(scope, b"".join(body))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._run, environ, loop,
+                                   send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _run(self, environ, loop, send):
+        """Runs the WSGI application in a thread of the executor and
+        passes the response to `send` in the event loop `loop`."""
+        response = {}
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def send_start():
+            if response.pop("start", None) is not None:
+                send_message({"type": "http.response.start",
+                              "status": response["status"],
+                              "headers": response["headers"]})
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and "status" in response \
+                    and "start" not in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin1"),
+                                    value.encode("latin1"))
+                                   for name, value in headers]
+            response["start"] = True
+            return write
+
+        def write(data):
+            send_start()
+            send_message({"type": "http.response.body", "body": data,
+                          "more_body": True})
+
+        iterable = self.app(environ, start_response)
+        try:
+            for chunk in iterable:
+                if chunk:
+                    write(chunk)
+            send_start()
+            send_message({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
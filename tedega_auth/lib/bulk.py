@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Helpers for endpoints which process many items in one request.
+Items are written in batches with a single executemany statement per
+batch. If a batch fails because of a constraint the items of the batch
+are retried one by one so every item gets its own result."""
+import datetime
+import itertools
+import json
+import uuid
+
+import flask
+import sqlalchemy as sa
+from tedega_view.exceptions import ClientError
+
+
+def batches(iterable, size):
+    """Yields lists of at most `size` items of `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_items(values):
+    """Returns an iterator over the items of a bulk request. The items
+    are either given as JSON array in `values` or, if `values` is None,
+    read line by line from a newline delimited JSON request body.
+
+    :raises: :class:`ClientError` on malformed input.
+    """
+    if values is not None:
+        if not isinstance(values, list):
+            raise ClientError("Expected a list of items")
+        return iter(values)
+    if not flask.has_request_context():
+        return iter(())
+    return _read_ndjson(flask.request.stream)
+
+
+def _read_ndjson(stream):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line.decode("utf-8"))
+        except ValueError:
+            raise ClientError("Malformed JSON line")
+
+
+def result(index, status, **kwargs):
+    """Returns the result of the item at `index` of the request."""
+    kwargs.update(index=index, status=status)
+    return kwargs
+
+
+def set_defaults(table, row, update=False):
+    """Sets the `uuid`, `created` and `updated` values of the `row` of
+    `table` if the table has such columns without defaults. The ORM
+    sets these on single items but bulk statements bypass it."""
+    now = datetime.datetime.utcnow()
+    columns = table.columns
+    if not update:
+        if "uuid" in columns and columns["uuid"].default is None:
+            row.setdefault("uuid", str(uuid.uuid4()))
+        if "created" in columns and columns["created"].default is None:
+            row.setdefault("created", now)
+    if "updated" in columns and columns["updated"].onupdate is None:
+        row.setdefault("updated", now)
+    return row
+
+
+def execute_batch(session, statement, items, results, status):
+    """Executes `statement` for all `items` with a single executemany
+    call. If the batch violates a constraint, every item is executed on
+    its own to find out which items fail.
+
+    :session: Session of the storage.
+    :statement: Statement to execute.
+    :items: List of (index, params) tuples.
+    :results: List the results of the items are appended to.
+    :status: Status of successful items.
+    :returns: List of indices of the successful items.
+    """
+    if not items:
+        return []
+    try:
+        with session.begin_nested():
+            session.execute(statement, [params for _, params in items])
+        done = [index for index, _ in items]
+    except sa.exc.IntegrityError:
+        done = []
+        for index, params in items:
+            try:
+                with session.begin_nested():
+                    session.execute(statement, [params])
+                done.append(index)
+            except sa.exc.IntegrityError as error:
+                results.append(result(index, 409, error=str(error.orig)))
+    results.extend(result(index, status) for index in done)
+    return done
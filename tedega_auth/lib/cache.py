@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""In-process caches."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+
+    """Bounded, thread safe least recently used cache. Entries expire
+    `ttl` seconds after they have been stored. The cache counts hits,
+    misses and evictions so it can be sized under load."""
+
+    def __init__(self, maxsize=1024, ttl=300, timer=time.monotonic):
+        """
+        :maxsize: Maximum number of entries.
+        :ttl: Seconds after which an entry expires.
+        :timer: Function returning the current time in seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key` or `default` if the key
+        is not cached or expired."""
+        now = self._timer()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= now:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Stores `value` under `key`. If the cache is full the least
+        recently used entry will be evicted.
+
+        :ttl: Seconds until the entry expires. Defaults to the `ttl` of
+              the cache.
+        """
+        expires = self._timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Removes `key` from the cache."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Removes all entries from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Returns a dictionary with the counters of the cache."""
+        with self._lock:
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        evictions=self.evictions,
+                        size=len(self._data),
+                        maxsize=self.maxsize)
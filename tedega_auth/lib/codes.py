@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Authorization codes of the OAuth2 authorization code grant. Codes
+are short lived and single use. They are kept in the key value store
+(see :mod:`tedega_auth.lib.kv`), so issuing and redeeming a code does
+not touch the storage."""
+import base64
+import hashlib
+import hmac
+import json
+import re
+import secrets
+from collections import namedtuple
+
+from tedega_auth import config
+from tedega_auth.lib import kv
+
+AuthorizationCode = namedtuple("AuthorizationCode",
+                               ["client_id", "user_id", "redirect_uri",
+                                "scopes", "code_challenge",
+                                "code_challenge_method"])
+"""Grant behind an authorization code. `redirect_uri` is the uri given
+in the authorization request or None."""
+
+CHALLENGE_METHODS = ("S256", "plain")
+
+_verifier_re = re.compile(r"^[A-Za-z0-9\-._~]{43,128}\Z")
+
+
+def verify_code_challenge(verifier, challenge, method="S256"):
+    """Returns True if the PKCE `verifier` matches the `challenge` of
+    the authorization request (RFC 7636).
+
+    :verifier: Code verifier sent with the token request.
+    :challenge: Code challenge sent with the authorization request.
+    :method: "S256" or "plain".
+
+    >>> verifier = "a" * 43
+    >>> verify_code_challenge(verifier, verifier, "plain")
+    True
+    """
+    if not verifier or not challenge or not _verifier_re.match(verifier):
+        return False
+    if method == "S256":
+        digest = hashlib.sha256(verifier.encode("ascii")).digest()
+        computed = (base64.urlsafe_b64encode(digest).rstrip(b"=")
+                    .decode("ascii"))
+    elif method == "plain":
+        computed = verifier
+    else:
+        return False
+    return hmac.compare_digest(computed, challenge)
+
+
+class CodeStore(object):
+
+    """Store of :class:`AuthorizationCode` by code. Codes expire `ttl`
+    seconds after they have been issued and can only be redeemed once.
+    Only a hash of the code is used as key in the key value store."""
+
+    def __init__(self, store=None, ttl=60, prefix="code:"):
+        """
+        :store: :class:`tedega_auth.lib.kv.KVStore`. Defaults to a new
+                :class:`tedega_auth.lib.kv.MemoryKV`.
+        :ttl: Seconds a code is valid.
+        :prefix: Prefix of the keys in the store.
+        """
+        self.store = store if store is not None else kv.MemoryKV()
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, code):
+        digest = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        return self.prefix + digest
+
+    def issue(self, grant):
+        """Stores `grant` and returns the new code for it.
+
+        :grant: :class:`AuthorizationCode`
+        :returns: Code to send to the client.
+        """
+        code = secrets.token_urlsafe(32)
+        self.store.set(self._key(code), json.dumps(grant), ttl=self.ttl)
+        return code
+
+    def redeem(self, code):
+        """Removes `code` and returns its grant.
+
+        :code: Code sent by the client.
+        :returns: :class:`AuthorizationCode` or None if the code is
+                  unknown, expired or has already been redeemed.
+        """
+        value = self.store.take(self._key(code))
+        if value is None:
+            return None
+        grant = AuthorizationCode(*json.loads(value))
+        return grant._replace(scopes=tuple(grant.scopes))
+
+
+codes = CodeStore(kv.store, config.get("auth_code_ttl"))
+"""Authorization codes of the service."""
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""WSGI middleware compressing responses with the encoding negotiated
+by the ``Accept-Encoding`` header of the request. Brotli is preferred
+if the ``brotli`` package is installed and the client accepts it,
+otherwise gzip is used.
+
+Responses with a ``Content-Length`` are compressed at once if they are
+at least `min_size` bytes long. Streamed responses are compressed chunk
+by chunk, each chunk is flushed so the client receives it without
+delay. Streams which end before `min_size` bytes are sent
+uncompressed.
+
+Compressing a secret together with data an attacker can inject into
+the same response reveals the secret by the compressed size (BREACH).
+HTML pages, which carry the CSRF token of the login forms, responses
+setting a cookie and responses marked ``Cache-Control: no-store``, like
+the token responses, are therefore never compressed."""
+import functools
+import zlib
+
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset(["application/json",
+                                "application/x-ndjson",
+                                "application/javascript",
+                                "application/xml",
+                                "image/svg+xml"])
+"""Content types which are compressed besides ``text/*`` and
+``*+json``."""
+
+EXCLUDED_TYPES = frozenset(["text/html"])
+"""Content types which are never compressed as they may carry secrets
+next to reflected input."""
+
+
+class GzipCompressor(object):
+
+    def __init__(self, level=6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor(object):
+
+    def __init__(self, quality=4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate(accept_encoding):
+    """Returns the encoding for the `accept_encoding` header of a
+    request or None if the response is not compressed.
+
+    :accept_encoding: Value of the ``Accept-Encoding`` header.
+    :returns: "br", "gzip" or None.
+
+    >>> negotiate("gzip, deflate")
+    'gzip'
+    >>> negotiate("gzip;q=0, identity") is None
+    True
+    """
+    accepted = parse_accept_header(accept_encoding)
+    gzip = accepted["gzip"]
+    if brotli is not None and accepted["br"] > 0 and accepted["br"] >= gzip:
+        return "br"
+    if gzip > 0:
+        return "gzip"
+    return None
+
+
+def is_compressible(content_type):
+    """Returns True if responses of `content_type` are compressed.
+
+    >>> is_compressible("application/json; charset=utf-8")
+    True
+    >>> is_compressible("text/html; charset=utf-8")
+    False
+    """
+    mimetype = content_type.split(";", 1)[0].strip().lower()
+    if mimetype in EXCLUDED_TYPES:
+        return False
+    return (mimetype.startswith("text/") or mimetype.endswith("+json") or
+            mimetype in COMPRESSIBLE_TYPES)
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _vary(headers):
+    """Returns `headers` with ``Accept-Encoding`` added to Vary."""
+    vary = _header(headers, "Vary")
+    if vary is None:
+        return headers + [("Vary", "Accept-Encoding")]
+    if "accept-encoding" in vary.lower() or vary.strip() == "*":
+        return headers
+    return [(key, value) if key.lower() != "vary"
+            else (key, value + ", Accept-Encoding")
+            for key, value in headers]
+
+
+def _encoded(headers, encoding, length):
+    """Returns the headers of the response compressed with `encoding`.
+    The ETag is weakened as the compressed body differs from the one
+    it was built for."""
+    result = []
+    for key, value in headers:
+        name = key.lower()
+        if name == "content-length":
+            continue
+        if name == "etag" and not value.startswith("W/"):
+            value = "W/" + value
+        result.append((key, value))
+    result.append(("Content-Encoding", encoding))
+    if length is not None:
+        result.append(("Content-Length", str(length)))
+    return _vary(result)
+
+
+class CompressionMiddleware(object):
+
+    """Compresses the responses of a WSGI application."""
+
+    def __init__(self, app, min_size=1024, level=6, brotli_quality=4):
+        """
+        :app: WSGI application.
+        :min_size: Minimum size in bytes of compressed responses.
+        :level: Compression level of gzip (1-9).
+        :brotli_quality: Quality of brotli (0-11).
+        """
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+
+    def compressor(self, encoding):
+        """Returns a new compressor for `encoding`."""
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.level)
+
+    def _should_compress(self, status, headers):
+        code = int(status.split(" ", 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        if _header(headers, "Content-Encoding") is not None:
+            return False
+        cache_control = _header(headers, "Cache-Control") or ""
+        if "no-transform" in cache_control or "no-store" in cache_control:
+            return False
+        if _header(headers, "Set-Cookie") is not None:
+            return False
+        return is_compressible(_header(headers, "Content-Type") or "")
+
+    def __call__(self, environ, start_response):
+        encoding = None
+        if environ.get("REQUEST_METHOD") != "HEAD":
+            encoding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            def _start_response(status, headers, exc_info=None):
+                if self._should_compress(status, headers):
+                    headers = _vary(headers)
+                return start_response(status, headers, exc_info)
+            return self.app(environ, _start_response)
+
+        response = []
+        written = []
+
+        def _capture(status, headers, exc_info=None):
+            response[:] = [status, headers, exc_info]
+            return written.append
+        iterable = self.app(environ, _capture)
+        return self._respond(iterable, response, written, encoding,
+                             start_response)
+
+    def _respond(self, iterable, response, written, encoding,
+                 start_response):
+        """Generator sending the response of the application. The
+        response is started before the first chunk of the body is
+        sent, which WSGI allows."""
+        try:
+            chunks = iter(iterable)
+            pending = written
+            while not response:
+                # The application starts its response lazily.
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append(chunk)
+            if not response:
+                raise RuntimeError("The application returned without "
+                                   "starting a response")
+            status, headers, exc_info = response
+            if not self._should_compress(status, headers):
+                start_response(status, headers, exc_info)
+                for chunk in pending:
+                    yield chunk
+                for chunk in chunks:
+                    yield chunk
+                return
+            length = _header(headers, "Content-Length")
+            if length is not None and int(length) < self.min_size:
+                start_response(status, _vary(headers), exc_info)
+                for chunk in pending:
+                    yield chunk
+                for chunk in chunks:
+                    yield chunk
+                return
+            # Wait for min_size bytes to decide whether a stream is
+            # compressed.
+            size = sum(len(chunk) for chunk in pending)
+            while length is None and size < self.min_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    body = b"".join(pending)
+                    headers = _vary(headers + [("Content-Length",
+                                                str(len(body)))])
+                    start_response(status, headers, exc_info)
+                    yield body
+                    return
+                pending.append(chunk)
+                size += len(chunk)
+            compressor = self.compressor(encoding)
+            if length is not None:
+                body = compressor.compress(b"".join(pending))
+                body += b"".join(compressor.compress(chunk)
+                                 for chunk in chunks)
+                body += compressor.finish()
+                start_response(status,
+                               _encoded(headers, encoding, len(body)),
+                               exc_info)
+                yield body
+                return
+            start_response(status, _encoded(headers, encoding, None),
+                           exc_info)
+            yield (compressor.compress(b"".join(pending)) +
+                   compressor.flush())
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk) + compressor.flush()
+            yield compressor.finish()
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
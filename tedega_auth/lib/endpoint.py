@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Decorator to configure the endpoints of the service."""
+import functools
+
+import flask
+from tedega_view import AuthError, config_view_endpoint
+
+from tedega_auth import config
+from tedega_auth.lib.metrics import track_request
+from tedega_auth.lib.storage import request_scope
+from tedega_auth.lib.errors import InvalidToken
+from tedega_auth.lib.tokens import validate_token
+
+
+def check_token(token, scope):
+    """Checks that the bearer `token` grants `scope`.
+
+    :token: Bearer token or None.
+    :scope: Required scope.
+    :returns: Claims of the token.
+    :raises: :class:`AuthError` if the token is missing, invalid or
+             does not grant the scope.
+    """
+    if not token or not token.strip():
+        raise AuthError("Missing bearer token")
+    try:
+        return validate_token(token.strip(), scope)
+    except InvalidToken as error:
+        raise AuthError(str(error))
+
+
+def require_scope(scope):
+    """Checks that the bearer token of the current request grants
+    `scope`. The claims of the token are stored in
+    ``flask.g.token_claims``. Outside a request nothing is checked.
+
+    :scope: Required scope.
+    :raises: :class:`AuthError` if the token is missing, invalid or
+             does not grant the scope.
+    """
+    if not flask.has_request_context():
+        return
+    header = flask.request.headers.get("Authorization", "")
+    kind, _, token = header.partition(" ")
+    if kind.lower() != "bearer":
+        raise AuthError("Missing bearer token")
+    flask.g.token_claims = check_token(token, scope)
+
+
+def endpoint(path, method, auth=None, scope=None):
+    """Configures the decorated function as endpoint for `path` and
+    `method` like :func:`tedega_view.config_view_endpoint`. Each call
+    runs in a :class:`request_scope`, so it uses a single storage
+    session, and records metrics. The metrics of streamed responses
+    are recorded when their body is closed.
+
+    :path: Path of the endpoint.
+    :method: HTTP method of the endpoint.
+    :auth: Authorisation passed to :func:`config_view_endpoint`.
+    :scope: Scope the bearer token of the request must grant. Only
+            checked if the setting ``enforce_scopes`` is enabled.
+    """
+    name = "{} {}".format(method, path)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracker = track_request(name)
+            with tracker:
+                if scope is not None and config.get("enforce_scopes"):
+                    require_scope(scope)
+                with request_scope():
+                    result = func(*args, **kwargs)
+                if isinstance(result, flask.Response) and result.is_streamed:
+                    # The body is generated after this function returned.
+                    result.response = tracker.stream(result.response)
+                return result
+        return config_view_endpoint(path=path, method=method,
+                                    auth=auth)(wrapper)
+    return decorator
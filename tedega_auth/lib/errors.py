@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Errors of the token validation. This module has no dependencies, so
+services which only validate tokens can import them without loading
+the storage or the signing keys."""
+
+
+class InvalidToken(Exception):
+    """The token is not valid."""
+
+
+class InsufficientScope(InvalidToken):
+    """The token is valid but misses a required scope."""
+
+
+class RevokedToken(InvalidToken):
+    """The refresh token the token was issued with has been revoked."""
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Password hashing in a bounded worker pool. Hashing passwords is
+deliberately slow. Running it on the request thread lets a burst of
+requests which hash passwords block all workers of the service. The
+pool limits the number of concurrent and queued hashing jobs and
+rejects new jobs with 503 if the limit is reached."""
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from tedega_auth import config
+from tedega_auth.lib import passwords
+from tedega_auth.lib.metrics import add_hash_time
+
+
+class Overloaded(ServiceUnavailable):
+
+    """Raised if the pool can not accept more jobs. Renders as HTTP
+    503 with a Retry-After header."""
+
+    description = "Too many password hashing requests. Retry later."
+
+    def get_headers(self, environ=None, scope=None):
+        headers = super(Overloaded, self).get_headers(environ)
+        headers.append(("Retry-After", "1"))
+        return headers
+
+
+def _timed(func, *args):
+    """Returns the result of `func` and the seconds it took. Runs in
+    the worker, so the time does not include the wait for it."""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class HashingPool(object):
+
+    """Executor for password hashing with admission control. At most
+    `workers` jobs run concurrently and at most `queue_limit` jobs wait
+    for a free worker. Further jobs are rejected with
+    :class:`Overloaded`."""
+
+    def __init__(self, workers=4, queue_limit=64, processes=False):
+        """
+        :workers: Number of workers.
+        :queue_limit: Number of jobs waiting for a worker.
+        :processes: Use processes instead of threads as workers.
+        """
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.pending = 0
+        self.rejected = 0
+        self.count = 0
+        self.total_time = 0.0
+        self.queue_time = 0.0
+        self.max_time = 0.0
+
+    def _get_executor(self):
+        # The executor is created (and imported) on first use, so it is
+        # not created before the server forks its workers.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import (
+                        ProcessPoolExecutor,
+                        ThreadPoolExecutor
+                    )
+                    if self.processes:
+                        executor = ProcessPoolExecutor(self.workers)
+                    else:
+                        executor = ThreadPoolExecutor(self.workers)
+                    self._executor = executor
+        return self._executor
+
+    def run(self, func, *args):
+        """Runs `func` with the given `args` in the pool and waits for
+        its result.
+
+        :raises: :class:`Overloaded` if the pool is full.
+        """
+        if not self._slots.acquire(False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+        with self._lock:
+            self.pending += 1
+        try:
+            job = self._submit(func, args)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+            raise
+        return self._result(job)
+
+    def map(self, func, *iterables):
+        """Runs `func` for each set of arguments from `iterables` in the
+        pool and yields the results in order. Unlike :meth:`run` jobs
+        are not rejected but wait for a free slot. At most `workers`
+        jobs of one call are queued at the same time, so the remaining
+        slots stay available for single jobs.
+        """
+        window = []
+        try:
+            for args in zip(*iterables):
+                window.append(self._submit_waiting(func, args))
+                if len(window) >= self.workers:
+                    yield self._result(window.pop(0))
+            while window:
+                yield self._result(window.pop(0))
+        finally:
+            # Free the slots of jobs whose results are not consumed.
+            for job in window:
+                job[1].cancel()
+                try:
+                    self._result(job)
+                except Exception:
+                    pass
+
+    def _submit_waiting(self, func, args):
+        self._slots.acquire()
+        with self._lock:
+            self.pending += 1
+        return self._submit(func, args)
+
+    def _submit(self, func, args):
+        return (time.monotonic(),
+                self._get_executor().submit(_timed, func, *args))
+
+    def _result(self, job):
+        start, future = job
+        duration = 0.0
+        try:
+            result, duration = future.result()
+            return result
+        finally:
+            latency = time.monotonic() - start
+            queued = max(latency - duration, 0.0)
+            add_hash_time(duration, queued)
+            with self._lock:
+                self.pending -= 1
+                self.count += 1
+                self.total_time += duration
+                self.queue_time += queued
+                self.max_time = max(self.max_time, latency)
+            self._slots.release()
+
+    def stats(self):
+        """Returns a dictionary with the number of pending (queued and
+        running) jobs, the number of rejected jobs, the total seconds
+        the finished jobs spent hashing and waiting for a worker, and
+        their maximum latency."""
+        with self._lock:
+            return dict(pending=self.pending,
+                        rejected=self.rejected,
+                        count=self.count,
+                        total_time=self.total_time,
+                        queue_time=self.queue_time,
+                        max_time=self.max_time)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+pool = HashingPool(config.get("hash_workers"),
+                   config.get("hash_queue_limit"),
+                   config.get("hash_processes"))
+"""Pool used by :func:`encrypt_password` and :func:`verify_password`."""
+
+
+def encrypt_password(password):
+    """Returns the hash of the `password` computed in the :data:`pool`
+    with the cost of the current :data:`passwords.policy`."""
+    return pool.run(passwords.encrypt, password,
+                    passwords.policy.iterations)
+
+
+def encrypt_passwords(passwords_):
+    """Yields the hashes of the given `passwords_` computed in parallel
+    in the :data:`pool`."""
+    iterations = passwords.policy.iterations
+    return pool.map(passwords.encrypt, passwords_,
+                    [iterations] * len(passwords_))
+
+
+def verify_password(password, encrypted_password):
+    """Checks the `password` against the `encrypted_password` in the
+    :data:`pool`."""
+    return pool.run(passwords.verify, password, encrypted_password)
+
+
+def needs_rehash(encrypted_password):
+    """Returns True if `encrypted_password` does not match the current
+    :data:`passwords.policy`."""
+    return passwords.policy.needs_rehash(encrypted_password)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Helpers to influence the HTTP response of endpoints which otherwise
+only return their values."""
+import datetime
+import hashlib
+
+import flask
+from werkzeug.exceptions import PreconditionFailed
+from werkzeug.http import http_date, quote_etag, unquote_etag
+
+
+def add_headers(headers):
+    """Adds the given `headers` to the response of the current request.
+    Does nothing if the endpoint is not called within a request, e.g.
+    when called directly in tests.
+
+    :headers: Dictionary of headers.
+    """
+    if not flask.has_request_context():
+        return
+
+    @flask.after_this_request
+    def _add_headers(response):
+        for name, value in headers.items():
+            response.headers[name] = value
+        return response
+
+
+def make_etag(*parts):
+    """Returns a weak ETag for the given version `parts`, e.g. the uuid
+    and the update time of an item.
+
+    >>> make_etag("abc", 1)[:3]
+    'W/"'
+    """
+    digest = hashlib.sha1("|".join(str(part) for part in parts)
+                          .encode("utf-8")).hexdigest()
+    return quote_etag(digest, weak=True)
+
+
+def is_conditional():
+    """Returns True if the current request asks whether the client's
+    version is still current."""
+    if not flask.has_request_context():
+        return False
+    headers = flask.request.headers
+    return "If-None-Match" in headers or "If-Modified-Since" in headers
+
+
+def check_not_modified(etag, last_modified=None):
+    """Sets the ETag and Last-Modified headers of the response. If the
+    client already has this version (If-None-Match or
+    If-Modified-Since) the request is answered with 304 Not Modified.
+    Does nothing outside a request.
+
+    :etag: ETag of the current version, see :func:`make_etag`.
+    :last_modified: Naive UTC datetime of the last change or None.
+    """
+    if not flask.has_request_context():
+        return
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0,
+                                              tzinfo=datetime.timezone.utc)
+        headers["Last-Modified"] = http_date(last_modified)
+    request = flask.request
+    if request.if_none_match:
+        modified = not request.if_none_match.contains_weak(
+            unquote_etag(etag)[0])
+    elif request.if_modified_since and last_modified is not None:
+        modified = last_modified > request.if_modified_since
+    else:
+        modified = True
+    if not modified:
+        flask.abort(flask.Response(status=304, headers=headers))
+    add_headers(headers)
+
+
+def check_match(etag):
+    """Raises 412 Precondition Failed if the request has an If-Match
+    header which does not match `etag`. The ETags are weak, so they are
+    compared by their value only. Does nothing outside a request.
+
+    :etag: ETag of the current version, see :func:`make_etag`.
+    """
+    if not flask.has_request_context():
+        return
+    if_match = flask.request.if_match
+    if if_match and not if_match.contains_weak(unquote_etag(etag)[0]):
+        raise PreconditionFailed("The item has been changed.")
+
+
+def has_if_match():
+    """Returns True if the current request has an If-Match header."""
+    return (flask.has_request_context() and
+            "If-Match" in flask.request.headers)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Asymmetric keys used to sign the issued tokens. The keys are loaded
+and parsed once on application start. The public part of all keys is
+published as JSON Web Key Set so that resource servers can verify
+tokens locally.
+
+cryptography is only imported when keys are generated or loaded, so
+importing this module stays cheap."""
+import base64
+import os
+import time
+from collections import OrderedDict
+
+from tedega_share import get_logger
+
+from tedega_auth import config
+from tedega_auth.lib.metrics import add_sign_time
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _int_to_b64url(value):
+    length = (value.bit_length() + 7) // 8
+    return _b64url(value.to_bytes(length, "big"))
+
+
+class SigningKey(object):
+
+    """Private key with its key id (`kid`) and signing algorithm."""
+
+    def __init__(self, kid, private_key):
+        """
+        :kid: Unique id of the key. Will be set in the header of the
+        tokens signed with this key.
+        :private_key: RSA or Ed25519 private key.
+        """
+        from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = "RS256"
+        elif isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm = "EdDSA"
+        else:
+            raise ValueError("Unsupported key type for key {}".format(kid))
+
+    def jwk(self):
+        """Returns the public key as JSON Web Key."""
+        if self.algorithm == "RS256":
+            numbers = self.public_key.public_numbers()
+            jwk = {"kty": "RSA",
+                   "n": _int_to_b64url(numbers.n),
+                   "e": _int_to_b64url(numbers.e)}
+        else:
+            from cryptography.hazmat.primitives import serialization
+            raw = self.public_key.public_bytes(
+                serialization.Encoding.Raw,
+                serialization.PublicFormat.Raw)
+            jwk = {"kty": "OKP", "crv": "Ed25519", "x": _b64url(raw)}
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+class KeyRing(object):
+
+    """Collection of :class:`SigningKey` by kid. New tokens are signed
+    with the current key while tokens signed with one of the other
+    keys can still be verified. This allows rotating keys by adding a
+    new key and removing the old one after the tokens signed with it
+    have expired."""
+
+    def __init__(self):
+        self._keys = OrderedDict()
+        self._jwks = {"keys": []}
+        self.current = None
+
+    def add(self, key, current=False):
+        """Adds the :class:`SigningKey` `key`. The key will be used for
+        signing if `current` is True or if it is the first key."""
+        self._keys[key.kid] = key
+        if current or self.current is None:
+            self.current = key
+        self._jwks = {"keys": [k.jwk() for k in self._keys.values()]}
+
+    def clear(self):
+        self._keys.clear()
+        self._jwks = {"keys": []}
+        self.current = None
+
+    def get(self, kid):
+        """Returns the :class:`SigningKey` with the given `kid` or None."""
+        return self._keys.get(kid)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def jwks(self):
+        """Returns the JSON Web Key Set of all keys. The set is built
+        once when keys are added."""
+        return self._jwks
+
+    def sign(self, claims):
+        """Returns a token with the given `claims` signed with the
+        current key.
+
+        :claims: Dictionary of claims.
+        :returns: Encoded token as string.
+        """
+        import jwt
+        key = self.current
+        start = time.perf_counter()
+        token = jwt.encode(claims, key.private_key,
+                           algorithm=key.algorithm,
+                           headers={"kid": key.kid})
+        add_sign_time(time.perf_counter() - start)
+        if isinstance(token, bytes):
+            token = token.decode("utf-8")
+        return token
+
+
+keyring = KeyRing()
+"""Keys of the service. Populated by :func:`init_keys`."""
+
+
+def load_key(path, password=None):
+    """Loads a PEM encoded private key from `path`. The kid of the key
+    is the filename without extension.
+
+    :path: Path to the PEM file.
+    :password: Optional password of the key.
+    :returns: :class:`SigningKey`
+    """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import serialization
+    with open(path, "rb") as keyfile:
+        private_key = serialization.load_pem_private_key(
+            keyfile.read(), password=password, backend=default_backend())
+    kid = os.path.splitext(os.path.basename(path))[0]
+    return SigningKey(kid, private_key)
+
+
+def generate_key(kid, algorithm="RS256"):
+    """Returns a new :class:`SigningKey` with a random private key."""
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
+    if algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537,
+                                               key_size=2048,
+                                               backend=default_backend())
+    return SigningKey(kid, private_key)
+
+
+def init_keys(path=None):
+    """Loads all ``*.pem`` files in the directory `path` into the
+    :data:`keyring`. Keys are added in the order of their filenames, so
+    the last one becomes the signing key unless the `signing_kid`
+    setting names another one. Without a directory a temporary key is
+    generated which is only valid for the lifetime of the process.
+
+    :path: Directory with the private keys.
+    """
+    log = get_logger()
+    keyring.clear()
+    if path:
+        signing_kid = config.get("signing_kid")
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith(".pem"):
+                continue
+            key = load_key(os.path.join(path, filename))
+            keyring.add(key, current=not signing_kid or key.kid == signing_kid)
+    if not len(keyring):
+        log.warning("No signing keys found. Using a temporary key.")
+        keyring.add(generate_key("temporary",
+                                 config.get("signing_algorithm")))
+    log.info("Signing tokens with key '{}' ({})".format(
+        keyring.current.kid, keyring.current.algorithm))
@@ -0,0 +1,403 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Key value stores for state which must be shared by all workers of
+the service, e.g. authorization codes and rate limit counters.
+
+:class:`MemoryKV` keeps the values in the memory of the process and is
+used if only one worker runs. :class:`RedisKV` talks the Redis protocol
+(RESP) to a server shared by all workers. Both support TTLs and
+pipelines, which send several operations in a single round trip::
+
+    pipe = store.pipeline()
+    pipe.incr("a", ttl=60)
+    pipe.get("b")
+    count, value = pipe.execute()
+
+Values are strings; :meth:`KVStore.incr` stores the count as string.
+"""
+import socket
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from tedega_auth import config
+
+
+class KVError(Exception):
+    """The store failed to execute an operation."""
+
+
+class Pipeline(object):
+
+    """Collects operations of a store and executes them in one batch.
+    The methods take the same arguments as the ones of
+    :class:`KVStore`."""
+
+    def __init__(self, store):
+        self._store = store
+        self._calls = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def _add(self, name, *args):
+        self._calls.append((name, args))
+        return self
+
+    def get(self, key):
+        return self._add("get", key)
+
+    def set(self, key, value, ttl=None):
+        return self._add("set", key, value, ttl)
+
+    def delete(self, key):
+        return self._add("delete", key)
+
+    def incr(self, key, amount=1, ttl=None):
+        return self._add("incr", key, amount, ttl)
+
+    def take(self, key):
+        return self._add("take", key)
+
+    def execute(self):
+        """Executes the collected operations.
+
+        :returns: List with the result of each operation.
+        """
+        calls, self._calls = self._calls, []
+        if not calls:
+            return []
+        return self._store._execute(calls)
+
+
+class KVStore(object):
+
+    """Base of the stores. Subclasses implement :meth:`_execute`."""
+
+    def _execute(self, calls):
+        """Executes the list of (name, args) operations and returns
+        their results."""
+        raise NotImplementedError()
+
+    def _call(self, name, *args):
+        return self._execute([(name, args)])[0]
+
+    def pipeline(self):
+        """Returns a new :class:`Pipeline`."""
+        return Pipeline(self)
+
+    def get(self, key):
+        """Returns the value of `key` or None."""
+        return self._call("get", key)
+
+    def get_many(self, keys):
+        """Returns a list with the values of `keys` in one batch."""
+        return self._execute([("get", (key,)) for key in keys])
+
+    def set(self, key, value, ttl=None):
+        """Sets `key` to the string `value`. It expires after `ttl`
+        seconds if given."""
+        return self._call("set", key, value, ttl)
+
+    def delete(self, key):
+        """Removes `key`. Returns True if it existed."""
+        return self._call("delete", key)
+
+    def incr(self, key, amount=1, ttl=None):
+        """Increments the counter `key` by `amount` and returns the new
+        count. Missing keys start at 0. If `ttl` is given the key
+        expires `ttl` seconds after the last increment."""
+        return self._call("incr", key, amount, ttl)
+
+    def take(self, key):
+        """Removes `key` and returns its value or None. Only one caller
+        gets the value of a key."""
+        return self._call("take", key)
+
+    def close(self):
+        pass
+
+
+class MemoryKV(KVStore):
+
+    """Store in the memory of the process. Expired keys are removed on
+    access. If the store grows beyond `max_keys`, the keys used least
+    recently are dropped, which takes constant time per key."""
+
+    def __init__(self, max_keys=100000, timer=time.monotonic):
+        self.max_keys = max_keys
+        self._timer = timer
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _execute(self, calls):
+        now = self._timer()
+        with self._lock:
+            results = [getattr(self, "_" + name)(now, *args)
+                       for name, args in calls]
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        return results
+
+    def _expires(self, now, ttl):
+        if ttl is None:
+            return None
+        return now + ttl
+
+    def _get(self, now, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def _set(self, now, key, value, ttl):
+        self._data[key] = (value, self._expires(now, ttl))
+        self._data.move_to_end(key)
+        return True
+
+    def _delete(self, now, key):
+        return self._data.pop(key, None) is not None
+
+    def _incr(self, now, key, amount, ttl):
+        count = int(self._get(now, key) or 0) + amount
+        expires = self._expires(now, ttl)
+        if expires is None and key in self._data:
+            expires = self._data[key][1]
+        self._data[key] = (str(count), expires)
+        self._data.move_to_end(key)
+        return count
+
+    def _take(self, now, key):
+        value = self._get(now, key)
+        self._data.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Connection(object):
+
+    """Connection to a server speaking RESP."""
+
+    def __init__(self, host, port, timeout):
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self.socket.makefile("rb")
+
+    def send(self, commands):
+        """Sends all `commands` (lists of arguments) at once."""
+        self.socket.sendall(b"".join(_encode(c) for c in commands))
+
+    def read(self):
+        """Reads one reply. Error replies are returned as
+        :class:`KVError`."""
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise KVError("Connection closed")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode("utf-8")
+        if kind == b"-":
+            return KVError(value.decode("utf-8"))
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(value)
+            if length < 0:
+                return None
+            return [self.read() for i in range(length)]
+        raise KVError("Invalid reply {!r}".format(line))
+
+    def close(self):
+        try:
+            self._reader.close()
+            self.socket.close()
+        except socket.error:
+            pass
+
+
+def _encode(command):
+    parts = [b"*" + str(len(command)).encode("ascii") + b"\r\n"]
+    for arg in command:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode("utf-8")
+        parts.append(b"$" + str(len(arg)).encode("ascii") + b"\r\n" +
+                     arg + b"\r\n")
+    return b"".join(parts)
+
+
+def _ms(ttl):
+    return max(1, int(ttl * 1000))
+
+
+class RedisKV(KVStore):
+
+    """Store on a Redis (or compatible) server. Connections are pooled
+    and reused; all operations of a pipeline are sent in one write and
+    their replies are read afterwards. ``take`` needs GETDEL (Redis
+    6.2)."""
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None,
+                 pool_size=10, timeout=1.0):
+        """
+        :host: Host of the server.
+        :port: Port of the server.
+        :db: Number of the database.
+        :password: Password of the server or None.
+        :pool_size: Maximum number of open connections.
+        :timeout: Seconds to wait for the server or a free connection.
+        """
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """Returns a store for a url like
+        ``redis://:password@host:port/db``."""
+        parsed = urlparse(url)
+        db = parsed.path.strip("/")
+        return cls(host=parsed.hostname or "localhost",
+                   port=parsed.port or 6379,
+                   db=int(db) if db else 0,
+                   password=parsed.password, **kwargs)
+
+    def _connect(self):
+        connection = Connection(self.host, self.port, self.timeout)
+        setup = []
+        if self.password:
+            setup.append(["AUTH", self.password])
+        if self.db:
+            setup.append(["SELECT", self.db])
+        if setup:
+            connection.send(setup)
+            for command in setup:
+                reply = connection.read()
+                if isinstance(reply, KVError):
+                    connection.close()
+                    raise reply
+        return connection
+
+    @contextmanager
+    def connection(self):
+        """Returns a connection of the pool. Connections which failed
+        are closed instead of being returned to the pool."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise KVError("No free connection")
+        try:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                connection = self._connect()
+            try:
+                yield connection
+            except BaseException:
+                connection.close()
+                raise
+            with self._lock:
+                self._idle.append(connection)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        return {"idle": len(self._idle), "size": self.pool_size}
+
+    def _commands(self, name, args):
+        """Returns the commands of an operation. The result of the
+        operation is the reply to the first command."""
+        key = args[0]
+        if name == "get":
+            return [["GET", key]]
+        if name == "take":
+            return [["GETDEL", key]]
+        if name == "delete":
+            return [["DEL", key]]
+        if name == "set":
+            value, ttl = args[1:]
+            if ttl is None:
+                return [["SET", key, value]]
+            return [["SET", key, value, "PX", _ms(ttl)]]
+        if name == "incr":
+            amount, ttl = args[1:]
+            commands = [["INCRBY", key, amount]]
+            if ttl is not None:
+                commands.append(["PEXPIRE", key, _ms(ttl)])
+            return commands
+        raise KVError("Unknown operation {}".format(name))
+
+    def _execute(self, calls):
+        commands = []
+        positions = []
+        for name, args in calls:
+            positions.append((name, len(commands)))
+            commands.extend(self._commands(name, args))
+        try:
+            with self.connection() as connection:
+                connection.send(commands)
+                replies = [connection.read() for command in commands]
+        except (socket.error, ValueError) as error:
+            raise KVError(str(error))
+        results = []
+        for name, position in positions:
+            reply = replies[position]
+            if isinstance(reply, KVError):
+                raise reply
+            if name == "set":
+                reply = reply == "OK"
+            elif name == "delete":
+                reply = reply > 0
+            results.append(reply)
+        return results
+
+    def close(self):
+        """Closes all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+def connect(url):
+    """Returns the store for `url`. An empty url or ``memory://``
+    returns a :class:`MemoryKV`, ``redis://`` a :class:`RedisKV`.
+
+    :url: Url of the store.
+    :returns: :class:`KVStore`
+
+    >>> connect("")  # doctest: +ELLIPSIS
+    <tedega_auth.lib.kv.MemoryKV object at ...>
+    """
+    if not url or url.startswith("memory://"):
+        return MemoryKV()
+    if url.startswith("redis://"):
+        return RedisKV.from_url(url, pool_size=config.get("kv_pool_size"),
+                                timeout=config.get("kv_timeout"))
+    raise ValueError("Unsupported key value store {}".format(url))
+
+
+store = connect(config.get("kv_url"))
+"""Store shared by the workers of the service. Configured by the
+``kv_url`` setting."""
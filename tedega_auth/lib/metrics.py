@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Metrics of the service in the Prometheus text format. Besides
+counters and histograms this module tracks the number of SQL
+statements and the time spent in the database, in password hashing and
+in token signing per request, so slow requests can be attributed."""
+import threading
+import time
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, value)
+                          for name, value in labels) + "}"
+
+
+class Counter(object):
+
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Histogram(object):
+
+    """Histogram with cumulative buckets and labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._values.items()):
+                for bound, bucket in zip(self.buckets, counts):
+                    samples.append((self.name + "_bucket",
+                                    key + (("le", repr(float(bound))),),
+                                    bucket))
+                samples.append((self.name + "_bucket",
+                                key + (("le", "+Inf"),), count))
+                samples.append((self.name + "_count", key, count))
+                samples.append((self.name + "_sum", key, total))
+        return samples
+
+
+class Gauge(object):
+
+    """Gauge whose values are collected from a function on export. The
+    function returns a dictionary of label value to value."""
+
+    kind = "gauge"
+
+    def __init__(self, name, description, collect, label="name"):
+        self.name = name
+        self.description = description
+        self._collect = collect
+        self._label = label
+
+    def samples(self):
+        return [(self.name, ((self._label, key),), value)
+                for key, value in sorted(self._collect().items())]
+
+
+class Registry(object):
+
+    """Collection of metrics."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, description):
+        return self.register(Counter(name, description))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    def gauge(self, name, description, collect, label="name"):
+        return self.register(Gauge(name, description, collect, label))
+
+    def export(self):
+        """Returns all metrics in the Prometheus text format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP {} {}".format(metric.name,
+                                               metric.description))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            for name, labels, value in metric.samples():
+                lines.append("{}{} {}".format(name, _format_labels(labels),
+                                              value))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.counter(
+    "tedega_auth_requests_total", "Number of requests per endpoint")
+request_seconds = registry.histogram(
+    "tedega_auth_request_seconds", "Duration of requests per endpoint")
+sql_statements = registry.histogram(
+    "tedega_auth_request_sql_statements",
+    "Number of SQL statements per request", COUNT_BUCKETS)
+db_seconds = registry.histogram(
+    "tedega_auth_request_db_seconds", "Time spent in the database per request")
+hash_seconds = registry.histogram(
+    "tedega_auth_request_hash_seconds",
+    "Time spent in password hashing per request")
+hash_queue_seconds = registry.histogram(
+    "tedega_auth_request_hash_queue_seconds",
+    "Time password hashing jobs waited for a worker per request")
+sign_seconds = registry.histogram(
+    "tedega_auth_request_sign_seconds",
+    "Time spent signing tokens per request")
+
+
+class RequestStats(object):
+
+    """Resources used by the current request."""
+
+    __slots__ = ("sql_statements", "db_time", "hash_time", "hash_queue_time",
+                 "sign_time")
+
+    def __init__(self):
+        self.sql_statements = 0
+        self.db_time = 0.0
+        self.hash_time = 0.0
+        self.hash_queue_time = 0.0
+        self.sign_time = 0.0
+
+    def add(self, other):
+        """Adds the resources used by `other` to these."""
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+
+_local = threading.local()
+
+
+def current_stats():
+    """Returns the :class:`RequestStats` of the current request or None
+    if the code does not run within :func:`track_request`."""
+    return getattr(_local, "stats", None)
+
+
+def add_hash_time(duration, queued=0.0):
+    """Records `duration` seconds of hashing after the job waited
+    `queued` seconds for a worker."""
+    stats = current_stats()
+    if stats is not None:
+        stats.hash_time += duration
+        stats.hash_queue_time += queued
+
+
+def add_sign_time(duration):
+    stats = current_stats()
+    if stats is not None:
+        stats.sign_time += duration
+
+
+@contextmanager
+def _activate(stats):
+    previous = current_stats()
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = previous
+
+
+class track_request(object):
+
+    """Context manager recording the duration, the outcome and the used
+    resources of the code within the context as request to `endpoint`.
+
+    Streamed responses are generated after the context has been left.
+    Pass their body through :meth:`stream` to record it as part of the
+    request, which then ends when the body is closed."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stats = RequestStats()
+        self._streamed = False
+        self._finished = False
+
+    def __enter__(self):
+        self._previous = current_stats()
+        _local.stats = self.stats
+        self._start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.stats = self._previous
+        if self._previous is not None:
+            # Endpoints called by other endpoints count for both.
+            self._previous.add(self.stats)
+        if exc_type is not None:
+            self.finish(exc_type.__name__)
+        elif not self._streamed:
+            self.finish()
+        return False
+
+    def stream(self, iterable):
+        """Returns an iterable over `iterable` whose resources count for
+        this request."""
+        self._streamed = True
+        return _TrackedIterable(self, iterable)
+
+    def finish(self, outcome="ok"):
+        """Records the request. Only the first call counts."""
+        if self._finished:
+            return
+        self._finished = True
+        duration = time.perf_counter() - self._start
+        endpoint = self.endpoint
+        stats = self.stats
+        requests_total.inc(endpoint=endpoint, outcome=outcome)
+        request_seconds.observe(duration, endpoint=endpoint)
+        sql_statements.observe(stats.sql_statements, endpoint=endpoint)
+        db_seconds.observe(stats.db_time, endpoint=endpoint)
+        hash_seconds.observe(stats.hash_time, endpoint=endpoint)
+        hash_queue_seconds.observe(stats.hash_queue_time, endpoint=endpoint)
+        sign_seconds.observe(stats.sign_time, endpoint=endpoint)
+
+
+class _TrackedIterable(object):
+
+    """Body of a streamed response. Each chunk is generated with the
+    stats of its request, which is finished when the body is closed."""
+
+    def __init__(self, tracker, iterable):
+        self._tracker = tracker
+        self._iterable = iterable
+        self._iterator = None
+        self._outcome = "ok"
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with _activate(self._tracker.stats):
+            if self._iterator is None:
+                self._iterator = iter(self._iterable)
+            try:
+                return next(self._iterator)
+            except StopIteration:
+                raise
+            except Exception as error:
+                self._outcome = type(error).__name__
+                raise
+
+    def close(self):
+        try:
+            close = getattr(self._iterable, "close", None)
+            if close is not None:
+                with _activate(self._tracker.stats):
+                    close()
+        finally:
+            self._tracker.finish(self._outcome)
+
+
+@sa.event.listens_for(sa.engine.Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if context is not None:
+        context._tedega_auth_start = time.perf_counter()
+
+
+@sa.event.listens_for(sa.engine.Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    stats = current_stats()
+    start = getattr(context, "_tedega_auth_start", None)
+    if stats is not None and start is not None:
+        stats.sql_statements += 1
+        stats.db_time += time.perf_counter() - start
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Versioned password hashes. A hash records its algorithm and cost
+parameters, so the cost can be tuned per deployment and outdated
+hashes can be upgraded on the next successful login::
+
+    $pbkdf2-sha256$v=1$i=<iterations>$<salt>$<digest>
+
+Hashes in other formats are legacy hashes of
+:func:`tedega_share.lib.security.encrypt_password`. They are still
+verified but always need a rehash."""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from tedega_share.lib.security import verify_password as _legacy_verify
+
+from tedega_auth import config
+
+ALGORITHM = "pbkdf2-sha256"
+VERSION = 1
+PREFIX = "${}$v={}$".format(ALGORITHM, VERSION)
+MIN_ITERATIONS = 100000
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _unb64(data):
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _derive(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"),
+                               salt, iterations)
+
+
+def parse(hashed):
+    """Returns the iterations, salt and digest of `hashed` or None if
+    it is a legacy hash.
+
+    :raises: ValueError if `hashed` is malformed.
+    """
+    if not hashed.startswith(PREFIX):
+        return None
+    try:
+        cost, salt, digest = hashed[len(PREFIX):].split("$")
+        if not cost.startswith("i="):
+            raise ValueError("Missing iterations")
+        return int(cost[len("i="):]), _unb64(salt), _unb64(digest)
+    except (TypeError, ValueError) as error:
+        raise ValueError("Malformed password hash: {}".format(error))
+
+
+def encrypt(password, iterations):
+    """Returns the hash of `password` using `iterations` rounds."""
+    salt = os.urandom(16)
+    digest = _derive(password, salt, iterations)
+    return "{}i={}${}${}".format(PREFIX, iterations, _b64(salt), _b64(digest))
+
+
+def verify(password, hashed):
+    """Returns True if `password` matches `hashed`. Legacy hashes are
+    verified as well. Malformed hashes never match."""
+    if not hashed:
+        return False
+    try:
+        parsed = parse(hashed)
+        if parsed is None:
+            return bool(_legacy_verify(password, hashed))
+    except (TypeError, ValueError):
+        return False
+    iterations, salt, digest = parsed
+    return hmac.compare_digest(_derive(password, salt, iterations), digest)
+
+
+def _quantize(iterations):
+    """Returns the largest power of two not above `iterations`.
+
+    >>> _quantize(300000)
+    262144
+    """
+    return 1 << (max(iterations, 1).bit_length() - 1)
+
+
+class HashPolicy(object):
+
+    """Cost parameters for new hashes. If no fixed number of
+    iterations is configured, the iterations are calibrated so that
+    one hash takes about `target_time` seconds on the current
+    hardware.
+
+    Each worker calibrates on its own, so the calibrated iterations are
+    rounded down to a power of two and hashes are only upgraded if they
+    are more than one step below. Workers which measure slightly
+    different timings then agree on which hashes are current."""
+
+    def __init__(self, iterations=0, target_time=0.25):
+        """
+        :iterations: Fixed number of iterations. 0 to calibrate.
+        :target_time: Seconds one hash should take when calibrating.
+        """
+        self.target_time = target_time
+        self._fixed = bool(iterations)
+        self._iterations = iterations or None
+        self._lock = threading.Lock()
+
+    def calibrate(self, sample=20000):
+        """Returns the number of iterations which take about
+        `target_time` seconds."""
+        start = time.perf_counter()
+        _derive("calibration", b"salt" * 4, sample)
+        duration = max(time.perf_counter() - start, 1e-6)
+        iterations = int(sample * self.target_time / duration)
+        return max(_quantize(iterations), MIN_ITERATIONS)
+
+    @property
+    def iterations(self):
+        if self._iterations is None:
+            with self._lock:
+                if self._iterations is None:
+                    self._iterations = self.calibrate()
+        return self._iterations
+
+    @property
+    def min_iterations(self):
+        """Iterations below which a hash is upgraded. Fixed iterations
+        are the minimum themselves."""
+        if self._fixed:
+            return self.iterations
+        return max(self.iterations // 2, MIN_ITERATIONS)
+
+    def needs_rehash(self, hashed):
+        """Returns True if `hashed` is a legacy or malformed hash or
+        was created with fewer than :attr:`min_iterations`."""
+        try:
+            parsed = parse(hashed)
+        except ValueError:
+            return True
+        return parsed is None or parsed[0] < self.min_iterations
+
+
+policy = HashPolicy(config.get("hash_iterations"),
+                    config.get("hash_target_time"))
+"""Policy for new password hashes of this deployment."""
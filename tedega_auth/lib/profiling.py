@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measuring of the import time of modules. Enabled by setting
+``TEDEGA_AUTH_PROFILE_STARTUP`` when the service is started through
+:mod:`tedega_auth.wsgi`. Set it to ``1`` to print the breakdown to
+stderr or to a path to write it into a file."""
+import sys
+import time
+
+
+class _TimingLoader(object):
+
+    """Wraps a loader and records the time to execute the module."""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        profiler = self._profiler
+        profiler._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            children = profiler._stack.pop()
+            if profiler._stack:
+                profiler._stack[-1] += total
+            profiler.timings[self._name] = (total, total - children)
+
+
+class ImportProfiler(object):
+
+    """Meta path finder which records the cumulative and the self time
+    of every module imported while it is installed."""
+
+    def __init__(self):
+        self.timings = {}
+        self._stack = []
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader, self, fullname)
+            return spec
+        return None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self, limit=50):
+        """Returns the `limit` modules with the highest self time as
+        text table. Times are in milliseconds."""
+        total = sum(own for _, own in self.timings.values())
+        lines = ["{:>10} {:>10}  {}".format("self ms", "cumul. ms", "module")]
+        items = sorted(self.timings.items(), key=lambda item: -item[1][1])
+        for name, (cumulative, own) in items[:limit]:
+            lines.append("{:10.1f} {:10.1f}  {}".format(
+                own * 1000, cumulative * 1000, name))
+        lines.append("{:10.1f} {:>10}  total of {} modules".format(
+            total * 1000, "", len(self.timings)))
+        return "\n".join(lines)
+
+
+def start_profiling():
+    """Installs and returns a new :class:`ImportProfiler`."""
+    profiler = ImportProfiler()
+    profiler.install()
+    return profiler
+
+
+def write_report(profiler, destination):
+    """Writes the report of `profiler` to stderr if `destination` is
+    "1" or else to the file `destination`."""
+    profiler.uninstall()
+    report = profiler.report()
+    if destination == "1":
+        sys.stderr.write(report + "\n")
+    else:
+        with open(destination, "w") as output:
+            output.write(report + "\n")
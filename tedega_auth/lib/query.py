@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Building of queries from the search parameters of the API."""
+import base64
+import binascii
+import json
+
+from tedega_view.exceptions import ClientError
+
+
+def parse_search(search):
+    """Returns a list of (field, value) tuples from a search string in
+    the form ``field::value|field::value``.
+
+    :search: Search string.
+    :returns: List of tuples.
+    :raises: :class:`ClientError` if the search string is malformed.
+    """
+    filters = []
+    if not search:
+        return filters
+    for expr in search.split("|"):
+        if "::" not in expr:
+            raise ClientError("Malformed search expression '{}'".format(expr))
+        field, value = expr.split("::", 1)
+        filters.append((field, value))
+    return filters
+
+
+def get_column(model, field):
+    """Returns the column of `model` named `field`.
+
+    :raises: :class:`ClientError` if there is no such column.
+    """
+    column = model.__table__.columns.get(field)
+    if column is None:
+        raise ClientError("Unknown field '{}'".format(field))
+    return getattr(model, column.key)
+
+
+def _successor(prefix):
+    """Returns the smallest string greater than all strings starting
+    with `prefix` or None if there is none."""
+    prefix = prefix.rstrip(chr(0x10FFFF))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def apply_prefix(query, column, prefix):
+    """Filters `query` to the rows whose `column` starts with `prefix`
+    (case sensitive). The filter can use a btree index on the column:
+    SQLite gets a range, other databases LIKE with the pattern escaped.
+
+    :query: Query to filter.
+    :column: Text column.
+    :prefix: Prefix the values must start with.
+    :returns: Filtered query.
+    """
+    if not prefix:
+        return query
+    if query.session.get_bind().dialect.name == "sqlite":
+        query = query.filter(column >= prefix)
+        successor = _successor(prefix)
+        if successor is None:
+            return query
+        return query.filter(column < successor)
+    pattern = (prefix.replace("\\", "\\\\").replace("%", "\\%")
+               .replace("_", "\\_"))
+    return query.filter(column.like(pattern + "%", escape="\\"))
+
+
+def apply_search(query, model, search, prefixes=None):
+    """Filters `query` by the given `search` string. Fields named in
+    `prefixes` match by prefix on an indexed column. Other text fields
+    match case insensitive substrings, all other fields must be equal.
+
+    :query: Query to filter.
+    :model: Mapped class of the searched items.
+    :search: Search string. See :func:`parse_search`.
+    :prefixes: Dictionary mapping field names to a tuple of the column
+               to search and a function normalizing the value.
+    :returns: Filtered query.
+    """
+    prefixes = prefixes or {}
+    for field, value in parse_search(search):
+        if field in prefixes:
+            column, normalize = prefixes[field]
+            query = apply_prefix(query, column, normalize(value))
+            continue
+        column = get_column(model, field)
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = str
+        if python_type is str:
+            query = query.filter(column.ilike(u"%{}%".format(value)))
+        else:
+            try:
+                query = query.filter(column == python_type(value))
+            except ValueError:
+                raise ClientError("Invalid value for field '{}'".format(field))
+    return query
+
+
+def apply_sort(query, model, sort):
+    """Orders `query` by the given `sort` string in the form
+    ``field|-field``. A leading "-" sorts descending.
+
+    :query: Query to order.
+    :model: Mapped class of the searched items.
+    :sort: Sort string.
+    :returns: Ordered query.
+    """
+    if not sort:
+        return query
+    for field in sort.split("|"):
+        if field.startswith("-"):
+            query = query.order_by(get_column(model, field[1:]).desc())
+        else:
+            query = query.order_by(get_column(model, field))
+    return query
+
+
+def select_fields(session, model, fields, exclude=()):
+    """Returns a query which only selects the columns `fields` of
+    `model` instead of complete mapped objects. This saves loading the
+    other columns and building the objects. Columns named in `exclude`
+    are never selected. Use :func:`as_dicts` to get the result.
+
+    :session: Session of the storage.
+    :model: Mapped class of the searched items.
+    :fields: List of field names.
+    :exclude: Field names which must not be selected.
+    :returns: Query
+    """
+    columns = [get_column(model, field) for field in fields
+               if field not in exclude]
+    if not columns:
+        raise ClientError("No field selected")
+    return session.query(*columns)
+
+
+def as_dicts(rows):
+    """Returns a generator of dictionaries for the `rows` of a query
+    created with :func:`select_fields`."""
+    return (row._asdict() for row in rows)
+
+
+def encode_cursor(values):
+    """Returns an opaque cursor for the given dictionary of `values`."""
+    data = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns the dictionary encoded in `cursor`.
+
+    :raises: :class:`ClientError` if the cursor is invalid.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii"))
+                            .decode("utf-8"))
+    except (ValueError, TypeError, binascii.Error):
+        raise ClientError("Invalid cursor")
+    if not isinstance(values, dict):
+        raise ClientError("Invalid cursor")
+    return values
+
+
+def _is_column_value(column, value):
+    """Returns True if `value` is of the Python type of `column`. Other
+    values would fail in the database or compare in unexpected ways."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value is not None
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+    return isinstance(value, python_type)
+
+
+def apply_keyset(query, column, cursor):
+    """Restricts `query` to the rows after the `cursor` on the unique,
+    indexed `column` and orders by it. Unlike offsets, the database can
+    seek to the start of the page in the index, so deep pages are as
+    fast as the first one.
+
+    :query: Query to restrict.
+    :column: Unique column used as sort key.
+    :cursor: Cursor as returned by :func:`encode_cursor` or empty.
+    :returns: Restricted query.
+    """
+    if cursor:
+        after = decode_cursor(cursor).get(column.key)
+        if not _is_column_value(column, after):
+            raise ClientError("Invalid cursor")
+        query = query.filter(column > after)
+    return query.order_by(column)
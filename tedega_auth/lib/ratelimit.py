@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Rate limiting with sliding window counters. A counter only keeps
+the number of hits in the current and the previous fixed window and
+estimates the hits in the sliding window by weighting the previous
+window with its overlap. This needs constant memory per key and a few
+operations per check, so requests can be rejected before any storage
+or hashing work is done.
+
+With several workers the counters must be kept in the shared key value
+store (see :mod:`tedega_auth.lib.kv`), otherwise each worker counts on
+its own. If the store fails the limiters fail closed: requests are
+rejected with 503 until the counters can be read again, so an outage
+of the store does not switch off the protection against guessing of
+credentials."""
+import threading
+import time
+from collections import OrderedDict
+
+from tedega_share import get_logger
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from tedega_auth import config
+from tedega_auth.lib import kv
+
+
+class RateLimited(TooManyRequests):
+
+    """Raised if a limit is exceeded. Renders as HTTP 429 with a
+    Retry-After header."""
+
+    def __init__(self, retry_after):
+        super(RateLimited, self).__init__("Too many attempts. Retry later.")
+        self.retry_after = max(1, int(retry_after + 0.5))
+
+    def get_headers(self, environ=None, scope=None):
+        headers = super(RateLimited, self).get_headers(environ)
+        headers.append(("Retry-After", str(self.retry_after)))
+        return headers
+
+
+class LimiterUnavailable(ServiceUnavailable):
+
+    """Raised if the counters of a limiter can not be read or updated.
+    Renders as HTTP 503 with a Retry-After header."""
+
+    description = "Rate limits can not be checked. Retry later."
+
+    def get_headers(self, environ=None, scope=None):
+        headers = super(LimiterUnavailable, self).get_headers(environ)
+        headers.append(("Retry-After", "5"))
+        return headers
+
+
+def _unavailable(error):
+    get_logger().error("Rate limit counters are not available: "
+                       "{}".format(error))
+    return LimiterUnavailable()
+
+
+class MemoryBackend(object):
+
+    """Keeps the counters in the memory of the process. Other backends
+    must provide the same :meth:`counts` and :meth:`hit` methods. Both
+    take all keys of a check at once.
+
+    At most `max_keys` counters are kept. If more keys are hit, the
+    counters hit least recently are dropped, so each hit takes constant
+    time no matter how many keys (e.g. made up usernames) are used."""
+
+    def __init__(self, max_keys=100000):
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def _get(self, key, window, start):
+        counter = self._counters.get(key)
+        if counter is None or counter[0] < start - window:
+            return [start, 0, 0]
+        if counter[0] < start:
+            # The current window of the counter became the previous one.
+            return [start, 0, counter[1]]
+        return counter
+
+    def counts(self, keys, window, start):
+        """Returns a list with the hits of each of the `keys` in the
+        window starting at `start` and in the previous window."""
+        with self._lock:
+            counters = [self._get(key, window, start) for key in keys]
+        return [(counter[1], counter[2]) for counter in counters]
+
+    def hit(self, keys, window, start):
+        """Counts a hit of each of the `keys` in the window starting at
+        `start`."""
+        with self._lock:
+            for key in keys:
+                counter = self._get(key, window, start)
+                counter[1] += 1
+                self._counters[key] = counter
+                self._counters.move_to_end(key)
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+
+    def __len__(self):
+        return len(self._counters)
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+
+class SharedBackend(object):
+
+    """Keeps the counters in a :class:`tedega_auth.lib.kv.KVStore`, so
+    they are shared by all workers. Each window is a key expiring after
+    the following window. A check and a hit each take one round trip to
+    the store, independent of the number of keys."""
+
+    def __init__(self, store, prefix="ratelimit:"):
+        self.store = store
+        self.prefix = prefix
+
+    def _key(self, key, start):
+        return "{}{}:{:.0f}".format(self.prefix, key, start)
+
+    def counts(self, keys, window, start):
+        names = []
+        for key in keys:
+            names.append(self._key(key, start))
+            names.append(self._key(key, start - window))
+        values = [int(v or 0) for v in self.store.get_many(names)]
+        return list(zip(values[0::2], values[1::2]))
+
+    def hit(self, keys, window, start):
+        pipeline = self.store.pipeline()
+        for key in keys:
+            pipeline.incr(self._key(key, start), ttl=2 * window)
+        pipeline.execute()
+
+
+def create_backend(prefix):
+    """Returns the backend for a limiter of the service. The
+    :data:`tedega_auth.lib.kv.store` is used if the ``kv_url`` setting
+    is configured, otherwise a :class:`MemoryBackend`.
+
+    :prefix: Prefix of the keys in the shared store. Each limiter needs
+             its own, otherwise limiters counting the same keys (e.g.
+             the IP) share their counters.
+    """
+    if config.get("kv_url"):
+        return SharedBackend(kv.store, prefix)
+    return MemoryBackend()
+
+
+class SlidingWindowLimiter(object):
+
+    """Allows at most `limit` hits per key within `window` seconds. A
+    limit of 0 disables the limiter."""
+
+    def __init__(self, limit, window, backend=None, timer=time.time):
+        self.limit = limit
+        self.window = window
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._timer = timer
+
+    def check(self, *keys):
+        """Raises :class:`RateLimited` if one of the `keys` has reached
+        the limit. Does not count a hit.
+
+        :raises: :class:`LimiterUnavailable` if the counters can not be
+                 read.
+        """
+        keys = [key for key in keys if key is not None]
+        if not self.limit or not keys:
+            return
+        now = self._timer()
+        start = now - now % self.window
+        weight = 1.0 - (now - start) / float(self.window)
+        try:
+            counts = self.backend.counts(keys, self.window, start)
+        except kv.KVError as error:
+            raise _unavailable(error)
+        for current, previous in counts:
+            if previous * weight + current >= self.limit:
+                raise RateLimited(self.window - now % self.window)
+
+    def hit(self, *keys):
+        """Counts a hit for each of the `keys`.
+
+        :raises: :class:`LimiterUnavailable` if the counters can not be
+                 updated.
+        """
+        keys = [key for key in keys if key is not None]
+        if not self.limit or not keys:
+            return
+        now = self._timer()
+        start = now - now % self.window
+        try:
+            self.backend.hit(keys, self.window, start)
+        except kv.KVError as error:
+            raise _unavailable(error)
+
+    def check_and_hit(self, *keys):
+        self.check(*keys)
+        self.hit(*keys)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""In-memory list of revoked refresh tokens. Access tokens carry the
+id of the refresh token they were issued with in the ``rid`` claim.
+Checking this claim against the list costs a set lookup and no I/O.
+The list is filled from the storage on start and then updated
+incrementally, see :func:`tedega_auth.model.token.sync_revocations`."""
+import threading
+import time
+
+
+class RevocationList(object):
+
+    """Ids of revoked refresh tokens with the time after which no access
+    token issued with them can be valid anymore."""
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+        self.watermark = None
+        """Revocation time of the newest revocation loaded from the
+        storage."""
+
+    def add(self, rid, expires):
+        """Adds the refresh token `rid`. It is kept until `expires`
+        (timestamp in seconds)."""
+        with self._lock:
+            self._revoked[rid] = expires
+
+    @property
+    def loaded(self):
+        """True once the revocations have been loaded from the storage.
+        Until then it is unknown whether a token has been revoked."""
+        return self.watermark is not None
+
+    def __contains__(self, rid):
+        return rid in self._revoked
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def prune(self, now=None):
+        """Removes all entries which have expired."""
+        if now is None:
+            now = time.time()
+        with self._lock:
+            expired = [rid for rid, expires in self._revoked.items()
+                       if expires < now]
+            for rid in expired:
+                del self._revoked[rid]
+
+    def clear(self):
+        with self._lock:
+            self._revoked.clear()
+            self.watermark = None
+
+
+revocations = RevocationList()
+"""Revoked refresh tokens of the service."""
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Parsing of the scopes and redirect uris of clients. Both are stored
+as space separated text. The parsed values are memoized by the raw
+text, so each distinct value is only parsed once and checks against it
+are set lookups."""
+import functools
+import re
+from urllib.parse import urlsplit
+
+MEMO_SIZE = 4096
+"""Number of distinct raw values kept parsed."""
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def parse_scopes(raw):
+    """Returns the scopes of the space separated string `raw`.
+
+    :raw: Space separated scopes or None.
+    :returns: frozenset of scopes.
+
+    >>> sorted(parse_scopes("read write read"))
+    ['read', 'write']
+    """
+    if not raw:
+        return frozenset()
+    return frozenset(raw.split())
+
+
+def normalize(raw):
+    """Returns the scopes or uris of `raw` in the form stored in the
+    database. Duplicates are removed, the order is kept.
+
+    :raw: Space separated values or None.
+    :returns: Space separated values or None.
+
+    >>> normalize(" write read  write")
+    'write read'
+    """
+    values = []
+    for value in (raw or "").split():
+        if value not in values:
+            values.append(value)
+    return " ".join(values) or None
+
+
+HOST_LABEL = re.compile("[a-z0-9-]+\\Z")
+"""Labels a wildcard in the host of a redirect uri may match."""
+
+
+def _split_uri(uri):
+    """Returns the scheme, the port, the path with the query and the
+    host labels of `uri`, or None if the uri can not be compared safely:
+    backslashes, userinfo and percent-encoding could make the host seen
+    by a browser differ from the one parsed here."""
+    if "\\" in uri or "@" in uri or "%" in uri:
+        return None
+    try:
+        parts = urlsplit(uri)
+        port = parts.port
+    except ValueError:
+        return None
+    if not parts.hostname or parts.fragment:
+        return None
+    return (parts.scheme.lower(), port, parts.path, parts.query,
+            tuple(parts.hostname.split(".")))
+
+
+class RedirectURIs(object):
+
+    """Allowed redirect uris of a client. The host of an uri may contain
+    ``*`` as wildcard within its labels, e.g.
+    ``https://*.example.com/callback``. Uris without wildcard are
+    matched exactly. For the others the scheme, the port, the path and
+    the query must be equal and each label of the host must match the
+    label of the pattern; a wildcard never matches a dot. Wildcards
+    outside of the host are not supported, such uris only match
+    exactly."""
+
+    def __init__(self, uris):
+        """
+        :uris: List of uris in the order they were registered.
+        """
+        self.uris = tuple(uris)
+        self._exact = frozenset(u for u in self.uris if "*" not in u)
+        self._patterns = {}
+        for uri in self.uris:
+            if "*" not in uri:
+                continue
+            parts = _split_uri(uri)
+            if parts is None or "*" in "".join(str(p) for p in parts[:4]):
+                continue
+            labels = tuple(re.compile(re.escape(label)
+                                      .replace(r"\*", "[a-z0-9-]*") + r"\Z")
+                           for label in parts[4])
+            key = parts[:4] + (len(labels),)
+            self._patterns.setdefault(key, []).append(labels)
+
+    def __iter__(self):
+        return iter(self.uris)
+
+    def __len__(self):
+        return len(self.uris)
+
+    @property
+    def default(self):
+        """First registered uri or None. Only uris without wildcard can
+        be the default."""
+        for uri in self.uris:
+            if uri in self._exact:
+                return uri
+        return None
+
+    def matches(self, uri):
+        """Returns True if `uri` is an allowed redirect uri."""
+        if uri in self._exact:
+            return True
+        if not self._patterns:
+            return False
+        parts = _split_uri(uri)
+        if parts is None:
+            return False
+        hosts = parts[4]
+        if not all(HOST_LABEL.match(label) for label in hosts):
+            return False
+        for labels in self._patterns.get(parts[:4] + (len(hosts),), ()):
+            if all(label.match(host) for label, host in zip(labels, hosts)):
+                return True
+        return False
+
+
+@functools.lru_cache(maxsize=MEMO_SIZE)
+def parse_redirect_uris(raw):
+    """Returns the :class:`RedirectURIs` of the space separated string
+    `raw`.
+
+    :raw: Space separated uris or None.
+    :returns: :class:`RedirectURIs`
+
+    >>> uris = parse_redirect_uris("http://a/cb https://*.b.org/cb")
+    >>> uris.matches("https://x.b.org/cb"), uris.matches("http://a/x")
+    (True, False)
+    """
+    return RedirectURIs((raw or "").split())
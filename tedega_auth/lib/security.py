@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Helpers for storing and checking secrets."""
+import hashlib
+import hmac
+
+from tedega_auth import config
+
+SECRET_SCHEME = "hmac-sha256"
+
+
+def _to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode("utf-8")
+
+
+def hash_secret(secret, key=None):
+    """Returns a keyed hash of `secret`. Unlike passwords the secrets
+    of clients are long random strings, so a fast keyed hash is enough
+    and keeps the authentication of clients cheap.
+
+    :secret: Unencrypted secret.
+    :key: Key of the HMAC. Defaults to the `secret_key` setting.
+    :returns: Hash of the secret prefixed with its scheme.
+
+    >>> hash_secret("foo", key="bar")[:12]
+    'hmac-sha256$'
+    """
+    if key is None:
+        key = config.get("secret_key")
+    digest = hmac.new(_to_bytes(key), _to_bytes(secret), hashlib.sha256)
+    return "{}${}".format(SECRET_SCHEME, digest.hexdigest())
+
+
+def is_hashed_secret(value):
+    """Returns True if `value` has been created by :func:`hash_secret`."""
+    return value is not None and value.startswith(SECRET_SCHEME + "$")
+
+
+def verify_secret(secret, hashed, key=None):
+    """Checks `secret` against the `hashed` value in constant time.
+
+    :secret: Unencrypted secret.
+    :hashed: Hash as returned by :func:`hash_secret`.
+    :key: Key of the HMAC. Defaults to the `secret_key` setting.
+    :returns: True if the secret matches.
+
+    >>> verify_secret("foo", hash_secret("foo", key="bar"), key="bar")
+    True
+    """
+    if not hashed:
+        return False
+    return hmac.compare_digest(_to_bytes(hash_secret(secret, key)),
+                               _to_bytes(hashed))
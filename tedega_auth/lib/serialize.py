@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Fast conversion of mapped objects into JSON compatible dictionaries
+and fast JSON encoding. orjson is used if it is installed and the
+``fast_json`` setting is enabled."""
+import datetime
+import json
+import operator
+
+import sqlalchemy as sa
+
+from tedega_auth import config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = orjson is not None and config.get("fast_json")
+"""True if JSON is encoded with orjson. Resolved once on import."""
+
+
+def format_datetime(value):
+    """Returns `value` in ISO 8601. Naive datetimes are UTC and get a
+    "Z", like the JSON encoder of the framework writes them.
+
+    >>> format_datetime(datetime.datetime(2017, 1, 2, 3, 4, 5))
+    '2017-01-02T03:04:05Z'
+    """
+    if value.tzinfo is None:
+        return value.isoformat() + "Z"
+    return value.isoformat()
+
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return format_datetime(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError("{!r} is not JSON serializable".format(value))
+
+
+def dumps(value):
+    """Returns `value` encoded as compact JSON string."""
+    if FAST_JSON:
+        return orjson.dumps(value, default=_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME
+                            ).decode("utf-8")
+    return json.dumps(value, default=_default, separators=(",", ":"))
+
+
+class Serializer(object):
+
+    """Converts mapped objects of a model into dictionaries of their
+    columns, like ``get_values()`` but with JSON compatible values. The
+    columns and their accessors are resolved once when the serializer
+    is created."""
+
+    def __init__(self, model, exclude=()):
+        """
+        :model: Mapped class.
+        :exclude: Names of columns which are not serialized.
+        """
+        columns = [column for column in model.__table__.columns
+                   if column.key not in exclude]
+        self.keys = tuple(str(column.key) for column in columns)
+        self._get = operator.attrgetter(*self.keys)
+        self._dates = tuple(index for index, column in enumerate(columns)
+                            if isinstance(column.type, (sa.DateTime, sa.Date)))
+
+    def _values(self, item):
+        values = self._get(item)
+        if len(self.keys) == 1:
+            values = (values,)
+        if not self._dates:
+            return values
+        values = list(values)
+        for index in self._dates:
+            value = values[index]
+            if value is not None:
+                values[index] = _default(value)
+        return values
+
+    def __call__(self, item):
+        """Returns the dictionary of `item`."""
+        return dict(zip(self.keys, self._values(item)))
+
+    def many(self, items):
+        """Returns a list with the dictionaries of `items`."""
+        keys = self.keys
+        return [dict(zip(keys, self._values(item))) for item in items]
+
+
+def use_fast_json(application):
+    """Lets the flask application encode its JSON responses with
+    orjson. Does nothing if orjson is not installed, the ``fast_json``
+    setting is disabled or flask has no JSON providers (flask < 2.2).
+
+    :application: Flask application or an application wrapping it in
+                  its ``app`` attribute.
+    :returns: True if orjson is used.
+    """
+    if not FAST_JSON:
+        return False
+    try:
+        from flask.json.provider import DefaultJSONProvider
+    except ImportError:
+        return False
+
+    class FastJSONProvider(DefaultJSONProvider):
+
+        def dumps(self, obj, **kwargs):
+            return dumps(obj)
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app = getattr(application, "app", application)
+    app.json = FastJSONProvider(app)
+    return True
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Request scoped storage. All code running within one request shares
+one storage session, and with it one connection and one transaction
+which is committed once at the end of the request."""
+import threading
+
+import sqlalchemy as sa
+from tedega_storage import rdbms
+
+from tedega_auth import config
+
+_local = threading.local()
+_engine = None
+
+
+def get_storage():
+    """Returns a new storage like :func:`tedega_storage.rdbms.get_storage`.
+    Once :func:`configure_pool` created the engine of the service the
+    session is bound to it.
+
+    >>> with get_storage() as storage:
+    ...     pass
+    """
+    storage = rdbms.get_storage()
+    if _engine is not None:
+        storage.session.bind = _engine
+    return storage
+
+
+class _Scope(object):
+
+    def __init__(self):
+        self.context = None
+        self.storage = None
+
+    def get_storage(self):
+        # The storage is only opened if the request needs it.
+        if self.storage is None:
+            self.context = get_storage()
+            self.storage = self.context.__enter__()
+        return self.storage
+
+    def close(self, exc_info):
+        if self.context is not None:
+            self.context.__exit__(*exc_info)
+
+
+class _Borrowed(object):
+
+    """Context manager returning the storage of the request without
+    committing or closing it on exit."""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __enter__(self):
+        return self.storage
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class request_scope(object):
+
+    """Context manager for the scope of a request. The storage is
+    opened on the first call of :func:`unit_of_work` and committed (or
+    rolled back on errors) when the scope is left. Nested scopes share
+    the storage of the outermost scope."""
+
+    def __enter__(self):
+        self._outer = getattr(_local, "scope", None) is None
+        if self._outer:
+            _local.scope = _Scope()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._outer:
+            scope = _local.scope
+            _local.scope = None
+            scope.close(exc_info)
+        return False
+
+
+def unit_of_work():
+    """Returns a context manager with the storage of the current
+    request. Outside of a :class:`request_scope` a new storage is
+    opened and committed on exit like :func:`get_storage`.
+
+    >>> with unit_of_work() as storage:
+    ...     pass
+    """
+    scope = getattr(_local, "scope", None)
+    if scope is None:
+        return get_storage()
+    return _Borrowed(scope.get_storage())
+
+
+def configure_pool():
+    """Creates the engine of the service with the pool settings of the
+    configuration. tedega_storage creates its engine without pool
+    options, so a second engine is created for the same url and the
+    sessions of :func:`get_storage` are bound to it. The pool of the
+    engine of tedega_storage is disposed. Engines with other pools than
+    a :class:`QueuePool`, e.g. for SQLite in memory, are kept. Call this
+    once after the storage is initialised.
+
+    :returns: True if the engine of the service was created.
+    """
+    global _engine
+    if _engine is not None:
+        return True
+    with rdbms.get_storage() as storage:
+        engine = storage.session.get_bind()
+    if not isinstance(engine.pool, sa.pool.QueuePool):
+        return False
+    _engine = sa.create_engine(
+        engine.url,
+        pool_size=config.get("db_pool_size"),
+        max_overflow=config.get("db_max_overflow"),
+        pool_timeout=config.get("db_pool_timeout"),
+        pool_recycle=config.get("db_pool_recycle"),
+        pool_pre_ping=config.get("db_pool_pre_ping"))
+    engine.dispose()
+    return True
+
+
+def pool_stats():
+    """Returns the state of the connection pool. `saturation` is the
+    share of the maximum number of connections in use."""
+    pool = _engine.pool if _engine is not None else None
+    if not isinstance(pool, sa.pool.QueuePool):
+        return {}
+    limit = pool.size() + max(config.get("db_max_overflow"), 0)
+    return dict(size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+                saturation=float(pool.checkedout()) / limit if limit else 0.0)
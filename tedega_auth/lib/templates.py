@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Rendering of the HTML pages of the service. The templates are
+compiled once and kept; they are not checked for changes on disk."""
+import os
+import threading
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "templates")
+
+_environment = None
+_lock = threading.Lock()
+
+
+def get_environment():
+    """Returns the jinja2 environment loading the templates of the
+    service. It is created on first use."""
+    global _environment
+    if _environment is None:
+        with _lock:
+            if _environment is None:
+                import jinja2
+                loader = jinja2.FileSystemLoader(TEMPLATE_DIR)
+                _environment = jinja2.Environment(loader=loader,
+                                                  autoescape=True,
+                                                  auto_reload=False,
+                                                  cache_size=-1)
+    return _environment
+
+
+def precompile():
+    """Compiles all templates so the first requests do not have to.
+
+    :returns: Number of compiled templates.
+    """
+    environment = get_environment()
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
+
+def render(name, **values):
+    """Returns the rendered template `name`.
+
+    :name: Filename of the template.
+    :values: Values used in the template.
+    """
+    return get_environment().get_template(name).render(**values)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Issuing and validation of access tokens. Validation only needs the
+keys in the :data:`tedega_auth.lib.keys.keyring`, so it does not touch
+the storage. PyJWT is imported on first use to keep the import of the
+service cheap."""
+import time
+import uuid
+
+from tedega_auth import config
+from tedega_auth.lib.errors import (
+    InsufficientScope,
+    InvalidToken,
+    RevokedToken
+)
+from tedega_auth.lib.keys import keyring
+from tedega_auth.lib.revocation import revocations
+from tedega_auth.lib.scopes import parse_scopes
+
+
+def issue_access_token(client_id, user_id=None, scopes=(), rid=None):
+    """Returns a signed access token for the given client.
+
+    :client_id: ID of the client. Used as subject of the token.
+    :user_id: ID of the user who registered the client.
+    :scopes: List of scopes granted to the client.
+    :rid: ID of the refresh token the access token is issued with.
+    :returns: Encoded token as string.
+    """
+    now = int(time.time())
+    claims = {"iss": config.get("issuer"),
+              "aud": config.get("audience"),
+              "sub": client_id,
+              "client_id": client_id,
+              "user_id": user_id,
+              "scope": " ".join(sorted(scopes)),
+              "iat": now,
+              "exp": now + config.get("access_token_ttl"),
+              "jti": uuid.uuid4().hex}
+    if rid is not None:
+        claims["rid"] = rid
+    return keyring.sign(claims)
+
+
+def validate_token(token, scope=None):
+    """Validates `token` and returns its claims. Signature, expiry,
+    issuer, audience and revocation are checked. If `scope` is given
+    the token must also grant this scope.
+
+    :token: Encoded token.
+    :scope: Optional scope the token must grant.
+    :returns: Dictionary with the claims of the token.
+    :raises: :class:`InvalidToken` if the token is not valid.
+    """
+    import jwt
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = keyring.get(kid)
+        if key is None:
+            raise InvalidToken("Unknown key '{}'".format(kid))
+        claims = jwt.decode(token, key.public_key,
+                            algorithms=[key.algorithm],
+                            audience=config.get("audience"),
+                            issuer=config.get("issuer"),
+                            options={"require": ["exp", "iat", "sub"]})
+    except jwt.InvalidTokenError as error:
+        raise InvalidToken(str(error))
+    rid = claims.get("rid")
+    if rid is not None:
+        if not revocations.loaded:
+            # Fail closed until the revoked tokens have been loaded on
+            # start.
+            raise InvalidToken("Revoked tokens are not loaded yet")
+        if rid in revocations:
+            raise RevokedToken("Token has been revoked")
+    if scope is not None and scope not in parse_scopes(claims.get("scope")):
+        raise InsufficientScope("Token does not grant '{}'".format(scope))
+    return claims
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Migrates the database of an existing installation to the current
+schema. New installations do not need this as the schema is created
+on initialisation of the storage. Run it with::
+
+    python -m tedega_auth.migrate
+"""
+from tedega_storage.rdbms import (
+    init_storage,
+    get_storage
+)
+from tedega_auth.model.client import upgrade_clients
+from tedega_auth.model.user import upgrade_users
+
+UPGRADES = [upgrade_clients, upgrade_users]
+
+
+def migrate():
+    init_storage()
+    for upgrade in UPGRADES:
+        with get_storage() as storage:
+            upgrade(storage)
+
+
+if __name__ == "__main__":
+    migrate()
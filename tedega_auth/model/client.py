@@ -2,12 +2,21 @@ import sqlalchemy as sa
 from tedega_storage.rdbms import RDBMSStorageBase as Base
 from tedega_storage.rdbms.base import BaseItem
 from tedega_storage.rdbms.mixins import Protocol
+from tedega_auth.lib.scopes import parse_redirect_uris, parse_scopes
+from tedega_auth.lib.security import (
+    SECRET_SCHEME,
+    hash_secret,
+    verify_secret
+)
 
 
 class Client(Protocol, BaseItem, Base):
     __tablename__ = 'clients'
-    client_id = sa.Column(sa.String(40), nullable=False)
-    client_secret = sa.Column(sa.String(55), nullable=False)
+    client_id = sa.Column(sa.String(40), nullable=False,
+                          unique=True, index=True)
+    client_secret = sa.Column(sa.String(80), nullable=False)
+    """Keyed hash of the secret of the client. See
+    :func:`tedega_auth.lib.security.hash_secret`"""
     name = sa.Column(sa.String())
 
     user_id = sa.Column(sa.ForeignKey('users.id'))
@@ -22,16 +31,48 @@ class Client(Protocol, BaseItem, Base):
 
     @property
     def redirect_uris(self):
-        if self._redirect_uris:
-            return self._redirect_uris.split()
-        return []
+        """:class:`tedega_auth.lib.scopes.RedirectURIs` of the client."""
+        return parse_redirect_uris(self._redirect_uris)
 
     @property
     def default_redirect_uri(self):
-        return self.redirect_uris[0]
+        return self.redirect_uris.default
+
+    @property
+    def scopes(self):
+        """frozenset of the scopes of the client."""
+        return parse_scopes(self._default_scopes)
 
     @property
     def default_scopes(self):
-        if self._default_scopes:
-            return self._default_scopes.split()
-        return []
+        return sorted(self.scopes)
+
+    def set_secret(self, secret):
+        """Stores the hash of the given unencrypted `secret`."""
+        self.client_secret = hash_secret(secret)
+
+    def verify_secret(self, secret):
+        """Returns True if the unencrypted `secret` matches the stored
+        hash."""
+        return verify_secret(secret, self.client_secret)
+
+
+def upgrade_clients(storage):
+    """Migrates an existing clients table. Adds the unique index on
+    `client_id`, widens the `client_secret` column and replaces
+    plaintext secrets by their hash. The function can be called
+    several times.
+
+    :storage: Storage used for the migration.
+    """
+    session = storage.session
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(sa.text("ALTER TABLE clients "
+                                "ALTER COLUMN client_secret "
+                                "TYPE VARCHAR(80)"))
+    session.execute(sa.text("CREATE UNIQUE INDEX IF NOT EXISTS "
+                            "ix_clients_client_id ON clients (client_id)"))
+    query = session.query(Client)
+    query = query.filter(~Client.client_secret.like(SECRET_SCHEME + "$%"))
+    for client in query:
+        client.set_secret(client.client_secret)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Modul for refresh tokens"""
+import calendar
+import datetime
+import threading
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm.attributes import set_committed_value
+from tedega_storage.rdbms import RDBMSStorageBase as Base
+from tedega_storage.rdbms.base import BaseItem
+from tedega_storage.rdbms.mixins import Protocol
+from tedega_share import get_logger
+
+from tedega_auth import config
+from tedega_auth.lib.revocation import revocations
+from tedega_auth.lib.scopes import parse_scopes
+from tedega_auth.lib.storage import get_storage
+
+
+class RefreshToken(Protocol, BaseItem, Base):
+    """Refresh token of a client. Only the hash of the token is
+    stored."""
+    __tablename__ = "refresh_tokens"
+
+    token_hash = sa.Column(sa.String(80), nullable=False,
+                           unique=True, index=True)
+    """Keyed hash of the token. See
+    :func:`tedega_auth.lib.security.hash_secret`"""
+    client_id = sa.Column(sa.String(40), nullable=False)
+    user_id = sa.Column(sa.ForeignKey('users.id'))
+    scope = sa.Column(sa.Text)
+    expires = sa.Column(sa.DateTime, nullable=False)
+    revoked_at = sa.Column(sa.DateTime, index=True)
+
+    @property
+    def scopes(self):
+        """frozenset of the granted scopes."""
+        return parse_scopes(self.scope)
+
+    def is_valid(self, now=None):
+        """Returns True if the token is neither revoked nor expired."""
+        if now is None:
+            now = datetime.datetime.utcnow()
+        return self.revoked_at is None and self.expires > now
+
+    def revoke(self, session):
+        """Revokes the token unless it has been revoked already. The
+        check and the update are one statement, so of concurrent calls
+        only one succeeds. The token is added to the in-memory
+        revocation list of this process once the transaction is
+        committed. Other processes pick up the revocation on their next
+        :func:`sync_revocations`.
+
+        :session: Session the token was loaded with.
+        :returns: True if this call revoked the token.
+        """
+        now = datetime.datetime.utcnow()
+        table = RefreshToken.__table__
+        result = session.execute(table.update()
+                                 .where(table.c.id == self.id)
+                                 .where(table.c.revoked_at.is_(None))
+                                 .values(revoked_at=now))
+        if result.rowcount != 1:
+            return False
+        set_committed_value(self, "revoked_at", now)
+        pending = session.info.setdefault(PENDING_KEY, [])
+        pending.append((self.id, revocation_expiry(self.expires)))
+        return True
+
+
+PENDING_KEY = "tedega_auth.revocations"
+"""Key of the revocations of the transaction in the session info."""
+
+
+@sa.event.listens_for(sa.orm.Session, "after_commit")
+def _add_revocations(session):
+    for rid, expiry in session.info.pop(PENDING_KEY, ()):
+        revocations.add(rid, expiry)
+
+
+@sa.event.listens_for(sa.orm.Session, "after_rollback")
+def _drop_revocations(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def revocation_expiry(expires):
+    """Returns the timestamp after which no access token issued with a
+    refresh token expiring at `expires` can be valid anymore."""
+    return (calendar.timegm(expires.utctimetuple()) +
+            config.get("access_token_ttl"))
+
+
+def sync_revocations(storage):
+    """Loads the refresh tokens revoked since the last sync into the
+    :data:`revocations` list and prunes expired entries. The first
+    call loads all revoked tokens which have not expired.
+
+    :storage: Storage to load the revocations from.
+    """
+    query = storage.session.query(RefreshToken.id,
+                                  RefreshToken.expires,
+                                  RefreshToken.revoked_at)
+    if revocations.watermark is None:
+        query = query.filter(RefreshToken.revoked_at.isnot(None))
+        ttl = datetime.timedelta(seconds=config.get("access_token_ttl"))
+        query = query.filter(RefreshToken.expires >
+                             datetime.datetime.utcnow() - ttl)
+    else:
+        # Revocations of transactions which committed late may have an
+        # earlier timestamp than the watermark. Loading an overlap
+        # catches them. Loading entries twice is harmless.
+        overlap = datetime.timedelta(
+            seconds=2 * config.get("revocation_sync_interval"))
+        query = query.filter(RefreshToken.revoked_at >
+                             revocations.watermark - overlap)
+    for rid, expires, revoked_at in query:
+        revocations.add(rid, revocation_expiry(expires))
+        if revocations.watermark is None or revoked_at > revocations.watermark:
+            revocations.watermark = revoked_at
+    if revocations.watermark is None:
+        revocations.watermark = datetime.datetime.utcnow()
+    revocations.prune()
+
+
+def init_revocations(interval):
+    """Loads the revoked refresh tokens and starts a background thread
+    which syncs new revocations every `interval` seconds."""
+    with get_storage() as storage:
+        sync_revocations(storage)
+
+    def run():
+        log = get_logger()
+        while True:
+            time.sleep(interval)
+            try:
+                with get_storage() as storage:
+                    sync_revocations(storage)
+            except Exception:
+                log.exception("Syncing revocations failed")
+
+    thread = threading.Thread(target=run, name="revocation-sync")
+    thread.daemon = True
+    thread.start()
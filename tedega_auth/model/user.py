@@ -5,7 +5,23 @@ import sqlalchemy as sa
 from tedega_storage.rdbms import RDBMSStorageBase as Base
 from tedega_storage.rdbms.base import BaseItem, BaseFactory
 from tedega_storage.rdbms.mixins import Protocol
-from tedega_share.lib.security import encrypt_password, generate_password
+from tedega_share.lib.security import generate_password
+from tedega_auth.lib.hashing import (
+    Overloaded,
+    encrypt_password,
+    verify_password,
+    needs_rehash
+)
+
+
+def normalize_name(name):
+    """Returns the normalized form of a username used for lookups.
+    Usernames are case insensitive.
+
+    >>> normalize_name("Admin")
+    'admin'
+    """
+    return name.casefold()
 
 
 class UserFactory(BaseFactory):
@@ -32,6 +48,9 @@ class User(Protocol, BaseItem, Base):
 
     name = sa.Column("name", sa.String, nullable=False, unique=True)
     """Username of the user."""
+    name_key = sa.Column("name_key", sa.String, unique=True, index=True)
+    """Normalized username, see :func:`normalize_name`. Set when the
+    name is set. Used to find users by name."""
     password = sa.Column("password", sa.String, nullable=False)
     """Encrypted password of the user."""
 
@@ -45,6 +64,18 @@ class User(Protocol, BaseItem, Base):
         self.name = name
         self.password = password
 
+    @sa.orm.validates("name")
+    def _set_name_key(self, key, name):
+        self.name_key = normalize_name(name)
+        return name
+
+    @classmethod
+    def by_name(cls, session, name):
+        """Returns the query for the user with the given `name`. The
+        name is compared case insensitive using the index on
+        `name_key`."""
+        return session.query(cls).filter(cls.name_key == normalize_name(name))
+
     def reset_password(self, password=None):
         """Will reset the password of the user. If no password is
         provided a password will be autogenerated.
@@ -58,6 +89,76 @@ class User(Protocol, BaseItem, Base):
         self.password = encrypt_password(password)
         return password
 
+    def verify_password(self, password):
+        """Checks the given `password`. If the password is correct but
+        the stored hash does not match the current hash policy, the
+        password will be rehashed. The rehash is skipped if the hashing
+        pool is overloaded; it is done on a later login instead.
+
+        :password: Unencrypted password.
+        :returns: True if the password is correct.
+
+        """
+        if not verify_password(password, self.password):
+            return False
+        if needs_rehash(self.password):
+            try:
+                self.password = encrypt_password(password)
+            except Overloaded:
+                pass
+        return True
+
     @classmethod
     def get_factory(cls, db):
         return UserFactory(User, db)
+
+
+# The unique index on name_key serves exact lookups. Prefix searches
+# need an index with pattern operators on PostgreSQL if the database
+# does not use the C collation.
+sa.event.listen(User.__table__, "after_create", sa.DDL(
+    "CREATE INDEX IF NOT EXISTS ix_users_name_key_pattern "
+    "ON users (name_key text_pattern_ops)").execute_if(dialect="postgresql"))
+
+
+def upgrade_users(storage, batch_size=10000):
+    """Migrates an existing users table. Adds and fills the `name_key`
+    column and its indexes. The function can be called several times.
+
+    :storage: Storage used for the migration.
+    :batch_size: Number of users updated with one statement.
+    :raises: ValueError if usernames only differ in case.
+    """
+    session = storage.session
+    bind = session.get_bind()
+    inspector = sa.inspect(session.connection())
+    columns = [c["name"] for c in inspector.get_columns("users")]
+    if "name_key" not in columns:
+        session.execute(sa.text("ALTER TABLE users "
+                                "ADD COLUMN name_key VARCHAR"))
+    # Plain table without the defaults of the model, so the migration
+    # does not touch the `updated` column.
+    table = sa.table("users", sa.column("id"), sa.column("name"),
+                     sa.column("name_key"))
+    statement = table.update().where(table.c.id == sa.bindparam("_id"))
+    while True:
+        rows = session.execute(sa.select(table.c.id, table.c.name)
+                               .where(table.c.name_key.is_(None))
+                               .limit(batch_size)).fetchall()
+        if not rows:
+            break
+        session.execute(statement, [dict(_id=id_,
+                                         name_key=normalize_name(name))
+                                    for id_, name in rows])
+    duplicates = session.execute(sa.select(table.c.name_key)
+                                 .group_by(table.c.name_key)
+                                 .having(sa.func.count() > 1)).fetchall()
+    if duplicates:
+        raise ValueError("Usernames differ only in case: {}".format(
+            ", ".join(row[0] for row in duplicates)))
+    session.execute(sa.text("CREATE UNIQUE INDEX IF NOT EXISTS "
+                            "ix_users_name_key ON users (name_key)"))
+    if bind.dialect.name == "postgresql":
+        session.execute(sa.text("CREATE INDEX IF NOT EXISTS "
+                                "ix_users_name_key_pattern "
+                                "ON users (name_key text_pattern_ops)"))
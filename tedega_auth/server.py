@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import threading
+import time
+
+import sqlalchemy as sa
 from tedega_view import create_application
-from tedega_storage.rdbms import (
-    init_storage,
-    get_storage
-)
+from werkzeug.middleware.proxy_fix import ProxyFix
+from tedega_storage.rdbms import init_storage
 from tedega_storage.rdbms.crud import (
     create as _create,
 )
@@ -17,27 +19,163 @@ from tedega_share import (
 )
 
 import tedega_auth.model
+import tedega_auth.model.user
+from tedega_auth import config
+from tedega_auth.api.health import readiness
+import tedega_auth.api.metrics  # noqa
+import tedega_auth.api.oauth  # noqa
+from tedega_auth.lib.compression import CompressionMiddleware
+from tedega_auth.lib.keys import init_keys
+from tedega_auth.lib.storage import configure_pool, get_storage
+from tedega_auth.lib.serialize import use_fast_json
+from tedega_auth.lib.templates import precompile
+from tedega_auth.model.token import init_revocations
 
 package_directory = os.path.dirname(os.path.abspath(__file__))
 
 
+def _in_background(name, func, *args):
+    thread = threading.Thread(target=func, args=args, name=name)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _has_admin(storage):
+    User = tedega_auth.model.user.User
+    query = storage.session.query(User.id).filter(User.name == "admin")
+    return query.first() is not None
+
+
+def seed(storage):
+    """Creates the default admin user if it does not exist yet. Workers
+    started at the same time may all find no admin. The ones losing the
+    race get an IntegrityError and treat the storage as seeded.
+
+    :returns: True if the admin has been created.
+    """
+    if _has_admin(storage):
+        return False
+    try:
+        _create(storage, tedega_auth.model.user.User,
+                dict(name="admin", password="secret"))
+        storage.session.flush()
+    except sa.exc.IntegrityError:
+        storage.session.rollback()
+        return False
+    get_logger().info("Create default user 'admin' with password 'secret'")
+    return True
+
+
+def _retry(func, sleep):
+    """Calls `func` until it succeeds. Failures, e.g. while the database
+    is not reachable yet, are retried with an exponential backoff of up
+    to ``storage_retry_max`` seconds."""
+    delay = 1
+    while True:
+        try:
+            return func()
+        except Exception as error:
+            get_logger().exception("Initialising the storage failed, "
+                                   "retrying in {}s".format(delay))
+            readiness.set_failed(error)
+            sleep(delay)
+            delay = min(delay * 2, config.get("storage_retry_max"))
+
+
+def _seed_and_load(interval):
+    with get_storage() as storage:
+        seed(storage)
+    init_revocations(interval)
+
+
+def _prepare_storage(interval, sleep=time.sleep):
+    """Initialises the storage, configures its pool once, seeds it and
+    loads the revoked tokens. Failing steps are retried."""
+    _retry(lambda: init_storage(None), sleep)
+    configure_pool()
+    _retry(lambda: _seed_and_load(interval), sleep)
+    readiness.set_ready()
+    get_logger().info("Storage ready after {:.3f}s".format(
+        readiness.startup_time))
+
+
+def start_storage(interval):
+    """Initialises the storage, seeds it and loads the revoked tokens
+    in the background. :data:`readiness` is set when done."""
+    _in_background("storage-init", _prepare_storage, interval)
+
+
+def parse_targets(targets):
+    """Returns a list of (host, port) tuples from a comma separated
+    list of ``host:port`` values."""
+    result = []
+    for target in targets.split(","):
+        if target.strip():
+            host, port = target.strip().rsplit(":", 1)
+            result.append((host, int(port)))
+    return result
+
+
+def start_connectivity_monitor(targets):
+    """Probes the given (host, port) `targets` in the background."""
+    if targets:
+        _in_background("connectivity", monitor_connectivity, targets)
+
+
+def session_key():
+    """Returns the key signing the session cookie.
+
+    :raises: ValueError if the ``session_key`` setting is not set or
+             equals the ``secret_key`` setting, which hashes the client
+             secrets.
+    """
+    key = config.get("session_key")
+    if not key:
+        raise ValueError("TEDEGA_AUTH_SESSION_KEY is not set")
+    if key == config.get("secret_key"):
+        raise ValueError("TEDEGA_AUTH_SESSION_KEY must differ from "
+                         "TEDEGA_AUTH_SECRET_KEY")
+    return key
+
+
 def build_app(servicename):
     # Define things we want to happen of application creation. We want:
     # 1. Initialise out fluent logger.
-    # 2. Initialise the storage.
-    # 3. Start the monitoring of out service to the "outside".
-    # 4. Start the monitoring of the system every 10sec (CPU, RAM,DISK).
+    # 2. Load the keys to sign the tokens.
+    # 3. Initialise and seed the storage and load the revoked tokens in
+    #    the background. /health/ready tells when this is done.
+    # 4. Start the monitoring of out service to the "outside" in the
+    #    background.
+    # 5. Start the monitoring of the system every 10sec (CPU, RAM,DISK).
+    started = time.monotonic()
+    key = session_key()
+    targets = parse_targets(config.get("connectivity_targets"))
     run_on_init = [(init_logger, servicename),
-                   (init_storage, None),
-                   (monitor_connectivity, [("www.google.com", 80)]),
+                   (init_keys, config.get("key_dir")),
+                   (start_storage, config.get("revocation_sync_interval")),
+                   (start_connectivity_monitor, targets),
                    (monitor_system, 10)]
     application = create_application(servicename, run_on_init=run_on_init)
-    log = get_logger()
-    with get_storage() as storage:
-        user = _create(storage, tedega_auth.model.user.User, dict(name="admin", password="secret"))
-        storage.create(user)
-        log.info("Create default user 'admin' with password 'secret'")
-    
+    # The login for the authorization code grant is kept in the signed
+    # session cookie.
+    app = getattr(application, "app", application)
+    app.secret_key = key
+    app.config["SESSION_COOKIE_SAMESITE"] = "Lax"
+    precompile()
+    use_fast_json(application)
+    if config.get("compression"):
+        app.wsgi_app = CompressionMiddleware(
+            app.wsgi_app,
+            min_size=config.get("compress_min_size"),
+            level=config.get("compress_level"),
+            brotli_quality=config.get("brotli_quality"))
+    proxies = config.get("trusted_proxies")
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies,
+                                x_proto=proxies)
+    get_logger().info("Application built in {:.3f}s".format(
+        time.monotonic() - started))
     return application
 
 if __name__ == "__main__":
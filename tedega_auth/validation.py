@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validation of tedega_auth access tokens for the services which trust
+them. The signing keys are fetched from the JSON Web Key Set of the
+auth service and refreshed in the background, so tokens are validated
+locally without a request to the auth service::
+
+    from tedega_auth.validation import TokenValidator, TokenMiddleware
+
+    validator = TokenValidator("http://auth/.well-known/jwks.json")
+    validator.start()
+    application = TokenMiddleware(application, validator, scope="read",
+                                  exempt=("/health/live",))
+
+The claims of a valid token are stored in the WSGI environ under
+``tedega_auth.claims``. Verified tokens are cached by their hash until
+they expire, but at most `refresh_interval` seconds. Revoked tokens are
+only rejected once they expire, so keep the ``access_token_ttl`` of the
+auth service short. If a key is removed from the key set, the cache is
+cleared on the next refresh; until then, for at most `refresh_interval`
+seconds, tokens signed with the removed key are still accepted.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from tedega_share import get_logger
+
+from tedega_auth.lib.cache import LRUCache
+from tedega_auth.lib.scopes import parse_scopes
+from tedega_auth.lib.errors import InsufficientScope, InvalidToken
+
+CLAIMS_KEY = "tedega_auth.claims"
+"""Key of the claims in the WSGI environ."""
+
+
+def fetch_json(url, timeout=5):
+    """Returns the decoded JSON document at `url`."""
+    from urllib.request import urlopen
+    with urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+class TokenValidator(object):
+
+    """Validates access tokens with the published keys of the auth
+    service."""
+
+    def __init__(self, jwks_url=None, issuer="tedega_auth",
+                 audience="tedega", refresh_interval=300,
+                 min_refresh_interval=30, cache_size=10000, leeway=0,
+                 fetch=None, timer=time.time):
+        """
+        :jwks_url: Url of the JSON Web Key Set of the auth service.
+        :issuer: Expected issuer of the tokens.
+        :audience: Expected audience of the tokens.
+        :refresh_interval: Seconds between refreshes of the keys.
+        :min_refresh_interval: Minimum seconds between refreshes
+                               triggered by tokens with an unknown kid.
+        :cache_size: Maximum number of cached verified tokens.
+        :leeway: Seconds of clock skew accepted for ``exp`` and ``iat``.
+        :fetch: Function returning the key set. Defaults to fetching
+                `jwks_url`.
+        :timer: Function returning the current unix time.
+        """
+        self.jwks_url = jwks_url
+        self.issuer = issuer
+        self.audience = audience
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.leeway = leeway
+        self._fetch = fetch or (lambda: fetch_json(jwks_url))
+        self._timer = timer
+        self._keys = {}
+        self._refreshed = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self.cache = LRUCache(cache_size, refresh_interval, timer)
+        """Claims of verified tokens by the hash of the token."""
+
+    def refresh(self):
+        """Fetches the key set and replaces the known keys. The cached
+        claims are dropped if a known key has been removed."""
+        import jwt
+        keys = {}
+        for data in self._fetch().get("keys", []):
+            try:
+                key = jwt.PyJWK(data)
+            except jwt.PyJWTError:
+                get_logger().warning("Ignoring unsupported key {}".format(
+                    data.get("kid")))
+                continue
+            keys[key.key_id] = key
+        removed = set(self._keys) - set(keys)
+        self._keys = keys
+        self._refreshed = self._timer()
+        if removed:
+            self.cache.clear()
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception:
+                get_logger().exception("Refreshing the signing keys failed")
+
+    def start(self):
+        """Loads the keys and refreshes them in the background."""
+        self.refresh()
+        self._stopped.clear()
+        thread = threading.Thread(target=self._run, name="jwks-refresh")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Stops the background refresh."""
+        self._stopped.set()
+
+    def _get_key(self, kid):
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        # The key may have been added after the last refresh.
+        with self._lock:
+            key = self._keys.get(kid)
+            if key is None and (self._refreshed is None or
+                                self._timer() - self._refreshed >=
+                                self.min_refresh_interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    # Retry after min_refresh_interval, not on every token.
+                    self._refreshed = self._timer()
+                    get_logger().exception("Fetching the signing keys "
+                                           "failed")
+                    raise InvalidToken("Unknown key '{}'".format(kid))
+                key = self._keys.get(kid)
+        return key
+
+    def _verify(self, token):
+        import jwt
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            key = self._get_key(kid)
+            if key is None:
+                raise InvalidToken("Unknown key '{}'".format(kid))
+            return jwt.decode(token, key.key,
+                              algorithms=[key.algorithm_name],
+                              audience=self.audience,
+                              issuer=self.issuer,
+                              leeway=self.leeway,
+                              options={"require": ["exp", "iat", "sub"]})
+        except jwt.InvalidTokenError as error:
+            raise InvalidToken(str(error))
+
+    def validate(self, token, scope=None):
+        """Returns the claims of `token`. Tokens are only verified on
+        their first use and then taken from the cache until they
+        expire.
+
+        :token: Encoded token.
+        :scope: Optional scope the token must grant.
+        :returns: Dictionary with the claims of the token.
+        :raises: :class:`InvalidToken` if the token is not valid.
+        """
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        claims = self.cache.get(digest)
+        if claims is None:
+            claims = self._verify(token)
+            ttl = min(claims["exp"] + self.leeway - self._timer(),
+                      self.refresh_interval)
+            if ttl > 0:
+                self.cache.set(digest, claims, ttl)
+        scopes = parse_scopes(claims.get("scope"))
+        if scope is not None and scope not in scopes:
+            raise InsufficientScope("Token does not grant '{}'".format(scope))
+        return claims
+
+    def validate_many(self, tokens, scope=None):
+        """Validates several tokens at once. Tokens which occur more
+        than once are only validated once.
+
+        :tokens: List of encoded tokens.
+        :scope: Optional scope all tokens must grant.
+        :returns: List with the claims of each token or the
+                  :class:`InvalidToken` error if it is not valid.
+        """
+        results = {}
+        for token in tokens:
+            if token not in results:
+                try:
+                    results[token] = self.validate(token, scope)
+                except InvalidToken as error:
+                    results[token] = error
+        return [results[token] for token in tokens]
+
+
+def _bearer_token(environ):
+    kind, _, token = environ.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if kind.lower() == "bearer" and token.strip():
+        return token.strip()
+    return None
+
+
+class TokenMiddleware(object):
+
+    """WSGI middleware rejecting requests without a valid bearer token
+    with 401, or with 403 if the token misses the required scope."""
+
+    def __init__(self, app, validator, scope=None, exempt=()):
+        """
+        :app: WSGI application.
+        :validator: :class:`TokenValidator`
+        :scope: Scope all requests must grant.
+        :exempt: Paths which do not need a token.
+        """
+        self.app = app
+        self.validator = validator
+        self.scope = scope
+        self.exempt = frozenset(exempt)
+
+    def _reject(self, start_response, status, error, description):
+        body = json.dumps({"error": error,
+                           "error_description": description}).encode("utf-8")
+        challenge = 'Bearer error="{}"'.format(error)
+        start_response(status, [("Content-Type", "application/json"),
+                                ("Content-Length", str(len(body))),
+                                ("WWW-Authenticate", challenge)])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "") in self.exempt:
+            return self.app(environ, start_response)
+        token = _bearer_token(environ)
+        if token is None:
+            return self._reject(start_response, "401 Unauthorized",
+                                "invalid_request", "Missing bearer token")
+        try:
+            environ[CLAIMS_KEY] = self.validator.validate(token, self.scope)
+        except InsufficientScope as error:
+            return self._reject(start_response, "403 Forbidden",
+                                "insufficient_scope", str(error))
+        except InvalidToken as error:
+            return self._reject(start_response, "401 Unauthorized",
+                                "invalid_token", str(error))
+        return self.app(environ, start_response)
@@ -1,8 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import os
 
-from tedega_auth.server import build_app
+_profile = os.environ.get("TEDEGA_AUTH_PROFILE_STARTUP")
+if _profile:
+    from tedega_auth.lib.profiling import start_profiling, write_report
+    _profiler = start_profiling()
+
+# Imported after the profiler started, so the import is profiled.
+from tedega_auth.server import build_app  # noqa: E402
 application = build_app("tedega_auth")
 
+if _profile:
+    write_report(_profiler, _profile)
+
 if __name__ == "__main__":
     application.run()
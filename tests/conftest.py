@@ -4,6 +4,8 @@ import pytest
 from tedega_share.lib.security import generate_password
 from tedega_storage.rdbms import init_storage, get_storage
 import tedega_auth.model.user
+import tedega_auth.model.client
+import tedega_auth.model.token
 
 # Initialise a SQLite Database for doctests. Doctests can not use the
 # fixtures and contexts of py.test. So default sqlite db in memory is
@@ -11,6 +13,10 @@ import tedega_auth.model.user
 # create a temporary sqlite database on "make doctests". This call
 # initialises this database.
 init_storage()
+# Load the revoked tokens like the service does on start. Until then
+# tokens issued with a refresh token are rejected.
+with get_storage() as _storage:
+    tedega_auth.model.token.sync_revocations(_storage)
 
 
 @pytest.fixture(scope='session')
@@ -26,3 +32,35 @@ def storage(request, dbmodel):
 @pytest.fixture()
 def randomstring(request):
     return generate_password
+
+
+class AsyncAPI(object):
+    """Runs the asynchronous endpoints of :mod:`tedega_auth.api.aio`
+    like the synchronous ones."""
+
+    def __getattr__(self, name):
+        import asyncio
+        import tedega_auth.api.aio
+        func = getattr(tedega_auth.api.aio, name)
+
+        def run(*args, **kwargs):
+            return asyncio.run(func(*args, **kwargs))
+        return run
+
+
+@pytest.fixture(params=["sync", "async"])
+def user_api(request):
+    """The user endpoints in synchronous and asynchronous mode."""
+    if request.param == "async":
+        return AsyncAPI()
+    import tedega_auth.api.user
+    return tedega_auth.api.user
+
+
+@pytest.fixture(params=["sync", "async"])
+def auth_api(request):
+    """The auth endpoints in synchronous and asynchronous mode."""
+    if request.param == "async":
+        return AsyncAPI()
+    import tedega_auth.api.auth
+    return tedega_auth.api.auth
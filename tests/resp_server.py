@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Minimal stand-in for a Redis server to test
+:class:`tedega_auth.lib.kv.RedisKV`. Supports only the commands used by
+the store."""
+import socketserver
+import threading
+import time
+
+
+class Handler(socketserver.StreamRequestHandler):
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line.startswith(b"*")
+        args = []
+        for i in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            self.server.commands += 1
+            reply = self.server.execute(command)
+            self.wfile.write(reply)
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        socketserver.ThreadingTCPServer.__init__(self, ("127.0.0.1", 0),
+                                                 Handler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    @property
+    def url(self):
+        return "redis://127.0.0.1:{}/0".format(self.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry and entry[0]
+
+    def execute(self, command):
+        name = command[0].decode().upper()
+        args = command[1:]
+        with self.lock:
+            if name in ("PING", "SELECT", "AUTH"):
+                return b"+OK\r\n"
+            if name == "GET":
+                return _bulk(self._get(args[0]))
+            if name == "GETDEL":
+                value = self._get(args[0])
+                self.data.pop(args[0], None)
+                return _bulk(value)
+            if name == "SET":
+                expires = None
+                if len(args) == 4:
+                    expires = time.time() + int(args[3]) / 1000.0
+                self.data[args[0]] = (args[1], expires)
+                return b"+OK\r\n"
+            if name == "DEL":
+                existed = self.data.pop(args[0], None) is not None
+                return ":{}\r\n".format(int(existed)).encode()
+            if name == "INCRBY":
+                entry = self.data.get(args[0])
+                try:
+                    value = int(self._get(args[0]) or 0) + int(args[1])
+                except ValueError:
+                    return b"-ERR value is not an integer\r\n"
+                expires = entry[1] if entry and args[0] in self.data else None
+                self.data[args[0]] = (str(value).encode(), expires)
+                return ":{}\r\n".format(value).encode()
+            if name == "PEXPIRE":
+                if self._get(args[0]) is None:
+                    return b":0\r\n"
+                self.data[args[0]] = (self.data[args[0]][0],
+                                      time.time() + int(args[1]) / 1000.0)
+                return b":1\r\n"
+        return "-ERR unknown command '{}'\r\n".format(name).encode()
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$" + str(len(value)).encode() + b"\r\n" + value + b"\r\n"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_asgi
+----------------------------------
+
+Tests for `tedega_auth.lib.asgi` module.
+"""
+
+
+def _request(application, path, body=b""):
+    messages = []
+    requests = [{"type": "http.request", "body": body}]
+    scope = {"type": "http", "method": "POST", "path": path,
+             "query_string": b"a=1", "headers": [(b"x-test", b"1")]}
+
+    async def receive():
+        return requests.pop(0)
+
+    async def send(message):
+        messages.append(message)
+    return application(scope, receive, send), messages
+
+
+def test_wsgi_to_asgi():
+    import asyncio
+    import flask
+    from tedega_auth.lib.asgi import WsgiToAsgi
+    app = flask.Flask(__name__)
+
+    @app.route("/echo", methods=["POST"])
+    def echo():
+        def generate():
+            yield flask.request.args["a"]
+            yield flask.request.headers["X-Test"]
+            yield flask.request.get_data(as_text=True)
+        return flask.Response(flask.stream_with_context(generate()))
+    call, messages = _request(WsgiToAsgi(app), "/echo", b"body")
+    asyncio.run(call)
+    assert messages[0]["type"] == "http.response.start"
+    assert messages[0]["status"] == 200
+    assert b"".join(m.get("body", b"") for m in messages[1:]) == b"11body"
+    assert not messages[-1].get("more_body")
+
+
+def test_wsgi_to_asgi_concurrent():
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from tedega_auth.lib.asgi import WsgiToAsgi
+    barrier = threading.Barrier(2, timeout=5)
+
+    def app(environ, start_response):
+        # Only returns if both requests run at the same time.
+        barrier.wait()
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return [b"ok"]
+    application = WsgiToAsgi(app, ThreadPoolExecutor(2))
+
+    async def run():
+        calls = [_request(application, "/") for _ in range(2)]
+        await asyncio.gather(*[call for call, _ in calls])
+        return [messages for _, messages in calls]
+    for messages in asyncio.run(run()):
+        assert messages[1]["body"] == b"ok"
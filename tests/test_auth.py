@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_auth
+----------------------------------
+
+Tests for `tedega_auth.api.auth` module.
+"""
+import pytest
+
+
+@pytest.fixture()
+def client(request, randomstring, auth_api):
+    from tedega_auth.lib.keys import keyring, generate_key
+    import tedega_auth.api.user
+    if not len(keyring):
+        keyring.add(generate_key("test"))
+    name = randomstring(8)
+    tedega_auth.api.user.create(name=name, password="password")
+    return auth_api.add_client(dict(username=name,
+                                    password="password",
+                                    name="client",
+                                    scopes="read write",
+                                    redirect_uris=""))
+
+
+def test_login(client, auth_api):
+    tokens = auth_api.login(client)
+    result = auth_api.introspect(dict(token=tokens["access_token"]))
+    assert result["active"]
+    assert result["client_id"] == client["client_id"]
+
+
+def test_login_wrong_secret(client, auth_api):
+    from tedega_view import AuthError
+    with pytest.raises(AuthError):
+        auth_api.login(dict(client_id=client["client_id"],
+                            client_secret="wrong"))
+
+
+@pytest.fixture()
+def tokens(client):
+    """Tokens with a refresh token as issued by the authorization code
+    grant."""
+    from tedega_auth.api.auth import _issue_tokens, load_client
+    from tedega_storage.rdbms import get_storage
+    credentials = load_client(client["client_id"])
+    with get_storage() as storage:
+        return _issue_tokens(storage, credentials.client_id,
+                             credentials.user_id, credentials.scopes)
+
+
+def test_login_without_refresh_token(client, auth_api):
+    tokens = auth_api.login(client)
+    assert "refresh_token" not in tokens
+    assert tokens["scope"] == "read write"
+
+
+def test_refresh(tokens, auth_api):
+    from tedega_view import AuthError
+    refreshed = auth_api.refresh(tokens)
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    # Refresh tokens can only be used once.
+    with pytest.raises(AuthError):
+        auth_api.refresh(tokens)
+
+
+def test_refresh_race(tokens):
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.api.auth import _load_refresh_token
+    from tedega_auth.lib.revocation import revocations
+    # Two requests loaded the token before either revoked it.
+    with get_storage() as first, get_storage() as second:
+        token = _load_refresh_token(first, tokens["refresh_token"])
+        other = _load_refresh_token(second, tokens["refresh_token"])
+        assert token.is_valid() and other.is_valid()
+        assert token.revoke(first.session)
+        first.session.commit()
+        assert token.id in revocations
+        assert not other.revoke(second.session)
+
+
+def test_revoke_rollback(tokens):
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.api.auth import _load_refresh_token
+    from tedega_auth.lib.revocation import revocations
+    with get_storage() as storage:
+        token = _load_refresh_token(storage, tokens["refresh_token"])
+        rid = token.id
+        assert token.revoke(storage.session)
+        storage.session.rollback()
+    assert rid not in revocations
+
+
+def test_revoke(tokens, auth_api):
+    auth_api.revoke(tokens)
+    result = auth_api.introspect(dict(token=tokens["access_token"]))
+    assert not result["active"]
+
+
+def test_client_scopes(client):
+    from tedega_auth.api.auth import load_client
+    credentials = load_client(client["client_id"])
+    assert credentials.scopes == frozenset(["read", "write"])
+    assert len(credentials.redirect_uris) == 0
+
+
+def test_client_cache_invalidated_after_commit(client):
+    from tedega_auth.api.auth import client_cache, load_client
+    from tedega_auth.model.client import Client
+    from tedega_storage.rdbms import get_storage
+    client_id = client["client_id"]
+    with get_storage() as storage:
+        query = storage.session.query(Client)
+        query.filter(Client.client_id == client_id).one().name = "renamed"
+        storage.session.flush()
+        # A concurrent login caches the credentials not yet committed.
+        stale = load_client(client_id)
+        assert client_cache.get(client_id) is stale
+    assert client_cache.get(client_id) is None
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_cache
+----------------------------------
+
+Tests for `tedega_auth.lib.cache` module.
+"""
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_set():
+    from tedega_auth.lib.cache import LRUCache
+    cache = LRUCache(maxsize=2)
+    assert cache.get("foo") is None
+    cache.set("foo", 1)
+    assert cache.get("foo") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_eviction():
+    from tedega_auth.lib.cache import LRUCache
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Touch "a" so "b" is the least recently used entry.
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl():
+    from tedega_auth.lib.cache import LRUCache
+    timer = FakeTimer()
+    cache = LRUCache(maxsize=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 9
+    assert cache.get("a") == 1
+    timer.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_invalidate():
+    from tedega_auth.lib.cache import LRUCache
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("unknown")
+    assert cache.get("a") is None
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_codes
+----------------------------------
+
+Tests for `tedega_auth.lib.codes` module.
+"""
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_redeem_once():
+    from tedega_auth.lib.codes import AuthorizationCode, CodeStore
+    store = CodeStore(ttl=60)
+    grant = AuthorizationCode("client", 1, None, ("read",), "x", "S256")
+    code = store.issue(grant)
+    assert store.redeem(code) == grant
+    assert store.redeem(code) is None
+    assert store.redeem("unknown") is None
+
+
+def test_expiry():
+    from tedega_auth.lib.codes import AuthorizationCode, CodeStore
+    from tedega_auth.lib.kv import MemoryKV
+    timer = FakeTimer()
+    store = CodeStore(MemoryKV(timer=timer), ttl=60)
+    grant = AuthorizationCode("client", 1, None, ("read",), "x", "S256")
+    code = store.issue(grant)
+    timer.now = 60
+    assert store.redeem(code) is None
+
+
+def test_verify_code_challenge():
+    import base64
+    import hashlib
+    from tedega_auth.lib.codes import verify_code_challenge
+    verifier = "x" * 64
+    challenge = base64.urlsafe_b64encode(
+        hashlib.sha256(verifier.encode("ascii")).digest()).rstrip(b"=")
+    challenge = challenge.decode("ascii")
+    assert verify_code_challenge(verifier, challenge, "S256")
+    assert not verify_code_challenge("y" * 64, challenge, "S256")
+    assert not verify_code_challenge(verifier, challenge, "plain")
+    assert not verify_code_challenge("short", "short", "plain")
+    assert not verify_code_challenge(verifier, challenge, "unknown")
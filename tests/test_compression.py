@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compression
+----------------------------------
+
+Tests for `tedega_auth.lib.compression` module.
+"""
+import gzip
+
+import pytest
+
+
+def _app(body, content_type="application/json", length=True, headers=()):
+    """Returns a WSGI application answering with the list of `body`
+    chunks."""
+    def app(environ, start_response):
+        response_headers = [("Content-Type", content_type)] + list(headers)
+        if length:
+            response_headers.append(("Content-Length",
+                                     str(sum(len(c) for c in body))))
+        start_response("200 OK", response_headers)
+        return iter(body)
+    return app
+
+
+def _call(app, accept="gzip", method="GET"):
+    from tedega_auth.lib.compression import CompressionMiddleware
+    middleware = CompressionMiddleware(app, min_size=100)
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started.append((status, dict(headers)))
+    environ = {"REQUEST_METHOD": method, "HTTP_ACCEPT_ENCODING": accept}
+    chunks = list(middleware(environ, start_response))
+    return started[0][1], chunks
+
+
+def test_negotiate():
+    from tedega_auth.lib.compression import negotiate
+    assert negotiate("gzip, deflate") == "gzip"
+    assert negotiate("*") == "gzip"
+    assert negotiate("") is None
+    assert negotiate("deflate") is None
+    assert negotiate("gzip;q=0") is None
+
+
+def test_compress():
+    body = [b'{"a": "' + b"x" * 500 + b'"}']
+    headers, chunks = _call(_app(body, headers=[("ETag", '"abc"')]))
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert headers["ETag"] == 'W/"abc"'
+    assert int(headers["Content-Length"]) == len(b"".join(chunks))
+    assert gzip.decompress(b"".join(chunks)) == body[0]
+
+
+def test_small_response():
+    body = [b'{"a": 1}']
+    headers, chunks = _call(_app(body))
+    assert "Content-Encoding" not in headers
+    assert headers["Vary"] == "Accept-Encoding"
+    assert chunks == body
+
+
+def test_not_compressed():
+    body = [b"x" * 500]
+    headers, chunks = _call(_app(body, content_type="image/png"))
+    assert "Content-Encoding" not in headers
+    headers, chunks = _call(_app(body), accept="identity")
+    assert "Content-Encoding" not in headers
+    assert headers["Vary"] == "Accept-Encoding"
+    headers, chunks = _call(_app(body), method="HEAD")
+    assert "Content-Encoding" not in headers
+    headers, chunks = _call(_app(body, headers=[("Content-Encoding",
+                                                 "br")]))
+    assert chunks == body
+
+
+def test_secrets_not_compressed():
+    body = [b"x" * 500]
+    for app in [_app(body, content_type="text/html; charset=utf-8"),
+                _app(body, headers=[("Cache-Control", "no-store")]),
+                _app(body, headers=[("Set-Cookie", "session=abc")])]:
+        headers, chunks = _call(app)
+        assert "Content-Encoding" not in headers
+        assert "Vary" not in headers
+        assert chunks == body
+
+
+def test_no_response():
+    def app(environ, start_response):
+        return []
+    with pytest.raises(RuntimeError):
+        _call(app)
+
+
+def test_stream():
+    import zlib
+    body = [b"[", b"1," * 100, b"2," * 100, b"3]"]
+    headers, chunks = _call(_app(body, length=False))
+    assert headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in headers
+    # Every chunk can be decompressed on its own.
+    decompressor = zlib.decompressobj(31)
+    assert decompressor.decompress(chunks[0]).startswith(b"[1,")
+    assert gzip.decompress(b"".join(chunks)) == b"".join(body)
+
+
+def test_short_stream():
+    body = [b"[", b"1", b"]"]
+    headers, chunks = _call(_app(body, length=False))
+    assert "Content-Encoding" not in headers
+    assert headers["Content-Length"] == "3"
+    assert b"".join(chunks) == b"[1]"
+
+
+def test_brotli():
+    brotli = pytest.importorskip("brotli")
+    body = [b"x" * 500]
+    headers, chunks = _call(_app(body), accept="gzip, br")
+    assert headers["Content-Encoding"] == "br"
+    assert brotli.decompress(b"".join(chunks)) == body[0]
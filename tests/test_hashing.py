@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_hashing
+----------------------------------
+
+Tests for `tedega_auth.lib.hashing` module.
+"""
+import threading
+import pytest
+
+
+def test_run():
+    from tedega_auth.lib.hashing import HashingPool
+    pool = HashingPool(workers=2, queue_limit=2)
+    assert pool.run(pow, 2, 3) == 8
+    stats = pool.stats()
+    assert stats["count"] == 1
+    assert stats["pending"] == 0
+    pool.shutdown()
+
+
+def test_overloaded():
+    from tedega_auth.lib.hashing import HashingPool, Overloaded
+    pool = HashingPool(workers=1, queue_limit=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=pool.run, args=(block,))
+    thread.start()
+    started.wait()
+    with pytest.raises(Overloaded):
+        pool.run(pow, 2, 3)
+    release.set()
+    thread.join()
+    assert pool.stats()["rejected"] == 1
+    assert pool.run(pow, 2, 3) == 8
+    pool.shutdown()
+
+
+def test_encrypt_verify():
+    from tedega_auth.lib.hashing import encrypt_password, verify_password
+    encrypted = encrypt_password("secret")
+    assert verify_password("secret", encrypted)
+    assert not verify_password("wrong", encrypted)
+
+
+def test_map():
+    from tedega_auth.lib.hashing import HashingPool
+    pool = HashingPool(workers=2, queue_limit=0)
+    assert list(pool.map(pow, [1, 2, 3], [2, 2, 2])) == [1, 4, 9]
+    assert pool.stats()["pending"] == 0
+    assert pool.run(pow, 2, 3) == 8
+    pool.shutdown()
+
+
+def test_queue_time():
+    import time
+    from tedega_auth.lib.hashing import HashingPool
+    from tedega_auth.lib.metrics import track_request
+    pool = HashingPool(workers=1, queue_limit=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+    thread = threading.Thread(target=pool.run, args=(block,))
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.05, release.set).start()
+    with track_request("queue_time") as stats:
+        # Waits for the blocking job before it runs.
+        pool.run(time.sleep, 0.01)
+    thread.join()
+    assert stats.hash_queue_time >= 0.03
+    assert 0.005 <= stats.hash_time < stats.hash_queue_time
+    assert pool.stats()["queue_time"] >= 0.03
+    pool.shutdown()
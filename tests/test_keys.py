@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_keys
+----------------------------------
+
+Tests for `tedega_auth.lib.keys` module.
+"""
+import pytest
+
+
+@pytest.mark.parametrize("algorithm", ["RS256", "EdDSA"])
+def test_sign(algorithm):
+    import jwt
+    from tedega_auth.lib.keys import KeyRing, generate_key
+    keyring = KeyRing()
+    keyring.add(generate_key("key1", algorithm))
+    token = keyring.sign({"sub": "foo"})
+    assert jwt.get_unverified_header(token)["kid"] == "key1"
+    key = keyring.get("key1")
+    claims = jwt.decode(token, key.public_key, algorithms=[algorithm])
+    assert claims["sub"] == "foo"
+
+
+def test_rotation():
+    import jwt
+    from tedega_auth.lib.keys import KeyRing, generate_key
+    keyring = KeyRing()
+    keyring.add(generate_key("old"))
+    keyring.add(generate_key("new", "EdDSA"), current=True)
+    token = keyring.sign({"sub": "foo"})
+    assert jwt.get_unverified_header(token)["kid"] == "new"
+    kids = [jwk["kid"] for jwk in keyring.jwks()["keys"]]
+    assert kids == ["old", "new"]
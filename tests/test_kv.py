@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_kv
+----------------------------------
+
+Tests for `tedega_auth.lib.kv` module.
+"""
+import pytest
+
+
+class FakeTimer(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def server(request):
+    from tests.resp_server import RESPServer
+    server = RESPServer()
+    server.start()
+    request.addfinalizer(server.stop)
+    return server
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, server):
+    from tedega_auth.lib.kv import MemoryKV, RedisKV
+    if request.param == "memory":
+        return MemoryKV()
+    store = RedisKV.from_url(server.url, pool_size=2)
+    request.addfinalizer(store.close)
+    return store
+
+
+def test_operations(store):
+    assert store.get("a") is None
+    assert store.set("a", "foo")
+    assert store.get("a") == "foo"
+    assert store.incr("b") == 1
+    assert store.incr("b", 2, ttl=10) == 3
+    assert store.get_many(["a", "b", "c"]) == ["foo", "3", None]
+    assert store.take("a") == "foo"
+    assert store.take("a") is None
+    assert store.delete("b")
+    assert not store.delete("b")
+
+
+def test_pipeline(store):
+    pipeline = store.pipeline()
+    pipeline.set("a", "1", ttl=10).incr("a", ttl=10).get("a").take("x")
+    assert pipeline.execute() == [True, 2, "2", None]
+    assert store.pipeline().execute() == []
+
+
+def test_memory_ttl():
+    from tedega_auth.lib.kv import MemoryKV
+    timer = FakeTimer()
+    store = MemoryKV(timer=timer)
+    store.set("a", "foo", ttl=10)
+    store.incr("b", ttl=20)
+    timer.now = 10
+    assert store.get("a") is None
+    assert store.incr("b") == 2
+    timer.now = 20
+    assert store.get("b") is None
+    assert len(store) == 0
+
+
+def test_memory_lru():
+    from tedega_auth.lib.kv import MemoryKV
+    store = MemoryKV(max_keys=2)
+    store.set("a", "1")
+    store.set("b", "2")
+    store.get("a")
+    store.set("c", "3")
+    # The least recently used key is dropped.
+    assert len(store) == 2
+    assert store.get_many(["a", "b", "c"]) == ["1", None, "3"]
+
+
+def test_redis_pipelining_and_pool(server):
+    from tedega_auth.lib.kv import RedisKV
+    store = RedisKV.from_url(server.url, pool_size=1)
+    pipeline = store.pipeline()
+    for i in range(10):
+        pipeline.incr("counter", ttl=10)
+    assert pipeline.execute()[-1] == 10
+    store.get("counter")
+    # One connection was opened and reused.
+    assert store.stats()["idle"] == 1
+    store.close()
+
+
+def test_redis_errors(server):
+    from tedega_auth.lib.kv import KVError, RedisKV
+    store = RedisKV("127.0.0.1", server.server_address[1])
+    store.set("a", "foo")
+    with pytest.raises(KVError):
+        store.incr("a")
+    closed = RedisKV("127.0.0.1", 1, timeout=0.1)
+    with pytest.raises(KVError):
+        closed.get("a")
+
+
+def test_connect():
+    from tedega_auth.lib.kv import connect, MemoryKV, RedisKV
+    assert isinstance(connect("memory://"), MemoryKV)
+    store = connect("redis://:secret@example.com:6380/2")
+    assert isinstance(store, RedisKV)
+    assert (store.host, store.port, store.db, store.password) == \
+        ("example.com", 6380, 2, "secret")
+    with pytest.raises(ValueError):
+        connect("foo://")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_metrics
+----------------------------------
+
+Tests for `tedega_auth.lib.metrics` module.
+"""
+import pytest
+
+
+def test_histogram():
+    from tedega_auth.lib.metrics import Registry
+    registry = Registry()
+    histogram = registry.histogram("test_seconds", "Test", (0.1, 1.0))
+    histogram.observe(0.5, endpoint="foo")
+    histogram.observe(2.0, endpoint="foo")
+    text = registry.export()
+    assert 'test_seconds_bucket{endpoint="foo",le="0.1"} 0' in text
+    assert 'test_seconds_bucket{endpoint="foo",le="1.0"} 1' in text
+    assert 'test_seconds_bucket{endpoint="foo",le="+Inf"} 2' in text
+    assert 'test_seconds_count{endpoint="foo"} 2' in text
+
+
+def test_track_request():
+    from tedega_auth.lib.metrics import (
+        track_request,
+        add_hash_time,
+        requests_total
+    )
+    with track_request("test") as stats:
+        add_hash_time(0.5)
+    assert stats.hash_time == 0.5
+    with pytest.raises(ValueError):
+        with track_request("test"):
+            raise ValueError()
+    samples = dict((labels, value) for _, labels, value
+                   in requests_total.samples())
+    assert samples[(("endpoint", "test"), ("outcome", "ok"))] == 1
+    assert samples[(("endpoint", "test"), ("outcome", "ValueError"))] == 1
+
+
+def test_sql_statements(randomstring):
+    import tedega_auth.api.user
+    from tedega_auth.lib.metrics import track_request
+    with track_request("test") as stats:
+        tedega_auth.api.user.search(limit=1)
+    assert stats.sql_statements >= 1
+    assert stats.db_time > 0
+
+
+def _sample(histogram, suffix, endpoint):
+    for name, labels, value in histogram.samples():
+        if name == histogram.name + suffix and \
+                labels == (("endpoint", endpoint),):
+            return value
+    return 0
+
+
+def test_track_stream():
+    import flask
+    import tedega_auth.api.user
+    from tedega_auth.lib.metrics import sql_statements
+    endpoint = "GET /users:scan"
+    count = _sample(sql_statements, "_count", endpoint)
+    total = _sample(sql_statements, "_sum", endpoint)
+    app = flask.Flask(__name__)
+    with app.test_request_context():
+        response = tedega_auth.api.user.scan(stream=True, fields="id")
+    # The request is recorded once its body has been sent.
+    assert _sample(sql_statements, "_count", endpoint) == count
+    list(response.response)
+    response.close()
+    assert _sample(sql_statements, "_count", endpoint) == count + 1
+    assert _sample(sql_statements, "_sum", endpoint) > total
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_oauth
+----------------------------------
+
+Tests for `tedega_auth.api.oauth` module.
+"""
+import base64
+import hashlib
+
+import pytest
+
+VERIFIER = "v" * 50
+CHALLENGE = base64.urlsafe_b64encode(
+    hashlib.sha256(VERIFIER.encode("ascii")).digest()).rstrip(b"=").decode()
+REDIRECT_URI = "http://localhost:8000/cb"
+
+
+@pytest.fixture()
+def app():
+    import flask
+    app = flask.Flask(__name__)
+    app.secret_key = "test"
+    return app
+
+
+@pytest.fixture()
+def client(randomstring):
+    from tedega_auth.lib.keys import keyring, generate_key
+    import tedega_auth.api.auth
+    import tedega_auth.api.user
+    if not len(keyring):
+        keyring.add(generate_key("test"))
+    name = randomstring(8)
+    user = tedega_auth.api.user.create(name=name, password="password")
+    client = tedega_auth.api.auth.add_client(dict(username=name,
+                                                  password="password",
+                                                  name="client",
+                                                  scopes="read write",
+                                                  redirect_uris=REDIRECT_URI))
+    client["user"] = user
+    return client
+
+
+def _query(response):
+    from urllib.parse import urlparse, parse_qs
+    location = urlparse(response.headers["Location"])
+    return dict((k, v[0]) for k, v in parse_qs(location.query).items())
+
+
+def _authorize(app, client, confirm="yes"):
+    import flask
+    from tedega_auth.api import oauth
+    with app.test_request_context("/oauth/authorize"):
+        flask.session["user_id"] = client["user"]["id"]
+        page = oauth.authorize("code", client["client_id"], scope="read",
+                               state="xyz", code_challenge=CHALLENGE)
+        assert page.status_code == 200
+        assert client["client_id"] in page.get_data(as_text=True)
+        csrf_token = flask.session["csrf_token"]
+        response = oauth.consent("code", client["client_id"], csrf_token,
+                                 confirm, scope="read", state="xyz",
+                                 code_challenge=CHALLENGE)
+    assert response.headers["Location"].startswith(REDIRECT_URI)
+    return _query(response)
+
+
+def test_authorization_code_flow(app, client):
+    from tedega_view.exceptions import ClientError
+    from tedega_auth.api import oauth
+    from tedega_auth.lib.tokens import validate_token
+    secret = client["client_secret"]
+    params = _authorize(app, client)
+    assert params["state"] == "xyz"
+    with pytest.raises(ClientError):
+        oauth.token("authorization_code", params["code"], client["client_id"],
+                    "w" * 50, client_secret=secret)
+    # The code has been used by the failed attempt.
+    params = _authorize(app, client)
+    tokens = oauth.token("authorization_code", params["code"],
+                         client["client_id"], VERIFIER, client_secret=secret)
+    claims = validate_token(tokens["access_token"], "read")
+    assert claims["user_id"] == client["user"]["id"]
+    assert tokens["scope"] == "read"
+    with pytest.raises(ClientError):
+        oauth.token("authorization_code", params["code"], client["client_id"],
+                    VERIFIER, client_secret=secret)
+
+
+def test_token_client_authentication(app, client):
+    from tedega_view import AuthError
+    from tedega_auth.api import oauth
+    params = _authorize(app, client)
+    for secret in [None, "wrong"]:
+        with pytest.raises(AuthError):
+            oauth.token("authorization_code", params["code"],
+                        client["client_id"], VERIFIER, client_secret=secret)
+    # Failed authentications do not use up the code.
+    tokens = oauth.token("authorization_code", params["code"],
+                         client["client_id"], VERIFIER,
+                         client_secret=client["client_secret"])
+    assert tokens["access_token"]
+
+
+def test_access_denied(app, client):
+    params = _authorize(app, client, confirm="no")
+    assert params["error"] == "access_denied"
+
+
+def test_authorize_errors(app, client):
+    from tedega_view.exceptions import ClientError
+    from tedega_auth.api import oauth
+    with app.test_request_context("/oauth/authorize"):
+        with pytest.raises(ClientError):
+            oauth.authorize("code", client["client_id"],
+                            redirect_uri="http://evil.com/cb",
+                            code_challenge=CHALLENGE)
+        response = oauth.authorize("code", client["client_id"])
+        assert _query(response)["error"] == "invalid_request"
+        response = oauth.authorize("code", client["client_id"], scope="admin",
+                                   code_challenge=CHALLENGE)
+        assert _query(response)["error"] == "invalid_scope"
+        # Not logged in
+        response = oauth.authorize("code", client["client_id"],
+                                   code_challenge=CHALLENGE)
+        assert response.headers["Location"].startswith("/?next=")
+
+
+def test_sign_in(app, client):
+    import flask
+    from tedega_view import AuthError
+    from tedega_auth.api import oauth
+    name = client["user"]["name"]
+    with app.test_request_context("/", method="POST"):
+        response = oauth.sign_in(name, "password", next="//evil.com")
+        assert response.headers["Location"] == "/"
+        assert flask.session["user_id"] == client["user"]["id"]
+        page = oauth.home()
+        assert name in page.get_data(as_text=True)
+        with pytest.raises(AuthError):
+            oauth.sign_in(name, "wrong")
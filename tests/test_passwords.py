@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_passwords
+----------------------------------
+
+Tests for `tedega_auth.lib.passwords` module.
+"""
+
+
+def test_encrypt_verify():
+    from tedega_auth.lib.passwords import encrypt, verify, parse
+    hashed = encrypt("secret", 1000)
+    assert parse(hashed)[0] == 1000
+    assert verify("secret", hashed)
+    assert not verify("wrong", hashed)
+
+
+def test_needs_rehash():
+    from tedega_share.lib.security import encrypt_password
+    from tedega_auth.lib.passwords import HashPolicy, encrypt
+    policy = HashPolicy(iterations=2000)
+    assert policy.needs_rehash(encrypt("secret", 1000))
+    assert not policy.needs_rehash(encrypt("secret", 2000))
+    assert policy.needs_rehash(encrypt_password("secret"))
+
+
+def test_legacy_verify():
+    from tedega_share.lib.security import encrypt_password
+    from tedega_auth.lib.passwords import verify
+    assert verify("secret", encrypt_password("secret"))
+
+
+def test_calibrate():
+    from tedega_auth.lib.passwords import HashPolicy, MIN_ITERATIONS
+    policy = HashPolicy(target_time=0.01)
+    assert policy.iterations >= MIN_ITERATIONS
+
+
+def test_calibrated_rehash():
+    from tedega_auth.lib.passwords import HashPolicy, _quantize, encrypt
+    assert _quantize(300000) == _quantize(400000) == 2 ** 18
+    policy = HashPolicy()
+    policy.calibrate = lambda: 2 ** 18
+    assert policy.min_iterations == 2 ** 17
+    # Hashes of a worker which calibrated one step lower are kept.
+    assert not policy.needs_rehash(encrypt("secret", 2 ** 17))
+    assert policy.needs_rehash(encrypt("secret", 2 ** 16))
+
+
+def test_malformed_hash():
+    from tedega_auth.lib.passwords import HashPolicy, PREFIX, verify
+    for hashed in (PREFIX + "broken", PREFIX + "i=x$a$b", ""):
+        assert not verify("secret", hashed)
+    assert HashPolicy(iterations=2000).needs_rehash(PREFIX + "broken")
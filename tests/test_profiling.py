@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiling
+----------------------------------
+
+Tests for `tedega_auth.lib.profiling` module.
+"""
+
+
+def test_profiler():
+    import sys
+    from tedega_auth.lib.profiling import start_profiling
+    sys.modules.pop("colorsys", None)
+    profiler = start_profiling()
+    import colorsys  # noqa
+    profiler.uninstall()
+    assert "colorsys" in profiler.timings
+    assert "colorsys" in profiler.report()
+
+
+def test_deferred_imports():
+    import subprocess
+    import sys
+    code = ("import sys, tedega_auth.lib.keys, tedega_auth.lib.tokens; "
+            "print(any(name.split('.')[0] in ('cryptography', 'jwt') "
+            "for name in sys.modules))")
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.strip() == b"False"
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_ratelimit
+----------------------------------
+
+Tests for `tedega_auth.lib.ratelimit` module.
+"""
+import pytest
+
+
+class FakeTimer(object):
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_limit():
+    from tedega_auth.lib.ratelimit import SlidingWindowLimiter, RateLimited
+    timer = FakeTimer(100.0)
+    limiter = SlidingWindowLimiter(2, 10, timer=timer)
+    limiter.check_and_hit("a")
+    limiter.check_and_hit("a")
+    with pytest.raises(RateLimited) as error:
+        limiter.check_and_hit("a")
+    assert error.value.retry_after == 10
+    # Other keys are not affected.
+    limiter.check_and_hit("b")
+
+
+def test_sliding_window():
+    from tedega_auth.lib.ratelimit import SlidingWindowLimiter, RateLimited
+    timer = FakeTimer(100.0)
+    limiter = SlidingWindowLimiter(2, 10, timer=timer)
+    limiter.hit("a")
+    limiter.hit("a")
+    # Half of the previous window still counts.
+    timer.now = 115.0
+    limiter.check_and_hit("a")
+    with pytest.raises(RateLimited):
+        limiter.check("a")
+    # Two windows later the hits are gone.
+    timer.now = 130.0
+    limiter.check("a")
+
+
+def test_disabled():
+    from tedega_auth.lib.ratelimit import SlidingWindowLimiter
+    limiter = SlidingWindowLimiter(0, 10)
+    for _ in range(10):
+        limiter.check_and_hit("a")
+
+
+def test_login_failures(randomstring, monkeypatch):
+    from tedega_view import AuthError
+    from tedega_auth.lib.ratelimit import RateLimited
+    import tedega_auth.api.auth
+    monkeypatch.setattr(tedega_auth.api.auth.failure_limiter, "limit", 2)
+    values = dict(client_id=randomstring(40), client_secret="wrong")
+    for _ in range(2):
+        with pytest.raises(AuthError):
+            tedega_auth.api.auth.login(values)
+    with pytest.raises(RateLimited):
+        tedega_auth.api.auth.login(values)
+
+
+def test_shared_backend():
+    from tedega_auth.lib.kv import MemoryKV
+    from tedega_auth.lib.ratelimit import (
+        SlidingWindowLimiter,
+        SharedBackend,
+        RateLimited
+    )
+    timer = FakeTimer(100.0)
+    backend = SharedBackend(MemoryKV())
+    # Two limiters sharing one store behave like two workers.
+    limiters = [SlidingWindowLimiter(3, 10, backend, timer=timer)
+                for i in range(2)]
+    limiters[0].check_and_hit("a", "b")
+    limiters[1].check_and_hit("a")
+    limiters[0].check_and_hit("a")
+    with pytest.raises(RateLimited):
+        limiters[1].check("a")
+    limiters[1].check("b")
+    timer.now = 120.0
+    limiters[1].check("a")
+
+
+def test_service_limiters_shared_store(monkeypatch):
+    from tedega_auth.lib import kv
+    from tedega_auth.lib.ratelimit import (
+        SlidingWindowLimiter,
+        create_backend,
+        RateLimited
+    )
+    monkeypatch.setenv("TEDEGA_AUTH_KV_URL", "memory://")
+    monkeypatch.setattr(kv, "store", kv.MemoryKV())
+    timer = FakeTimer(100.0)
+    requests = SlidingWindowLimiter(3, 10, create_backend("ratelimit:req:"),
+                                    timer=timer)
+    failures = SlidingWindowLimiter(1, 10, create_backend("ratelimit:fail:"),
+                                    timer=timer)
+    # Both limiters count the IP, but each has its own counter.
+    requests.check_and_hit("ip:1")
+    requests.check_and_hit("ip:1")
+    failures.check_and_hit("ip:1")
+    requests.check_and_hit("ip:1")
+    with pytest.raises(RateLimited):
+        requests.check("ip:1")
+    with pytest.raises(RateLimited):
+        failures.check("ip:1")
+    failures.check("ip:2")
+
+
+def test_memory_backend_bounded():
+    from tedega_auth.lib.ratelimit import MemoryBackend
+    backend = MemoryBackend(max_keys=2)
+    backend.hit(["a"], 10, 100)
+    backend.hit(["b"], 10, 100)
+    backend.hit(["a"], 10, 100)
+    backend.hit(["c"], 10, 100)
+    # The least recently hit key is dropped.
+    assert len(backend) == 2
+    assert backend.counts(["a", "b", "c"], 10, 100) == [(2, 0), (0, 0),
+                                                        (1, 0)]
+
+
+def test_trusted_proxies():
+    import flask
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from tedega_auth.api.auth import _remote_addr
+    app = flask.Flask(__name__)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
+    @app.route("/")
+    def index():
+        return _remote_addr()
+    response = app.test_client().get(
+        "/", headers={"X-Forwarded-For": "10.0.0.1, 192.0.2.7"},
+        environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert response.data == b"ip:192.0.2.7"
+
+
+def test_storage_error_not_counted(randomstring, monkeypatch):
+    import sqlalchemy as sa
+    import tedega_auth.api.auth
+
+    def load_client(client_id):
+        raise sa.exc.OperationalError("SELECT", {}, Exception("down"))
+    monkeypatch.setattr(tedega_auth.api.auth, "load_client", load_client)
+    monkeypatch.setattr(tedega_auth.api.auth.failure_limiter, "limit", 1)
+    values = dict(client_id=randomstring(40), client_secret="secret")
+    for _ in range(3):
+        # The outage is an error of the service, not a failed login.
+        with pytest.raises(sa.exc.OperationalError):
+            tedega_auth.api.auth.login(values)
+
+
+def test_store_failure_fails_closed():
+    from tedega_auth.lib.kv import KVError, MemoryKV
+    from tedega_auth.lib.ratelimit import (
+        LimiterUnavailable,
+        SharedBackend,
+        SlidingWindowLimiter
+    )
+
+    class BrokenKV(MemoryKV):
+
+        def get_many(self, keys):
+            raise KVError("Connection closed")
+
+        def pipeline(self):
+            raise KVError("Connection closed")
+
+    limiter = SlidingWindowLimiter(3, 10, SharedBackend(BrokenKV()))
+    with pytest.raises(LimiterUnavailable) as error:
+        limiter.check("a")
+    assert error.value.code == 503
+    assert ("Retry-After", "5") in error.value.get_headers()
+    with pytest.raises(LimiterUnavailable):
+        limiter.hit("a")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_scopes
+----------------------------------
+
+Tests for `tedega_auth.lib.scopes` module.
+"""
+
+
+def test_parse_scopes():
+    from tedega_auth.lib.scopes import parse_scopes
+    assert parse_scopes(None) == frozenset()
+    assert parse_scopes("read write") == frozenset(["read", "write"])
+    assert parse_scopes("read write") is parse_scopes("read write")
+
+
+def test_normalize():
+    from tedega_auth.lib.scopes import normalize
+    assert normalize("") is None
+    assert normalize("b a b") == "b a"
+
+
+def test_redirect_uris():
+    from tedega_auth.lib.scopes import parse_redirect_uris
+    uris = parse_redirect_uris("https://*.example.com/cb http://localhost/cb")
+    assert uris.default == "http://localhost/cb"
+    assert uris.matches("http://localhost/cb")
+    assert uris.matches("https://app.example.com/cb")
+    assert not uris.matches("https://evil.com/.example.com/cb")
+    assert not uris.matches("http://localhost/cb/x")
+    assert not parse_redirect_uris(None).matches("http://localhost/cb")
+
+
+def test_redirect_uri_wildcards():
+    from tedega_auth.lib.scopes import parse_redirect_uris
+    uris = parse_redirect_uris("https://*.example.com/cb "
+                               "https://app-*.example.org/cb?a=1 "
+                               "https://example.net/*")
+    assert uris.default is None
+    assert uris.matches("https://app.example.com/cb")
+    assert uris.matches("https://APP.example.com/cb")
+    assert uris.matches("https://app-1.example.org/cb?a=1")
+    for uri in ["https://evil.com\\@app.example.com/cb",
+                "https://evil.com\\.example.com/cb",
+                "https://app.example.com@evil.com/cb",
+                "https://user@app.example.com/cb",
+                "https://evil.com%2F.example.com/cb",
+                "https://evil.com#.example.com/cb",
+                "https://evil.com/.example.com/cb",
+                "https://a.b.example.com/cb",
+                "https://.example.com/cb",
+                "http://app.example.com/cb",
+                "https://app.example.com:8443/cb",
+                "https://app.example.com/cb/x",
+                "https://app.example.com/cb?x=1",
+                "https://app.example.com/cb#x",
+                "https://app.example.org/cb?a=1",
+                "https://example.net/cb"]:
+        assert not uris.matches(uri), uri
+
+
+def test_require_scope():
+    import flask
+    import pytest
+    from tedega_view import AuthError
+    from tedega_auth.lib.endpoint import require_scope
+    from tedega_auth.lib.keys import keyring, generate_key
+    from tedega_auth.lib.tokens import issue_access_token
+    if not len(keyring):
+        keyring.add(generate_key("test"))
+    token = issue_access_token("client", scopes=["read"])
+    app = flask.Flask(__name__)
+    # Outside a request there is nothing to check.
+    require_scope("write")
+    headers = {"Authorization": "Bearer " + token}
+    with app.test_request_context(headers=headers):
+        require_scope("read")
+        assert flask.g.token_claims["sub"] == "client"
+        with pytest.raises(AuthError):
+            require_scope("write")
+    with app.test_request_context():
+        with pytest.raises(AuthError):
+            require_scope("read")
+
+
+def test_async_scope(monkeypatch):
+    import asyncio
+    import pytest
+    from tedega_view import AuthError
+    from tedega_auth.api import aio
+    from tedega_auth.lib.keys import keyring, generate_key
+    from tedega_auth.lib.tokens import issue_access_token
+    if not len(keyring):
+        keyring.add(generate_key("test"))
+    monkeypatch.setenv("TEDEGA_AUTH_ENFORCE_SCOPES", "1")
+    token = issue_access_token("client", scopes=["read"])
+    asyncio.run(aio.search(limit=1, token=token))
+    with pytest.raises(AuthError):
+        asyncio.run(aio.search(limit=1))
+    with pytest.raises(AuthError):
+        asyncio.run(aio.delete(1, token=token))
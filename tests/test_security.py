@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_security
+----------------------------------
+
+Tests for `tedega_auth.lib.security` module.
+"""
+
+
+def test_hash_secret():
+    from tedega_auth.lib.security import hash_secret, is_hashed_secret
+    hashed = hash_secret("secret", key="key")
+    assert is_hashed_secret(hashed)
+    assert not is_hashed_secret("secret")
+    assert hashed == hash_secret("secret", key="key")
+    assert hashed != hash_secret("secret", key="other")
+
+
+def test_verify_secret():
+    from tedega_auth.lib.security import hash_secret, verify_secret
+    hashed = hash_secret("secret", key="key")
+    assert verify_secret("secret", hashed, key="key")
+    assert not verify_secret("wrong", hashed, key="key")
+    assert not verify_secret("secret", None, key="key")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_serialize
+----------------------------------
+
+Tests for `tedega_auth.lib.serialize` module.
+"""
+import pytest
+
+
+def test_serializer(randomstring):
+    import datetime
+    import json
+    from tedega_auth.lib.serialize import Serializer, dumps, format_datetime
+    from tedega_auth.model.user import User
+    user = User(randomstring(8), "password")
+    user.id = 1
+    user.updated = datetime.datetime(2017, 1, 2, 3, 4, 5)
+    serialize = Serializer(User, exclude=("name_key",))
+    values = serialize(user)
+    expected = user.get_values()
+    del expected["name_key"]
+    expected["updated"] = format_datetime(user.updated)
+    assert values == expected
+    assert json.loads(dumps(values)) == expected
+    assert serialize.many([user, user]) == [expected, expected]
+    assert Serializer(User, exclude=("password",))(user)["updated"] == \
+        "2017-01-02T03:04:05Z"
+
+
+def test_single_column():
+    from tedega_auth.lib.serialize import Serializer
+    from tedega_auth.model.user import User
+    keys = [c.key for c in User.__table__.columns if c.key != "name"]
+    user = User("foo", "password")
+    assert Serializer(User, exclude=keys)(user) == {"name": "foo"}
+
+
+def test_dumps():
+    import datetime
+    import json
+    from tedega_auth.lib.serialize import dumps
+    value = {"a": datetime.datetime(2017, 1, 2), "b": [1, "x"]}
+    assert json.loads(dumps(value)) == {"a": "2017-01-02T00:00:00Z",
+                                        "b": [1, "x"]}
+    with pytest.raises(TypeError):
+        dumps(object())
+
+
+def test_use_fast_json():
+    import flask
+    pytest.importorskip("orjson")
+    from tedega_auth.lib.serialize import use_fast_json
+    app = flask.Flask(__name__)
+    assert use_fast_json(app)
+    with app.app_context():
+        assert flask.json.dumps({"a": 1}) == '{"a":1}'
+
+
+def test_fast_json_disabled(monkeypatch):
+    import flask
+    from tedega_auth.lib import serialize
+    monkeypatch.setattr(serialize, "FAST_JSON", False)
+    assert serialize.dumps({"a": [1, None]}) == '{"a":[1,null]}'
+    assert not serialize.use_fast_json(flask.Flask(__name__))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_storage
+----------------------------------
+
+Tests for `tedega_auth.lib.storage` module.
+"""
+import pytest
+
+
+def test_request_scope(dbmodel):
+    from tedega_auth.lib.storage import request_scope, unit_of_work
+    with request_scope():
+        with unit_of_work() as first:
+            pass
+        with unit_of_work() as second:
+            pass
+        with request_scope():
+            with unit_of_work() as nested:
+                pass
+    assert first is second
+    assert first is nested
+
+
+def test_request_scope_rollback(dbmodel, randomstring):
+    from tedega_auth.lib.storage import request_scope, unit_of_work
+    from tedega_auth.model.user import User
+    name = randomstring(8)
+    with pytest.raises(ValueError):
+        with request_scope():
+            with unit_of_work() as storage:
+                storage.create(User(name, "password"))
+            raise ValueError()
+    with unit_of_work() as storage:
+        query = storage.session.query(User).filter(User.name == name)
+        assert query.count() == 0
+
+
+def test_configure_pool(dbmodel, monkeypatch):
+    import sqlalchemy as sa
+    from tedega_auth.lib import storage as module
+    from tedega_auth.lib.storage import configure_pool, pool_stats
+    from tedega_auth.lib.storage import unit_of_work
+    monkeypatch.setenv("TEDEGA_AUTH_DB_POOL_SIZE", "3")
+    monkeypatch.setattr(module, "_engine", None)
+    if not configure_pool():
+        pytest.skip("Storage does not use a QueuePool")
+    engine = module._engine
+    assert configure_pool()
+    assert module._engine is engine
+    with unit_of_work() as storage:
+        assert storage.session.get_bind() is engine
+        storage.session.execute(sa.text("SELECT 1"))
+        stats = pool_stats()
+        assert stats["size"] == 3
+        assert stats["checked_out"] == 1
@@ -28,3 +28,65 @@ def test_content(response):
     """
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+def test_seed_idempotent(storage):
+    from tedega_auth.model.user import User
+    with storage:
+        server.seed(storage)
+    with storage:
+        server.seed(storage)
+        query = storage.session.query(User).filter(User.name == "admin")
+        assert query.count() == 1
+
+
+def test_seed_race(storage, monkeypatch):
+    from tedega_auth.model.user import User
+    with storage:
+        server.seed(storage)
+    # Another worker created the admin after this one checked.
+    monkeypatch.setattr(server, "_has_admin", lambda storage: False)
+    with storage:
+        assert not server.seed(storage)
+    with storage:
+        query = storage.session.query(User).filter(User.name == "admin")
+        assert query.count() == 1
+
+
+def test_prepare_storage_retry(monkeypatch):
+    from tedega_auth.api.health import Readiness
+    failures = [RuntimeError("down"), RuntimeError("down")]
+    delays = []
+
+    def init_storage(dsn):
+        if failures:
+            raise failures.pop()
+    readiness = Readiness()
+    monkeypatch.setattr(server, "readiness", readiness)
+    monkeypatch.setattr(server, "init_storage", init_storage)
+    configured = []
+    monkeypatch.setattr(server, "configure_pool",
+                        lambda: configured.append(1))
+    monkeypatch.setattr(server, "init_revocations", lambda interval: None)
+    server._prepare_storage(10, sleep=delays.append)
+    assert delays == [1, 2]
+    assert configured == [1]
+    assert readiness.is_ready()
+    assert readiness.error is None
+
+
+def test_parse_targets():
+    assert server.parse_targets("") == []
+    assert server.parse_targets("a:80, b:8080") == [("a", 80), ("b", 8080)]
+
+
+def test_session_key(monkeypatch):
+    monkeypatch.setenv("TEDEGA_AUTH_SECRET_KEY", "secret")
+    monkeypatch.delenv("TEDEGA_AUTH_SESSION_KEY", raising=False)
+    with pytest.raises(ValueError):
+        server.session_key()
+    monkeypatch.setenv("TEDEGA_AUTH_SESSION_KEY", "secret")
+    with pytest.raises(ValueError):
+        server.session_key()
+    monkeypatch.setenv("TEDEGA_AUTH_SESSION_KEY", "session")
+    assert server.session_key() == "session"
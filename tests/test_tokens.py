@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_tokens
+----------------------------------
+
+Tests for `tedega_auth.lib.tokens` module.
+"""
+import pytest
+
+
+@pytest.fixture()
+def keyring(request):
+    from tedega_auth.lib.keys import keyring, generate_key
+    keyring.clear()
+    keyring.add(generate_key("test"))
+    return keyring
+
+
+def test_validate(keyring):
+    from tedega_auth.lib.tokens import issue_access_token, validate_token
+    token = issue_access_token("client", 1, ["read", "write"])
+    claims = validate_token(token)
+    assert claims["sub"] == "client"
+    assert claims["user_id"] == 1
+    assert claims["exp"] > claims["iat"]
+    assert validate_token(token, "write")["jti"] == claims["jti"]
+
+
+def test_validate_scope(keyring):
+    from tedega_auth.lib.tokens import (
+        InsufficientScope,
+        issue_access_token,
+        validate_token
+    )
+    token = issue_access_token("client", 1, ["read"])
+    with pytest.raises(InsufficientScope):
+        validate_token(token, "write")
+
+
+def test_validate_expired(keyring, monkeypatch):
+    from tedega_auth.lib.tokens import (
+        InvalidToken,
+        issue_access_token,
+        validate_token
+    )
+    monkeypatch.setenv("TEDEGA_AUTH_ACCESS_TOKEN_TTL", "-10")
+    token = issue_access_token("client")
+    with pytest.raises(InvalidToken):
+        validate_token(token)
+
+
+def test_validate_unknown_key(keyring):
+    from tedega_auth.lib.keys import generate_key
+    from tedega_auth.lib.tokens import (
+        InvalidToken,
+        issue_access_token,
+        validate_token
+    )
+    token = issue_access_token("client")
+    keyring.clear()
+    keyring.add(generate_key("other"))
+    with pytest.raises(InvalidToken):
+        validate_token(token)
+
+
+def test_validate_revocations_not_loaded(keyring, monkeypatch):
+    from tedega_auth.lib.revocation import revocations
+    from tedega_auth.lib.tokens import (
+        InvalidToken,
+        issue_access_token,
+        validate_token
+    )
+    token = issue_access_token("client", 1, ["read"], rid=1)
+    monkeypatch.setattr(revocations, "watermark", None)
+    with pytest.raises(InvalidToken):
+        validate_token(token)
+    # Tokens without a refresh token can not be revoked.
+    validate_token(issue_access_token("client", 1, ["read"]))
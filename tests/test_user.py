@@ -11,114 +11,374 @@ Tests for `tedega_auth.model.user` module.
 import pytest
 
 
-def test_not_found():
+def test_not_found(user_api):
     from tedega_view.exceptions import NotFound
-    import tedega_auth.api.user
     with pytest.raises(NotFound):
-        tedega_auth.api.user.read(9999)
+        user_api.read(9999)
 
 
-def test_search(randomstring):
-    import tedega_auth.api.user
+def test_search(randomstring, user_api):
     name = randomstring(8)
-    tedega_auth.api.user.create(name=name, password="password")
-    users = tedega_auth.api.user.search()
+    user_api.create(name=name, password="password")
+    users = user_api.search()
     assert isinstance(users, list)
     assert len(users) > 0
+    assert all("password" not in user for user in users)
+    assert "name" in users[0] and "created" in users[0]
 
 
-def test_search_filters(randomstring):
-    import tedega_auth.api.user
+def test_search_filters(randomstring, user_api):
     from tedega_view.exceptions import ClientError
     name = randomstring(8)
-    tedega_auth.api.user.create(name=name, password="password")
+    user_api.create(name=name, password="password")
 
     offset = 0
     limit = 10
     search = "id::1|name::test"
     sort = "id|-name"
     fields = "id|name"
-    users = tedega_auth.api.user.search(offset=offset, limit=limit,
-                                       search=search, sort=sort,
-                                       fields=fields)
+    users = user_api.search(offset=offset, limit=limit,
+                            search=search, sort=sort,
+                            fields=fields)
 
     with pytest.raises(ClientError):
         search = "id:1|name::test"
-        users = tedega_auth.api.user.search(offset=offset, limit=limit,
-                                           search=search, sort=sort,
-                                           fields=fields)
+        users = user_api.search(offset=offset, limit=limit,
+                                search=search, sort=sort,
+                                fields=fields)
     with pytest.raises(ClientError):
         search = "id::1|xxx::test"
-        users = tedega_auth.api.user.search(offset=offset, limit=limit,
-                                           search=search, sort=sort,
-                                           fields=fields)
+        users = user_api.search(offset=offset, limit=limit,
+                                search=search, sort=sort,
+                                fields=fields)
 
     with pytest.raises(ClientError):
         search = "id::1|name::test"
         sort = "id,updated"
-        users = tedega_auth.api.user.search(offset=offset, limit=limit,
-                                           search=search, sort=sort,
-                                           fields=fields)
+        users = user_api.search(offset=offset, limit=limit,
+                                search=search, sort=sort,
+                                fields=fields)
 
     assert isinstance(users, list)
     assert len(users) == 0
 
 
-def test_create(randomstring):
-    import tedega_auth.api.user
+def test_create(randomstring, user_api):
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
+    user = user_api.create(name=name, password="password")
     assert user['name'] == name
 
 
-def test_create_unique_name(randomstring):
+def test_create_unique_name(randomstring, user_api):
     import sqlalchemy as sa
-    import tedega_auth.api.user
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
+    user = user_api.create(name=name, password="password")
     assert user['name'] == name
     with pytest.raises(sa.exc.IntegrityError):
-        user = tedega_auth.api.user.create(name=name, password="password")
+        user = user_api.create(name=name, password="password")
 
 
-def test_read(randomstring):
-    import tedega_auth.api.user
+def test_read(randomstring, user_api):
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
-    loaded = tedega_auth.api.user.read(user['id'])
+    user = user_api.create(name=name, password="password")
+    loaded = user_api.read(user['id'])
     assert loaded['name'] == name
 
 
-def test_update(randomstring):
+def test_update(randomstring, user_api):
     from tedega_view.exceptions import NotFound
-    import tedega_auth.api.user
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
-    values = {"name": "updated"}
-    updated = tedega_auth.api.user.update(user['id'], values)
-    assert updated['name'] == "updated"
+    user = user_api.create(name=name, password="password")
+    values = {"name": randomstring(8)}
+    updated = user_api.update(user['id'], values)
+    assert updated['name'] == values["name"]
     assert updated['updated'] != user['updated']
 
     with pytest.raises(NotFound):
-        updated = tedega_auth.api.user.update(9999, values)
+        updated = user_api.update(9999, values)
 
 
-def test_delete(randomstring):
+def test_delete(randomstring, user_api):
     from tedega_view.exceptions import NotFound
-    import tedega_auth.api.user
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
-    tedega_auth.api.user.delete(user['id'])
+    user = user_api.create(name=name, password="password")
+    user_api.delete(user['id'])
     with pytest.raises(NotFound):
-        user = tedega_auth.api.user.delete(user['id'])
+        user = user_api.delete(user['id'])
 
 
-def test_reset_password(randomstring):
-    import tedega_auth.api.user
+def test_reset_password(randomstring, user_api):
     password = randomstring(8)
     name = randomstring(8)
-    user = tedega_auth.api.user.create(name=name, password="password")
-    result = tedega_auth.api.user.reset_password(user['id'], password)
+    user = user_api.create(name=name, password="password")
+    result = user_api.reset_password(user['id'], password)
     assert result == password
-    result = tedega_auth.api.user.reset_password(user['id'])
+    result = user_api.reset_password(user['id'])
     assert result != password
+
+
+def test_rehash_on_verify(randomstring):
+    from tedega_share.lib.security import encrypt_password
+    from tedega_auth.model.user import User
+    user = User(randomstring(8), encrypt_password("password"))
+    assert user.verify_password("password")
+    assert user.password.startswith("$pbkdf2-sha256$")
+    assert user.verify_password("password")
+    assert not user.verify_password("wrong")
+
+
+def test_rehash_overloaded(randomstring, monkeypatch):
+    from tedega_share.lib.security import encrypt_password
+    import tedega_auth.model.user
+    from tedega_auth.lib.hashing import Overloaded
+    old_hash = encrypt_password("password")
+    user = tedega_auth.model.user.User(randomstring(8), old_hash)
+
+    def overloaded(password):
+        raise Overloaded()
+    monkeypatch.setattr(tedega_auth.model.user, "encrypt_password",
+                        overloaded)
+    # The password is correct; the rehash is left for a later login.
+    assert user.verify_password("password")
+    assert user.password == old_hash
+
+
+def test_scan(randomstring, user_api):
+    for i in range(3):
+        user_api.create(name=randomstring(8), password="password")
+    page = user_api.scan(limit=2)
+    assert len(page["items"]) == 2
+    assert page["next"]
+    ids = [user["id"] for user in page["items"]]
+    page = user_api.scan(limit=2, cursor=page["next"])
+    assert page["items"][0]["id"] > ids[-1]
+
+
+def test_scan_invalid_cursor(user_api):
+    from tedega_view.exceptions import ClientError
+    with pytest.raises(ClientError):
+        user_api.scan(cursor="xxx")
+
+
+@pytest.mark.parametrize("after", ["1", 1.5, True, None, [1]])
+def test_scan_invalid_cursor_value(user_api, after):
+    from tedega_auth.lib.query import encode_cursor
+    from tedega_view.exceptions import ClientError
+    with pytest.raises(ClientError):
+        user_api.scan(cursor=encode_cursor({"id": after}))
+
+
+def test_scan_stream(randomstring, user_api):
+    import json
+    user_api.create(name=randomstring(8), password="password")
+    response = user_api.scan(stream=True, fields="id|name")
+    lines = list(response.response)
+    assert len(lines) > 0
+    assert set(json.loads(lines[0]).keys()) == set(["id", "name"])
+
+
+def test_search_fields(randomstring, user_api):
+    name = randomstring(8)
+    user_api.create(name=name, password="password")
+    users = user_api.search(search="name::" + name,
+                            fields="id|name|password")
+    assert len(users) == 1
+    assert set(users[0].keys()) == set(["id", "name"])
+
+
+def test_bulk_create(randomstring, user_api):
+    name = randomstring(8)
+    values = [dict(name=name, password="password"),
+              dict(name=name, password="password"),
+              dict(name=randomstring(8)),
+              dict(name=randomstring(8), password="password")]
+    results = user_api.bulk_create(values)
+    assert [r["status"] for r in results] == [201, 409, 400, 201]
+    user = user_api.read(results[0]["id"])
+    assert user["name"] == name
+
+
+def test_bulk_update(randomstring, user_api):
+    user = user_api.create(name=randomstring(8), password="password")
+    name = randomstring(8)
+    values = [dict(id=user["id"], name=name),
+              dict(id=9999, name=randomstring(8)),
+              dict(id=user["id"], xxx="foo")]
+    results = user_api.bulk_update(values)
+    assert [r["status"] for r in results] == [200, 404, 400]
+    assert user_api.read(user["id"])["name"] == name
+
+
+def test_bulk_delete(randomstring, user_api):
+    from tedega_view.exceptions import NotFound
+    user = user_api.create(name=randomstring(8), password="password")
+    results = user_api.bulk_delete([user["id"], 9999, "foo"])
+    assert [r["status"] for r in results] == [204, 404, 400]
+    with pytest.raises(NotFound):
+        user_api.read(user["id"])
+
+
+def test_name_case_insensitive(randomstring, user_api):
+    import sqlalchemy as sa
+    from tedega_auth.model.user import User
+    name = randomstring(8)
+    user = user_api.create(name=name, password="password")
+    with pytest.raises(sa.exc.IntegrityError):
+        user_api.create(name=name.swapcase(), password="password")
+    from tedega_storage.rdbms import get_storage
+    with get_storage() as storage:
+        found = User.by_name(storage.session, name.upper()).one()
+        assert found.id == user["id"]
+
+
+def test_search_name_prefix(randomstring, user_api):
+    prefix = "pre_%" + randomstring(6)
+    for suffix in ("a", "B"):
+        user_api.create(name=prefix + suffix, password="password")
+    user_api.create(name="x" + prefix, password="password")
+    users = user_api.search(search="name::" + prefix.upper(), fields="id|name")
+    assert sorted(u["name"] for u in users) == [prefix + "B", prefix + "a"]
+    users = user_api.search(search="name::pre_%_", fields="id|name")
+    assert len(users) == 0
+
+
+def test_bulk_update_name_key(randomstring, user_api):
+    from tedega_storage.rdbms import get_storage
+    from tedega_auth.model.user import User
+    user = user_api.create(name=randomstring(8), password="password")
+    name = randomstring(8)
+    user_api.bulk_update([dict(id=user["id"], name=name)])
+    with get_storage() as storage:
+        assert User.by_name(storage.session, name).one().id == user["id"]
+
+
+def _old_users(names):
+    import sqlalchemy as sa
+
+    class Storage(object):
+        session = sa.orm.Session(sa.create_engine("sqlite://"))
+
+    Storage.session.execute(sa.text("CREATE TABLE users "
+                                    "(id INTEGER PRIMARY KEY, name VARCHAR)"))
+    for name in names:
+        Storage.session.execute(sa.text("INSERT INTO users (name) "
+                                        "VALUES (:name)"), dict(name=name))
+    return Storage
+
+
+def test_upgrade_users():
+    import sqlalchemy as sa
+    from tedega_auth.model.user import upgrade_users
+    storage = _old_users(["Foo", "bar"])
+    upgrade_users(storage, batch_size=1)
+    upgrade_users(storage)
+    keys = storage.session.execute(sa.text("SELECT name_key FROM users "
+                                           "ORDER BY id"))
+    assert [key for key, in keys] == ["foo", "bar"]
+    with pytest.raises(ValueError):
+        upgrade_users(_old_users(["Foo", "FOO"]))
+
+
+def _request(app, func, headers=None, **kwargs):
+    """Calls `func` within a request and returns its result and the
+    response headers set by it."""
+    import flask
+    with app.test_request_context(headers=headers or {}):
+        result = func(**kwargs)
+        response = app.process_response(flask.Response())
+    return result, response.headers
+
+
+def test_read_etag(randomstring):
+    import flask
+    from werkzeug.exceptions import HTTPException
+    import tedega_auth.api.user
+    app = flask.Flask(__name__)
+    user = tedega_auth.api.user.create(name=randomstring(8),
+                                       password="password")
+    read = tedega_auth.api.user.read
+    loaded, headers = _request(app, read, item_id=user["id"])
+    etag = headers["ETag"]
+    assert etag.startswith('W/"')
+    assert headers["Last-Modified"]
+    with pytest.raises(HTTPException) as error:
+        _request(app, read, {"If-None-Match": etag}, item_id=user["id"])
+    assert error.value.response.status_code == 304
+    with pytest.raises(HTTPException) as error:
+        _request(app, read, {"If-Modified-Since": headers["Last-Modified"]},
+                 item_id=user["id"])
+    assert error.value.response.status_code == 304
+    loaded, headers = _request(app, read, {"If-None-Match": 'W/"other"'},
+                               item_id=user["id"])
+    assert loaded["id"] == user["id"]
+    assert headers["ETag"] == etag
+
+
+def test_update_if_match(randomstring):
+    import flask
+    from werkzeug.exceptions import PreconditionFailed
+    import tedega_auth.api.user
+    app = flask.Flask(__name__)
+    user = tedega_auth.api.user.create(name=randomstring(8),
+                                       password="password")
+    update = tedega_auth.api.user.update
+    read = tedega_auth.api.user.read
+    etag = _request(app, read, item_id=user["id"])[1]["ETag"]
+    values = {"name": randomstring(8)}
+    updated, headers = _request(app, update, {"If-Match": etag},
+                                item_id=user["id"], values=values)
+    assert headers["ETag"] != etag
+    with pytest.raises(PreconditionFailed):
+        _request(app, update, {"If-Match": etag}, item_id=user["id"],
+                 values=values)
+
+
+def test_search_etag(randomstring):
+    import flask
+    from werkzeug.exceptions import HTTPException
+    import tedega_auth.api.user
+    app = flask.Flask(__name__)
+    name = randomstring(8)
+    user = tedega_auth.api.user.create(name=name, password="password")
+    search = tedega_auth.api.user.search
+    kwargs = dict(search="name::" + name, fields="name")
+    users, headers = _request(app, search, **kwargs)
+    assert users == [{"name": name}]
+    with pytest.raises(HTTPException) as error:
+        _request(app, search, {"If-None-Match": headers["ETag"]}, **kwargs)
+    assert error.value.response.status_code == 304
+    tedega_auth.api.user.update(user["id"], {"password": "changed"})
+    users, changed = _request(app, search, {"If-None-Match": headers["ETag"]},
+                              **kwargs)
+    assert changed["ETag"] != headers["ETag"]
+
+
+def test_search_stream(randomstring, monkeypatch):
+    import json
+    import flask
+    import tedega_auth.api.user
+    monkeypatch.setenv("TEDEGA_AUTH_STREAM_THRESHOLD", "2")
+    app = flask.Flask(__name__)
+    name = randomstring(8)
+    for i in range(3):
+        tedega_auth.api.user.create(name="{}{}".format(name, i),
+                                    password="password")
+    search = tedega_auth.api.user.search
+    params = dict(search="name::" + name, fields="id|name")
+    expected = search(limit=3, **params)
+    response, headers = _request(app, search, limit=3, **params)
+    assert response.is_streamed
+    assert json.loads("".join(response.response)) == expected
+    assert headers["ETag"]
+    response, headers = _request(app, search, limit=3, offset=3, **params)
+    assert json.loads("".join(response.response)) == []
+
+
+def test_list_query():
+    from tedega_storage.rdbms import get_storage
+    import tedega_auth.api.user
+    with get_storage() as storage:
+        query = tedega_auth.api.user._query(storage, None)
+        columns = [c["name"] for c in query.column_descriptions]
+    assert "password" not in columns
+    assert "name_key" not in columns
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_validation
+----------------------------------
+
+Tests for `tedega_auth.validation` module.
+"""
+import pytest
+
+
+@pytest.fixture()
+def keys(request):
+    from tedega_auth.lib.keys import KeyRing, generate_key
+    keys = KeyRing()
+    keys.add(generate_key("a", "EdDSA"))
+    return keys
+
+
+def _token(keys, scopes=("read",), ttl=300):
+    import time
+    import uuid
+    from tedega_auth import config
+    now = int(time.time())
+    return keys.sign({"iss": config.get("issuer"),
+                      "aud": config.get("audience"),
+                      "sub": "client", "scope": " ".join(scopes),
+                      "iat": now, "exp": now + ttl,
+                      "jti": uuid.uuid4().hex})
+
+
+def test_validate(keys):
+    from tedega_auth.lib.errors import InvalidToken, InsufficientScope
+    from tedega_auth.validation import TokenValidator
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return keys.jwks()
+    validator = TokenValidator(fetch=fetch)
+    token = _token(keys)
+    assert validator.validate(token, "read")["sub"] == "client"
+    assert validator.validate(token)["sub"] == "client"
+    assert validator.cache.stats()["hits"] == 1
+    with pytest.raises(InsufficientScope):
+        validator.validate(token, "write")
+    with pytest.raises(InvalidToken):
+        validator.validate(token[:-4] + "AAAA")
+    with pytest.raises(InvalidToken):
+        validator.validate(_token(keys, ttl=-10))
+    assert len(fetches) == 1
+
+
+def test_unknown_key(keys):
+    from tedega_auth.lib.keys import KeyRing, generate_key
+    from tedega_auth.lib.errors import InvalidToken
+    from tedega_auth.validation import TokenValidator
+    validator = TokenValidator(fetch=keys.jwks)
+    validator.refresh()
+    # Rotated keys are fetched on first use.
+    keys.add(generate_key("b", "EdDSA"), current=True)
+    validator.min_refresh_interval = 0
+    assert validator.validate(_token(keys))
+    other = KeyRing()
+    other.add(generate_key("c", "EdDSA"))
+    with pytest.raises(InvalidToken):
+        validator.validate(_token(other))
+
+
+def test_fetch_error(keys):
+    from urllib.error import URLError
+    from tedega_auth.lib.errors import InvalidToken
+    from tedega_auth.validation import TokenValidator
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        raise URLError("Connection refused")
+    validator = TokenValidator(fetch=fetch)
+    token = _token(keys)
+    with pytest.raises(InvalidToken):
+        validator.validate(token)
+    # Failed fetches are not repeated for every token.
+    with pytest.raises(InvalidToken):
+        validator.validate(token)
+    assert len(fetches) == 1
+
+
+def test_removed_key(keys):
+    from tedega_auth.lib.keys import KeyRing, generate_key
+    from tedega_auth.lib.errors import InvalidToken
+    from tedega_auth.validation import TokenValidator
+    published = [keys]
+    validator = TokenValidator(fetch=lambda: published[0].jwks())
+    token = _token(keys)
+    assert validator.validate(token)
+    other = KeyRing()
+    other.add(generate_key("b", "EdDSA"))
+    published[0] = other
+    validator.refresh()
+    with pytest.raises(InvalidToken):
+        validator.validate(token)
+
+
+def test_validate_many(keys):
+    from tedega_auth.lib.errors import InvalidToken
+    from tedega_auth.validation import TokenValidator
+    validator = TokenValidator(fetch=keys.jwks)
+    token = _token(keys)
+    results = validator.validate_many([token, "invalid", token])
+    assert results[0] is results[2]
+    assert isinstance(results[1], InvalidToken)
+
+
+def test_middleware(keys):
+    from tedega_auth.validation import (
+        CLAIMS_KEY,
+        TokenMiddleware,
+        TokenValidator
+    )
+    responses = []
+
+    def app(environ, start_response):
+        start_response("200 OK", [])
+        return [environ.get(CLAIMS_KEY, {}).get("sub", "").encode()]
+
+    def start_response(status, headers):
+        responses.append(status)
+
+    middleware = TokenMiddleware(app, TokenValidator(fetch=keys.jwks),
+                                 scope="read", exempt=("/health/live",))
+    token = _token(keys)
+    auth = {"PATH_INFO": "/", "HTTP_AUTHORIZATION": "Bearer " + token}
+    assert middleware(auth, start_response) == [b"client"]
+    middleware({"PATH_INFO": "/"}, start_response)
+    middleware({"PATH_INFO": "/health/live"}, start_response)
+    write = dict(auth, HTTP_AUTHORIZATION="Bearer " + _token(keys, ["write"]))
+    middleware(write, start_response)
+    assert responses == ["200 OK", "401 Unauthorized", "200 OK",
+                         "403 Forbidden"]
+
+
+def test_light_import():
+    import subprocess
+    import sys
+    code = ("import sys, tedega_auth.validation; "
+            "print(sorted(name for name in sys.modules "
+            "if name.split('.')[0] in ('cryptography', 'jwt', 'sqlalchemy') "
+            "or name == 'tedega_auth.lib.metrics'))")
+    output = subprocess.check_output([sys.executable, "-c", code])
+    assert output.strip() == b"[]"